@@ -1,10 +1,11 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, WebSocket
 import os
 import hashlib
 import json
 import asyncio
 
 import redis
+import redis.asyncio as aioredis
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,6 +13,12 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST", "")
 REDIS_PORT = int(os.getenv("REDIS_PORT", ""))
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+async_redis = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+
+# Avatar state published by the bot's StateManager
+AVATAR_STATE_KEY = "avatar_state"
+AVATAR_STATE_CHANNEL = "avatar_state_events"
+AVATAR_STATE_HISTORY_KEY = "avatar_state_history"
 
 
 def generate_unique_id(message: str) -> str:
@@ -50,3 +57,54 @@ async def poll_redis_for_key(key: str, timeout: float = 0.5) -> dict:
                 "response": f"{json.dumps(response.decode("utf-8") if isinstance(response, bytes) else response)}"
             }
         await asyncio.sleep(timeout)
+
+
+@app.get("/api/avatar_state")
+async def avatar_state() -> dict:
+    state = await async_redis.get(AVATAR_STATE_KEY)
+    return json.loads(state) if state else {"state": "idle", "updated_at": None}
+
+
+@app.get("/api/avatar_state/history")
+async def avatar_state_history() -> list:
+    """Recent state changes, newest first, for debugging."""
+    return [
+        json.loads(entry)
+        for entry in await async_redis.lrange(AVATAR_STATE_HISTORY_KEY, 0, -1)
+    ]
+
+
+@app.websocket("/ws/avatar_state")
+async def avatar_state_stream(websocket: WebSocket):
+    """Sends the current avatar state, then every change as it is published."""
+    await websocket.accept()
+    pubsub = async_redis.pubsub()
+    # Subscribe before reading the current state so no change is missed
+    await pubsub.subscribe(AVATAR_STATE_CHANNEL)
+
+    async def forward():
+        current = await async_redis.get(AVATAR_STATE_KEY)
+        if current:
+            await websocket.send_text(current)
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                await websocket.send_text(message["data"])
+
+    async def receive():
+        # The client never sends anything, but a disconnect only shows up
+        # when the socket is read
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(receive())]
+    try:
+        # Whichever ends first, a disconnect or a failed send, ends the stream
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await pubsub.unsubscribe(AVATAR_STATE_CHANNEL)
+        await pubsub.aclose()
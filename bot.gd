@@ -13,26 +13,19 @@ var dorf_idle := load("res://assets/images/dorf.png")
 var dorf_talking := load("res://assets/images/dorf_talking.png")
 var dorf_thinking := load("res://assets/images/dorf_thinking.png")
 
-var db: SQLite
-var time_since_last_poll = 0.0
-var time_accumulator: float = 0.0
+# avatar state pushed by the api whenever the bot changes it
+var avatar_state_url := "ws://localhost:8000/ws/avatar_state"
+var avatar_socket := WebSocketPeer.new()
+var reconnect_delay := 2.0
+var time_until_reconnect := 0.0
 
 func _ready() -> void:
-	db = SQLite.new()
-	db.path = "res://client/avatar_state.db"
-	db.open_db()
+	avatar_socket.connect_to_url(avatar_state_url)
 	connect_signals()
 	$Timer.timeout.connect(back_to_idle)
 	$Timer.start()
 
-func get_state() -> String:
-	db.query("SELECT state FROM avatar_state ORDER BY updated_at DESC LIMIT 1")
-	var d := db.query_result
-	#print_debug("here is your db state: ", d)
-	return d[0]["state"]
-
-func state_machine() -> void:
-	var state := get_state()
+func state_machine(state: String) -> void:
 	match state:
 		"idle":
 			dorf.play(&"idle")
@@ -42,10 +35,19 @@ func state_machine() -> void:
 			dorf.play(&"talking")
 
 func _process(delta: float) -> void:
-	time_accumulator += delta
-	if time_accumulator >= 0.5:
-		time_accumulator = 0.0
-		state_machine()
+	avatar_socket.poll()
+	match avatar_socket.get_ready_state():
+		WebSocketPeer.STATE_OPEN:
+			while avatar_socket.get_available_packet_count() > 0:
+				var payload = JSON.parse_string(avatar_socket.get_packet().get_string_from_utf8())
+				if payload is Dictionary and payload.has("state"):
+					state_machine(payload["state"])
+		WebSocketPeer.STATE_CLOSED:
+			# api not up yet or restarted, keep trying
+			time_until_reconnect -= delta
+			if time_until_reconnect <= 0.0:
+				time_until_reconnect = reconnect_delay
+				avatar_socket.connect_to_url(avatar_state_url)
 
 func back_to_idle():
 	dorf.play(&"idle")
@@ -0,0 +1,89 @@
+"""Benchmark the trie emoji extractor against per-character is_emoji.
+
+    poetry run python bench_emoji.py [messages]
+
+Generates a reproducible chat log mixing plain text with single codepoint
+emojis, ZWJ sequences, flags, skin tones, keycaps and custom Discord
+emojis, then times both extractors over it.
+"""
+
+import sys
+import time
+import random
+
+import emoji
+
+from bot.emoji_match import CUSTOM_EMOJI_REGEX, extract_emojis
+
+WORDS = (
+    "lol yeah nah that's wild did anyone see the game last night gg ez "
+    "brb coffee time who's on tonight raid at 9 ok sounds good idk man "
+    "honestly the patch notes are rough can't wait for the weekend"
+).split()
+
+SEQUENCES = [
+    "😂",
+    "🔥",
+    "👍",
+    "❤️",
+    "👍🏽",
+    "👨‍👩‍👧‍👦",
+    "🏳️‍🌈",
+    "🇨🇦",
+    "🇯🇵",
+    "1️⃣",
+    "🧑🏿‍💻",
+    "<:pepega:123456789012345678>",
+    "<a:catjam:876543210987654321>",
+]
+
+
+def generate_chat_log(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        parts = [rng.choice(WORDS) for _ in range(rng.randint(2, 25))]
+        # roughly a third of chat messages carry emojis
+        if rng.random() < 0.35:
+            for _ in range(rng.randint(1, 3)):
+                parts.insert(rng.randint(0, len(parts)), rng.choice(SEQUENCES))
+        messages.append(" ".join(parts))
+    return messages
+
+
+def extract_per_character(text):
+    """The previous implementation, kept here as the baseline."""
+    found = [character for character in text if emoji.is_emoji(character)]
+    found.extend(CUSTOM_EMOJI_REGEX.findall(text))
+    return found
+
+
+def bench(fn, messages, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in messages:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    messages = generate_chat_log(count)
+
+    old = bench(extract_per_character, messages)
+    new = bench(extract_emojis, messages)
+    print(f"{count} messages, {sum(map(len, messages))} characters")
+    print(f"per character is_emoji: {old * 1000:8.1f} ms")
+    print(f"prefilter + trie:       {new * 1000:8.1f} ms")
+    print(f"speedup:                {old / new:8.1f}x")
+
+    sample = "family 👨‍👩‍👧‍👦 flag 🇨🇦 thumbs 👍🏽 <:pepega:123456789012345678>"
+    print(f"\n{sample}")
+    print(f"per character: {extract_per_character(sample)}")
+    print(f"trie:          {extract_emojis(sample)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Columnar archive of raw bot_usage events.
+
+Events that age out of SQLite are appended as zstd compressed Parquet
+files, hive partitioned by ISO week:
+
+    metrics_archive/week=2025-W14/part-00001234.parquet
+
+Each file is named after the first id it holds. Rows are only deleted from
+SQLite after they were written, so a retry after a failure starts from the
+same id and overwrites the file instead of duplicating it. Reads go
+through pyarrow.dataset, which prunes week partitions and row groups from
+the filter before any data is decoded.
+
+If pyarrow can't be imported `available` is False, nothing is written,
+expired events stay in SQLite and `scan` returns an empty frame.
+"""
+
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("id", "type", "name", "user_id", "channel_id", "guild_id", "timestamp")
+
+
+def iso_week(when: datetime) -> str:
+    year, week, _ = when.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def parse_timestamp(value: str) -> datetime:
+    """SQLite's 'YYYY-MM-DD HH:MM:SS' (UTC) to an aware datetime."""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when
+
+
+class EventArchive:
+    def __init__(self, root: str):
+        self.root = root
+        self.available = pa is not None
+        if self.available:
+            self.schema = pa.schema(
+                [
+                    ("id", pa.int64()),
+                    ("type", pa.string()),
+                    ("name", pa.string()),
+                    ("user_id", pa.int64()),
+                    ("channel_id", pa.int64()),
+                    ("guild_id", pa.int64()),
+                    ("timestamp", pa.timestamp("s", tz="UTC")),
+                ]
+            )
+            self.partitioning = ds.partitioning(
+                pa.schema([("week", pa.string())]), flavor="hive"
+            )
+        else:
+            logger.warning(
+                "pyarrow is not installed, expired metrics events will stay in SQLite."
+            )
+
+    def write(self, rows: Iterable[Sequence]) -> int:
+        """Append `COLUMNS` ordered rows, blocking, returns the number written."""
+        weeks = {}
+        for row in rows:
+            row = list(row)
+            row[6] = parse_timestamp(row[6])
+            weeks.setdefault(iso_week(row[6]), []).append(row)
+
+        written = 0
+        for week, week_rows in weeks.items():
+            week_rows.sort(key=lambda row: row[0])
+            table = pa.Table.from_pylist(
+                [dict(zip(COLUMNS, row)) for row in week_rows], schema=self.schema
+            )
+            directory = os.path.join(self.root, f"week={week}")
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{week_rows[0][0]:08d}.parquet"
+            path = os.path.join(directory, name)
+            # dot prefixed files are skipped by readers until the rename
+            partial = os.path.join(directory, f".{name}")
+            pq.write_table(table, partial, compression="zstd")
+            os.replace(partial, path)
+            written += len(week_rows)
+        logger.info(f"Archived {written} events into {len(weeks)} week partitions")
+        return written
+
+    def scan(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        **equals,
+    ) -> pd.DataFrame:
+        """Read archived events matching the filters, blocking.
+
+        `since` / `until` bound the timestamp (until is exclusive) and also
+        select the week partitions, keyword arguments are equality filters
+        such as `user_id=...` or `type="command"`.
+        """
+        columns = list(columns or COLUMNS)
+        if not self.available or not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns)
+
+        dataset = ds.dataset(
+            self.root,
+            schema=self.schema.append(pa.field("week", pa.string())),
+            format="parquet",
+            partitioning=self.partitioning,
+        )
+        # The week bounds prune whole partitions, the timestamp bounds are
+        # checked against row group statistics before anything is decoded
+        timestamp = self.schema.field("timestamp").type
+        conditions = []
+        if since is not None:
+            conditions.append(ds.field("week") >= iso_week(since))
+            conditions.append(ds.field("timestamp") >= pa.scalar(since, timestamp))
+        if until is not None:
+            conditions.append(ds.field("week") <= iso_week(until))
+            conditions.append(ds.field("timestamp") < pa.scalar(until, timestamp))
+        for field, value in equals.items():
+            conditions.append(ds.field(field) == value)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
@@ -5,148 +5,314 @@ import json
 import wave
 import time
 import threading
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
 import asyncio
 import logging
 
 from pydub import AudioSegment
 import discord
+from discord.opus import Decoder, OPUS_SILENCE
 from discord.ext.voice_recv import AudioSink, VoiceData
 from bot.redis_client import redis_client
+from bot.constants import (
+    AUDIO_BUFFER_INITIAL_SIZE,
+    AUDIO_BUFFER_MAX_FREE,
+    OPUS_DTX_MAX_FRAME_BYTES,
+    OPUS_MAX_CONCEALED_FRAMES,
+    SILENCE_TIMEOUT_SECONDS,
+    AUDIO_FLUSH_WORKERS,
+)
 
 logger = logging.getLogger(__name__)
 
+# Shared by every sink so a busy channel can't pile up conversions
+flush_executor = ThreadPoolExecutor(
+    max_workers=AUDIO_FLUSH_WORKERS, thread_name_prefix="audio-flush"
+)
+
+
+def is_silent_opus(packet: bytes) -> bool:
+    """Detect silence / DTX comfort noise from the Opus packet alone.
+
+    The TOC byte (RFC 6716 section 3.1) tells us how many frames are in the
+    packet; voiced frames carry tens of bytes each, while DTX and the silence
+    frames Discord clients send carry at most a couple.
+    """
+    if not packet or packet == OPUS_SILENCE:
+        return True
+    code = packet[0] & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    elif len(packet) > 1:
+        frames = (packet[1] & 0x3F) or 1
+    else:
+        return True
+    return (len(packet) - 1) / frames <= OPUS_DTX_MAX_FRAME_BYTES
+
 
 class RingBuffer:
-    def __init__(self, size: int):
+    """Circular PCM buffer that starts small and grows up to `max_size`.
+
+    Once at `max_size` the oldest audio is overwritten.
+    """
+
+    def __init__(self, size: int, max_size: int | None = None):
         self.buffer = bytearray(size)
         self.size = size
-        self.write_ptr = 0
-        self.read_ptr = 0
-        self.is_full = False
+        self.max_size = max(max_size or size, size)
+        self.start = 0
+        self.length = 0
         self.lock = threading.Lock()
 
+    def _grow(self, new_size: int):
+        data = self._peek()
+        self.buffer = bytearray(new_size)
+        self.buffer[: len(data)] = data
+        self.size = new_size
+        self.start = 0
+
+    def _peek(self) -> bytes:
+        end = self.start + self.length
+        if end <= self.size:
+            return bytes(self.buffer[self.start : end])
+        return bytes(self.buffer[self.start :] + self.buffer[: end - self.size])
+
     def write(self, data: bytes):
         with self.lock:
-            data_len = len(data)
-            if data_len > self.size:
+            needed = self.length + len(data)
+            if needed > self.size and self.size < self.max_size:
+                self._grow(min(self.max_size, max(needed, self.size * 2)))
+            if len(data) > self.size:
                 # If data exceeds buffer size, write only the last chunk
                 data = data[-self.size :]
-                data_len = len(data)
 
             # Write data in a circular manner
-            for byte in data:
-                self.buffer[self.write_ptr] = byte
-                self.write_ptr = (self.write_ptr + 1) % self.size
-                if self.is_full:
-                    self.read_ptr = (self.read_ptr + 1) % self.size
-                self.is_full = self.write_ptr == self.read_ptr
+            end = (self.start + self.length) % self.size
+            first = min(len(data), self.size - end)
+            self.buffer[end : end + first] = data[:first]
+            self.buffer[: len(data) - first] = data[first:]
+            self.length += len(data)
+            if self.length > self.size:
+                # Overwrote the oldest audio
+                self.start = (self.start + self.length - self.size) % self.size
+                self.length = self.size
 
     def read_all(self) -> bytes:
         with self.lock:
-            if not self.is_full and self.write_ptr == self.read_ptr:
-                # Buffer is empty
-                return b""
-
-            if self.is_full:
-                # Read from the full buffer
-                data = self.buffer[self.read_ptr :] + self.buffer[: self.write_ptr]
-            else:
-                # Read from the used portion
-                data = self.buffer[self.read_ptr : self.write_ptr]
-
-            self.read_ptr = self.write_ptr  # Mark buffer as read
-            self.is_full = False
-            return bytes(data)
+            data = self._peek()
+            self.start = 0
+            self.length = 0
+            return data
 
     def is_empty(self) -> bool:
         with self.lock:
-            return not self.is_full and self.write_ptr == self.read_ptr
+            return self.length == 0
 
     def clear(self):
         with self.lock:
-            self.write_ptr = 0
-            self.read_ptr = 0
-            self.is_full = False
+            self.start = 0
+            self.length = 0
+
+    def shrink(self, size: int):
+        """Drop back to `size` bytes of backing memory, discarding contents."""
+        with self.lock:
+            self.start = 0
+            self.length = 0
+            if self.size > size:
+                self.buffer = bytearray(size)
+                self.size = size
+
+
+class BufferPool:
+    """Free list of per-speaker ring buffers.
+
+    New buffers are handed out at a size that adapts to recent utterance
+    lengths and grow on demand up to `max_size`. Released buffers are shrunk
+    back to that size and kept for the next speaker, up to `max_free` of them.
+    """
+
+    def __init__(self, initial_size: int, max_size: int, max_free: int):
+        self.initial_size = initial_size
+        self.max_size = max_size
+        self.max_free = max_free
+        self.target_size = initial_size
+        self.free: list[RingBuffer] = []
+        self.allocations = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> RingBuffer:
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+            self.allocations += 1
+            return RingBuffer(self.target_size, self.max_size)
+
+    def release(self, buffer: RingBuffer, used: int):
+        with self.lock:
+            # Track the typical utterance so most never need to grow
+            typical = (3 * self.target_size + min(used, self.max_size)) // 4
+            self.target_size = max(self.initial_size, min(self.max_size, typical))
+            if len(self.free) >= self.max_free:
+                return
+            buffer.shrink(self.target_size)
+            self.free.append(buffer)
+
+    def free_bytes(self) -> int:
+        with self.lock:
+            return sum(buffer.size for buffer in self.free)
+
+
+class SilenceScheduler:
+    """One deadline timer per speaking user, no polling.
+
+    `touch` is called from the voice receive thread for every voiced packet
+    and only pushes the user's deadline forward. A timer is armed on the
+    event loop the first time a user speaks; when it fires early (the user
+    kept talking) it re-arms itself for the new deadline, otherwise it calls
+    `on_silence` exactly once. Idle users have no timer at all.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        timeout: float,
+        on_silence: Callable[[int], None],
+    ):
+        self.loop = loop
+        self.timeout = timeout
+        self.on_silence = on_silence
+        self.deadlines: Dict[int, float] = {}
+        self.timers: Dict[int, asyncio.TimerHandle | None] = {}
+        self.lock = threading.Lock()
+
+    def touch(self, user_id: int):
+        with self.lock:
+            self.deadlines[user_id] = self.loop.time() + self.timeout
+            if user_id in self.timers:
+                return
+            self.timers[user_id] = None  # arming in progress
+        self.loop.call_soon_threadsafe(self._arm, user_id)
+
+    def _arm(self, user_id: int):
+        with self.lock:
+            deadline = self.deadlines.get(user_id)
+            if deadline is None:
+                self.timers.pop(user_id, None)
+                return
+            self.timers[user_id] = self.loop.call_at(deadline, self._fire, user_id)
+
+    def _fire(self, user_id: int):
+        with self.lock:
+            deadline = self.deadlines.get(user_id)
+            if deadline is None:
+                self.timers.pop(user_id, None)
+                return
+            if deadline > self.loop.time():
+                self.timers[user_id] = self.loop.call_at(deadline, self._fire, user_id)
+                return
+            del self.deadlines[user_id]
+            del self.timers[user_id]
+        self.on_silence(user_id)
+
+    def cancel_all(self):
+        with self.lock:
+            for timer in self.timers.values():
+                if timer:
+                    timer.cancel()
+            self.timers.clear()
+            self.deadlines.clear()
 
 
 class RingBufferAudioSink(AudioSink):
     def __init__(self, bot, buffer_size=1024 * 1024, output_dir="user_audio"):
         self.bot = bot  # Store bot instance for access to the loop
-        self.ring_buffers = {}
+        # Only users with an utterance in progress hold a buffer
+        self.ring_buffers: Dict[int, RingBuffer] = {}
         self.buffer_size = buffer_size
+        self.pool = BufferPool(
+            initial_size=min(AUDIO_BUFFER_INITIAL_SIZE, buffer_size),
+            max_size=buffer_size,
+            max_free=AUDIO_BUFFER_MAX_FREE,
+        )
+        self.buffers_lock = threading.Lock()
         self.output_dir = output_dir
-        self.last_check_time = {}
-        self.last_audio_time: Dict[int, float] = {}
-        self.processing_locks: Dict[int, asyncio.Lock] = {}
-        self.save_task = None
+        self.silence = SilenceScheduler(
+            bot.loop, SILENCE_TIMEOUT_SECONDS, self.schedule_save
+        )
         self.ssrc_to_user: Dict[int, int] = {}  # Map SSRC to user ID
+        # We get raw Opus and only decode voiced packets ourselves
+        self.decoders: Dict[int, Decoder] = {}
+        # Lost packets since each user's last voiced one, concealed on the next
+        self.lost: Dict[int, int] = {}
+        self.frames_decoded = 0
+        self.frames_skipped = 0
         os.makedirs(self.output_dir, exist_ok=True)
         logger.info("RingBufferAudioSink initialized")
 
     def write(self, member, data: VoiceData):
         try:
-            current_time = time.time()
             user_id = member.id if member else None
             if not user_id:
                 return
 
-            if user_id not in self.processing_locks:
-                self.processing_locks[user_id] = asyncio.Lock()
+            if not data.packet:
+                # Lost in transit, the router hands us a placeholder
+                self.lost[user_id] = self.lost.get(user_id, 0) + 1
+                return
 
-            if user_id not in self.ring_buffers:
-                logger.info(f"Creating new buffer for user {user_id}")
-                self.ring_buffers[user_id] = RingBuffer(self.buffer_size)
-                self.last_check_time[user_id] = current_time
+            if is_silent_opus(data.opus):
+                self.frames_skipped += 1
+                # The decoder never saw this run, start the next utterance
+                # from a fresh state instead of predicting across the gap
+                self.decoders.pop(user_id, None)
+                self.lost.pop(user_id, None)
+                return
 
-            self.ring_buffers[user_id].write(data.pcm)
-            self.last_audio_time[user_id] = current_time
+            pcm = self.decode(user_id, data.opus)
+            self.frames_decoded += 1
 
-            # Use the bot's loop
-            if not self.save_task or self.save_task.done():
-                self.save_task = asyncio.run_coroutine_threadsafe(
-                    self.check_for_silence(), self.bot.loop
-                )
+            with self.buffers_lock:
+                ring_buffer = self.ring_buffers.get(user_id)
+                if ring_buffer is None:
+                    ring_buffer = self.ring_buffers[user_id] = self.pool.acquire()
+                ring_buffer.write(pcm)
+            self.silence.touch(user_id)
 
         except Exception as e:
             logger.error(f"Error in write method: {e}")
 
-    async def check_for_silence(self):
-        """Background task to check for silence periods and save audio"""
-        try:
-            while True:
-                current_time = time.time()
-                for user_id, last_time in list(self.last_audio_time.items()):
-                    # If we haven't received audio for 0.5 seconds (adjust as needed)
-                    if current_time - last_time > 0.3:
-                        if (
-                            user_id in self.ring_buffers
-                            and not self.ring_buffers[user_id].is_empty()
-                        ):
-                            # Only process if we're not already processing for this user
-                            if not self.processing_locks[user_id].locked():
-                                async with self.processing_locks[user_id]:
-                                    await self.bot.loop.run_in_executor(
-                                        None, self.save_user_audio, user_id
-                                    )
-                            del self.last_audio_time[user_id]
-
-                # If no active audio streams, end the task
-                if not self.last_audio_time:
-                    return
-
-                await asyncio.sleep(0.1)  # Small delay to prevent CPU overuse
-        except Exception as e:
-            logger.error(f"Error in check_for_silence: {e}")
+    def decode(self, user_id: int, opus: bytes) -> bytes:
+        decoder = self.decoders.get(user_id)
+        lost = self.lost.pop(user_id, 0)
+        if decoder is None:
+            decoder = self.decoders[user_id] = Decoder()
+            lost = 0  # nothing to conceal before the first packet
+        if not lost or lost > OPUS_MAX_CONCEALED_FRAMES:
+            return decoder.decode(opus, fec=False)
+        # Conceal the gap, recovering the last lost frame from this packet's
+        # forward error correction data
+        concealed = [decoder.decode(None, fec=False) for _ in range(lost - 1)]
+        concealed.append(decoder.decode(opus, fec=True))
+        return b"".join(concealed) + decoder.decode(opus, fec=False)
+
+    def schedule_save(self, user_id):
+        """Called once per utterance when the user's silence deadline passes."""
+        flush_executor.submit(self.save_user_audio, user_id)
 
     def save_user_audio(self, user_id):
         try:
             logger.info(f"Attempting to save audio for user {user_id}")
-            ring_buffer = self.ring_buffers.get(user_id)
-            if not ring_buffer:
-                logger.info(f"No ring buffer found for user {user_id}")
-                return
-            pcm_data = ring_buffer.read_all()
+            # The utterance is over, hand the buffer back for the next one
+            with self.buffers_lock:
+                ring_buffer = self.ring_buffers.pop(user_id, None)
+                if not ring_buffer:
+                    logger.info(f"No ring buffer found for user {user_id}")
+                    return
+                pcm_data = ring_buffer.read_all()
+            self.pool.release(ring_buffer, len(pcm_data))
             if pcm_data:
                 logger.info(f"Got PCM data of length {len(pcm_data)}")
                 converted_path = save_audio(user_id, pcm_data, self.output_dir)
@@ -157,7 +323,6 @@ class RingBufferAudioSink(AudioSink):
                 logger.info(f"Saved audio to {converted_path}")
             else:
                 logger.error("No PCM data to save")
-            ring_buffer.clear()
         except Exception as e:
             logger.error(f"Error in save_user_audio: {e}")
 
@@ -166,18 +331,58 @@ class RingBufferAudioSink(AudioSink):
         for user_id in list(self.ring_buffers.keys()):
             self.save_user_audio(user_id)
 
+    def release_user(self, user_id):
+        """Forget a user that left the channel, flushing what they said."""
+        self.save_user_audio(user_id)
+        self.decoders.pop(user_id, None)
+        self.lost.pop(user_id, None)
+
+    def release_all(self):
+        """Flush and forget every speaker, e.g. when the voice client goes away."""
+        with self.buffers_lock:
+            user_ids = list(self.ring_buffers)
+        for user_id in user_ids:
+            flush_executor.submit(self.release_user, user_id)
+        self.decoders.clear()
+        self.lost.clear()
+
+    def memory_stats(self) -> dict:
+        with self.buffers_lock:
+            per_speaker = {
+                user_id: buffer.size for user_id, buffer in self.ring_buffers.items()
+            }
+        return {
+            "speakers": per_speaker,
+            "speaker_bytes": sum(per_speaker.values()),
+            "pooled_buffers": len(self.pool.free),
+            "pooled_bytes": self.pool.free_bytes(),
+            "buffer_target_size": self.pool.target_size,
+            "allocations": self.pool.allocations,
+            "decoders": len(self.decoders),
+        }
+
     def cleanup(self):
-        pass
+        # Called by the voice client when it stops listening or disconnects,
+        # and again when the sink is garbage collected
+        if not self.bot.loop.is_closed():
+            self.bot.loop.call_soon_threadsafe(self.silence.cancel_all)
+        logger.info(
+            f"Opus frames decoded: {self.frames_decoded}, skipped as silence: {self.frames_skipped}"
+        )
+        self.release_all()
 
     def wants_opus(self):
-        return False
+        return True
 
 
 def save_audio(user_id: int, pcm_data, output_dir: str) -> str:
     try:
         os.makedirs(output_dir, exist_ok=True)
-        original_path = os.path.join(output_dir, f"{user_id}-original.wav")
-        converted_path = os.path.join(output_dir, f"{user_id}.wav")
+        original_path = os.path.join(
+            output_dir, f"{user_id}-{threading.get_ident()}-original.wav"
+        )
+        # Unique per utterance, flushes for the same user can overlap
+        converted_path = os.path.join(output_dir, f"{user_id}-{time.time_ns()}.wav")
 
         logger.info(f"Saving original audio to {original_path}")
         with wave.open(original_path, "wb") as wav_file:
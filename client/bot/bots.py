@@ -13,6 +13,8 @@ from bot.processing import (
     process_nic_response,
 )
 from bot.utilities import filter_message, LLMClient, start_capture, connect_to_voice
+from bot.directory import Directory
+from bot.pipeline import MessagePipeline
 
 from bot.workers.process_response_worker import (
     process_derf_response_queue,
@@ -78,6 +80,8 @@ EXTENTIONS = [
     "bot.news",
     "bot.translate",
     "bot.statemanager",
+    "bot.transcripts",
+    "bot.maintenance",
 ]
 
 NIC_EXTENTIONS = ["bot.insulter"]
@@ -87,6 +91,9 @@ class BaseBot(commands.Bot):
     def __init__(self, name, prefix, *args, **kwargs):
         super().__init__(command_prefix=prefix, intents=INTENTS, *args, **kwargs)
         self.name = name
+        self.directory = Directory(self)
+        self.pipeline = MessagePipeline(self)
+        self.add_listener(self.pipeline.on_message, "on_message")
         self.add_listener(self.on_ready)
 
     async def on_ready(self):
@@ -147,6 +154,7 @@ class DerfBot(BaseBot):
         self.add_listener(self.on_voice_state_update)
         self.llm = LLMClient(AUTH_TOKEN, WORKSPACE, SESSION_ID)
         self.statemanager = None
+        self.audio_sink = None
 
     async def handle_voice_state_update(self, member, before, after):
         logger.info(
@@ -169,6 +177,13 @@ class DerfBot(BaseBot):
                 # If bot is already connected, maybe do something
                 logger.info(f"Bot already connected, ensuring capture is active.")
                 await start_capture(member.guild, after.channel, self)
+        elif before.channel and not after.channel:
+            logger.info(f"User {member} left a voice channel.")
+            if self.audio_sink:
+                # Hand their audio buffer back to the pool
+                await self.loop.run_in_executor(
+                    None, self.audio_sink.release_user, member.id
+                )
 
     async def on_voice_state_update(self, member, before, after):
         if member.bot:
@@ -0,0 +1,107 @@
+"""Chart rendering off the event loop.
+
+Charts are drawn in a small process pool with matplotlib's object oriented
+API (no pyplot global state) and returned as PNG bytes. Rendered charts are
+cached by the caller's key and data version, see `ChartCache`.
+"""
+
+import io
+import time
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable, Optional
+
+from bot.constants import (
+    CHART_FONT_FAMILY,
+    CHART_RENDER_WORKERS,
+    CHART_CACHE_SECONDS,
+    CHART_CACHE_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def render_plot(data, title, xlabel=None, ylabel=None, kind="line") -> bytes:
+    """Plot a DataFrame or Series to PNG bytes, runs in a worker process."""
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    with matplotlib.rc_context({"font.family": CHART_FONT_FAMILY}):
+        fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        data.plot(ax=ax, kind=kind, title=title)
+        if xlabel:
+            ax.set_xlabel(xlabel)
+        if ylabel:
+            ax.set_ylabel(ylabel)
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, forking the bot would copy its threads and sockets
+        _executor = ProcessPoolExecutor(
+            max_workers=CHART_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def render(data, title, xlabel=None, ylabel=None, kind="line") -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), render_plot, data, title, xlabel, ylabel, kind
+    )
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class ChartCache:
+    """Rendered PNGs keyed by (command, args).
+
+    An entry is reused while its data version is still current, or for
+    `ttl` seconds after rendering even if new data has arrived since.
+    """
+
+    def __init__(
+        self,
+        ttl: float = CHART_CACHE_SECONDS,
+        max_entries: int = CHART_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, version: Hashable = None) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        rendered_at, entry_version, png = entry
+        fresh = time.monotonic() - rendered_at < self.ttl
+        if not fresh and (version is None or version != entry_version):
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return png
+
+    def put(self, key: Hashable, version: Hashable, png: bytes):
+        self.entries[key] = (time.monotonic(), version, png)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
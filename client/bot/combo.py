@@ -1,5 +1,7 @@
 from discord.ext import commands
 
+from bot.pipeline import MessageFeatures
+
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,12 +14,15 @@ class ComboBreaker(commands.Cog):
         self.combo_count = 0
         self.combo_threshold = combo_threshold
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return  # Ignore bot messages
+    async def cog_load(self):
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister(self.qualified_name)
 
-        content = message.content.strip()
+    async def handle_message(self, features: MessageFeatures):
+        message = features.message
+        content = features.content
 
         if self.last_message is None:
             self.last_message = content
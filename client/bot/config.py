@@ -32,6 +32,18 @@ VOICE_CHANNEL_ID = int(os.getenv("VOICE_CHANNEL_ID", ""))
 # Chat channel id
 CHAT_CHANNEL_ID = int(os.getenv("CHAT_CHANNEL_ID", ""))
 WHEREAMI = os.getenv("WHEREAMI", "")
+# Speech to text, comma separated whisper.cpp compatible inference endpoints
+WHISPER_URLS = [
+    url.strip()
+    for url in os.getenv("WHISPER_URLS", "http://127.0.0.1:8080/inference").split(",")
+    if url.strip()
+]
+# Optional in-process CPU model (faster-whisper), e.g. "base.en", empty to disable
+WHISPER_LOCAL_MODEL = os.getenv("WHISPER_LOCAL_MODEL", "")
+# Seconds transcribed in the wake word first pass, 0 disables the first pass
+WHISPER_PREFIX_SECONDS = float(os.getenv("WHISPER_PREFIX_SECONDS", 2))
+# Log every transcription to voice_responses.db (needs a full pass on everything)
+LOG_VOICE_TRANSCRIPTS = os.getenv("LOG_VOICE_TRANSCRIPTS", "true").lower() == "true"
 
 
 class AvatarState(Enum):
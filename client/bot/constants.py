@@ -22,6 +22,28 @@ WHISPER_QUEUE = "whisper_queue"
 VOICE_RESPONSE_QUEUE = "voice_response_queue"
 VOICE_NIC_RESPONSE_QUEUE = "voice_nic_response_queue"
 
+# Voice receive, Opus frames at or under this many bytes are DTX / silence
+OPUS_DTX_MAX_FRAME_BYTES = 2
+OPUS_MAX_CONCEALED_FRAMES = 5  # lost packets mid-utterance filled in by the decoder
+SILENCE_TIMEOUT_SECONDS = 0.3  # quiet time that ends an utterance
+AUDIO_FLUSH_WORKERS = 2  # threads converting and queueing finished utterances
+AUDIO_BUFFER_INITIAL_SIZE = 256 * 1024  # ~1.4s of 48kHz stereo PCM, grows as needed
+AUDIO_BUFFER_MAX_FREE = 8  # idle buffers kept around for the next speaker
+
+# Shared user / channel name cache
+DIRECTORY_TTL_SECONDS = 15 * 60
+DIRECTORY_MAX_ENTRIES = 5000
+DIRECTORY_FETCH_CONCURRENCY = 5  # concurrent HTTP lookups on cache misses
+
+# Message pipeline, fuzzy score above which a registered keyword counts as a hit
+PIPELINE_KEYWORD_THRESHOLD = 80
+
+# Speech to text routing
+STT_REQUEST_TIMEOUT = 60  # seconds before a backend request is abandoned
+STT_MAX_IN_FLIGHT = 2  # concurrent requests per whisper server
+STT_HEALTH_CHECK_INTERVAL = 15  # seconds before an unhealthy backend is probed
+STT_LATENCY_SMOOTHING = 0.2  # EWMA weight of the newest latency sample
+
 # TTS Voice Settings
 TTS_ENGINE = "kokoro"  # or use the mimic3 docker container
 TTS_VOICE = "am_adam"
@@ -41,7 +63,52 @@ FACTION_DB = "faction_data.db"
 METRICS_DB = "metrics.db"
 NEWS_DB = "news_agent.db"
 INSULT_DB = "insult.db"
-AVATAR_STATE_DB_PATH = "avatar_state.db"
+VOICE_RESPONSES_DB = "voice_responses.db"
+QUOTES_DB = "quotes.db"
+QUOTE_RANDOM_ATTEMPTS = 8  # random rowid probes before falling back to a range seek
+METRICS_ARCHIVE_DIR = "metrics_archive"  # Parquet files of expired bot_usage rows
+METRICS_RAW_RETENTION_DAYS = 7  # raw events kept in SQLite before archiving
+METRICS_ARCHIVE_BATCH = 50000  # expired rows read and archived per query
+
+# Avatar state for the Godot client, shared with api/main.py through Redis
+AVATAR_STATE_KEY = "avatar_state"
+AVATAR_STATE_CHANNEL = "avatar_state_events"
+AVATAR_STATE_HISTORY_KEY = "avatar_state_history"
+AVATAR_STATE_HISTORY_SIZE = 100  # recent changes kept for debugging
+
+# Database maintenance, runs daily at this UTC hour (quiet time for the server)
+MAINTENANCE_HOUR_UTC = 9
+MAINTENANCE_VACUUM_PAGES = 2000  # free pages returned per incremental vacuum
+MAINTENANCE_FRAGMENTATION = 0.2  # free page ratio that triggers a full VACUUM
+QUERY_STATS_MAX_LABELS = 500  # distinct statements timed per database file
+USAGE_HOURLY_RETENTION_DAYS = 90
+MAINTENANCE_RETENTION = [
+    # (database, table, timestamp column, days kept)
+    (METRICS_DB, "usage_hourly", "hour", USAGE_HOURLY_RETENTION_DAYS),
+    (VOICE_RESPONSES_DB, "voice_responses", "datetime", 365),
+]
+
+# Write-behind buffers for per-message counters
+WRITE_BEHIND_FLUSH_MS = 2000
+WRITE_BEHIND_MAX_EVENTS = 500
+
+# Emoji trend buckets, older days are folded into one bucket per week
+EMOJI_DAILY_RETENTION_DAYS = 90
+
+# Leaderboard top-k counters
+TOPK_CAPACITY = 200  # counters kept for server wide scopes
+TOPK_SCOPE_CAPACITY = 20  # counters kept per user / per faction
+TOPK_CHECKPOINT_SECONDS = 60
+
+# Metrics charts
+CHART_FONT_FAMILY = "Symbola"  # has glyphs for the emoji charts
+CHART_RENDER_WORKERS = 2  # processes drawing charts
+CHART_CACHE_SECONDS = 60  # reuse a rendered chart this long even if data changed
+CHART_CACHE_MAX_ENTRIES = 32
+
+# Transcript store, inserts are batched until either limit is hit
+TRANSCRIPT_BATCH_SIZE = 50
+TRANSCRIPT_FLUSH_SECONDS = 5
 
 # factions
 DEFAULT_FACTIONS = [
@@ -67,6 +134,7 @@ FRIEREN_DIR = "frieren/"
 # Leveling
 XP_DB = "xp_users.db"
 XP_COOLDOWN_SECONDS = 10  # 1 minute cooldown between XP gains per user
+XP_FLUSH_SECONDS = 5  # how often changed XP rows are written back
 
 LEVEL_THRESHOLDS = lambda lvl: 5 * (lvl**2) + 50 * lvl + 100
 
@@ -86,6 +154,10 @@ LEVEL_ROLE_MAPPING = {
 
 PRESTIGE_ROLE_ID = 1370154641098149929
 
+ROLE_SYNC_CONCURRENCY = 4  # member edits in flight during a bulk role sync
+ROLE_SYNC_MAX_RETRIES = 3  # retries for a rate limited or failed edit
+ROLE_SYNC_PROGRESS_SECONDS = 5  # how often the progress message is updated
+
 # filtered words from bot responses
 FILTERED_KEYWORDS = {
     "behavior driven development",
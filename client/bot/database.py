@@ -0,0 +1,301 @@
+"""Shared SQLite access layer.
+
+Every database file gets one persistent WAL mode connection owned by a
+dedicated thread. Work is queued to that thread, so coroutines never block
+the event loop on disk I/O and nothing pays for opening a connection per
+event. Statements are prepared once and reused from the connection's
+statement cache. Every unit of work is timed per label (the SQL, or the
+function's name) for the maintenance report.
+
+    db = get_database(XP_DB)
+    await db.execute("UPDATE user_xp SET xp = ? WHERE user_id = ?", (xp, uid))
+    row = await db.fetchone("SELECT xp FROM user_xp WHERE user_id = ?", (uid,))
+"""
+
+import time
+import queue
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from bot.constants import (
+    WRITE_BEHIND_FLUSH_MS,
+    WRITE_BEHIND_MAX_EVENTS,
+    QUERY_STATS_MAX_LABELS,
+)
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # 16 MiB
+    "PRAGMA mmap_size=134217728",  # 128 MiB
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class QueryStats:
+    __slots__ = ("calls", "total", "slowest")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+
+
+def query_label(sql: str) -> str:
+    return " ".join(sql.split())[:120]
+
+
+class Database:
+    """One writer thread and connection for a single SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stats: dict[str, QueryStats] = {}
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread = threading.Thread(
+            target=self._worker, name=f"sqlite-{path}", daemon=True
+        )
+        self.thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _worker(self):
+        conn = self._connect()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            fn, future, label = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                # Each unit of work is its own transaction
+                with conn:
+                    result = fn(conn)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            self._record(label, time.perf_counter() - start)
+        conn.close()
+        logger.info(f"Closed database {self.path}")
+
+    def _record(self, label: str, elapsed: float):
+        stats = self.stats.get(label)
+        if stats is None:
+            if len(self.stats) >= QUERY_STATS_MAX_LABELS:
+                return
+            stats = self.stats[label] = QueryStats()
+        stats.record(elapsed)
+
+    def submit(
+        self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None
+    ) -> Future:
+        """Queue `fn(conn)` on the database thread, usable from any thread."""
+        future: Future = Future()
+        self.queue.put((fn, future, label or getattr(fn, "__qualname__", repr(fn))))
+        return future
+
+    def call(
+        self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None
+    ) -> Any:
+        """Blocking `run`, for code that isn't on an event loop."""
+        return self.submit(fn, label).result()
+
+    async def run(
+        self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None
+    ) -> Any:
+        """Run `fn(conn)` inside a transaction on the database thread."""
+        return await asyncio.wrap_future(self.submit(fn, label))
+
+    async def execute(self, sql: str, params: Iterable = ()) -> int:
+        """Execute a statement and return the affected row count."""
+        return await self.run(
+            lambda conn: conn.execute(sql, params).rowcount, query_label(sql)
+        )
+
+    async def insert(self, sql: str, params: Iterable = ()) -> Optional[int]:
+        """Execute an INSERT and return the new rowid."""
+        return await self.run(
+            lambda conn: conn.execute(sql, params).lastrowid, query_label(sql)
+        )
+
+    async def executemany(self, sql: str, seq_of_params: Iterable) -> int:
+        return await self.run(
+            lambda conn: conn.executemany(sql, seq_of_params).rowcount,
+            query_label(sql),
+        )
+
+    async def executescript(self, script: str):
+        await self.run(lambda conn: conn.executescript(script), query_label(script))
+
+    async def fetchone(self, sql: str, params: Iterable = ()) -> Optional[tuple]:
+        return await self.run(
+            lambda conn: conn.execute(sql, params).fetchone(), query_label(sql)
+        )
+
+    async def fetchall(self, sql: str, params: Iterable = ()) -> list:
+        return await self.run(
+            lambda conn: conn.execute(sql, params).fetchall(), query_label(sql)
+        )
+
+    def slowest(self, limit: int = 5) -> List[Tuple[str, int, float, float]]:
+        """(label, calls, avg ms, max ms) rows, slowest average first."""
+        rows = [
+            (label, s.calls, 1000 * s.total / s.calls, 1000 * s.slowest)
+            for label, s in list(self.stats.items())
+        ]
+        rows.sort(key=lambda row: -row[2])
+        return rows[:limit]
+
+    def close(self):
+        """Finish queued work and close the connection."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+class WriteBehind:
+    """Buffers hot path writes in memory and flushes them in one transaction.
+
+    Events are flushed every `flush_ms` milliseconds or as soon as
+    `max_events` are pending, whichever comes first. `writer(conn, items)`
+    runs on the database thread and usually is a single `executemany`.
+
+    With `aggregate=True` repeated keys are summed, so a thousand increments
+    of the same counter become one `(*key, 1000)` item. Otherwise every
+    `add` is kept as its own row.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        writer: Callable[[sqlite3.Connection, list], Any],
+        aggregate: bool = False,
+        flush_ms: int = WRITE_BEHIND_FLUSH_MS,
+        max_events: int = WRITE_BEHIND_MAX_EVENTS,
+    ):
+        self.db = db
+        self.writer = writer
+        self.aggregate = aggregate
+        self.flush_ms = flush_ms
+        self.max_events = max_events
+        self.counts: Counter = Counter()
+        self.rows: list = []
+        self.events = 0
+        self.flushes = 0  # successful flushes, a cheap version of the data
+        self.task: Optional[asyncio.Task] = None
+        self.flush_tasks: set = set()
+
+    def add(self, key: tuple, amount: int = 1):
+        if self.aggregate:
+            self.counts[key] += amount
+        else:
+            self.rows.append(key)
+        self.events += 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._flush_periodically())
+        if self.events >= self.max_events and not self.flush_tasks:
+            flush = asyncio.create_task(self.flush())
+            self.flush_tasks.add(flush)
+            flush.add_done_callback(self.flush_tasks.discard)
+
+    def _take(self) -> list:
+        if self.aggregate:
+            items = [(*key, count) for key, count in self.counts.items()]
+            self.counts = Counter()
+        else:
+            items, self.rows = self.rows, []
+        self.events = 0
+        return items
+
+    def _restore(self, items: list):
+        if self.aggregate:
+            for *key, count in items:
+                self.counts[tuple(key)] += count
+        else:
+            self.rows[:0] = items
+        self.events += len(items)
+
+    async def flush(self):
+        items = self._take()
+        if not items:
+            return
+        future = self.db.submit(
+            lambda conn: self.writer(conn, items), self.writer.__qualname__
+        )
+        try:
+            await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A write the thread already started still lands, only put back
+            # the items when it never will
+            if future.cancel():
+                self._restore(items)
+            raise
+        except Exception as e:
+            logger.error(f"Write-behind flush to {self.db.path} failed: {e}")
+            self._restore(items)
+        else:
+            self.flushes += 1
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_ms / 1000)
+            await self.flush()
+
+    async def close(self):
+        """Stop the timer and write out whatever is still pending."""
+        if self.task:
+            self.task.cancel()
+            try:
+                # Let an interrupted flush put its items back first
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await asyncio.gather(*self.flush_tasks, return_exceptions=True)
+        await self.flush()
+
+
+_databases: dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> Database:
+    """Return the shared Database for `path`, starting it on first use."""
+    with _databases_lock:
+        db = _databases.get(path)
+        if db is None:
+            db = _databases[path] = Database(path)
+        return db
+
+
+def open_databases() -> List[Database]:
+    with _databases_lock:
+        return list(_databases.values())
+
+
+def close_databases():
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for db in databases:
+        db.close()
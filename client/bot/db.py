@@ -1,49 +1,153 @@
-import sqlite3
+import time
+import threading
 from datetime import datetime
 import logging
 
+from bot.database import get_database
+from bot.constants import (
+    VOICE_RESPONSES_DB,
+    TRANSCRIPT_BATCH_SIZE,
+    TRANSCRIPT_FLUSH_SECONDS,
+)
+
 logger = logging.getLogger(__name__)
 
 
+def fts_query(text: str) -> str:
+    """Quote every term so user input can't break the FTS5 query syntax."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
 class SQLiteDB:
-    def __init__(self, db_name="voice_responses.db"):
+    """Transcript store for the voice pipeline.
+
+    Inserts are buffered and written in batches through the shared database
+    thread for the file. An FTS5 index over the message text is kept in sync
+    with triggers so searches don't have to scan the table.
+    """
+
+    def __init__(self, db_name=VOICE_RESPONSES_DB):
         logger.info("initializing the database")
         self.db_name = db_name
+        self.db = get_database(db_name)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_flush = time.monotonic()
 
     def create_table(self):
-        """Create the voice_responses table if it doesn't exist."""
+        """Create the voice_responses table, its indexes and search index."""
         logger.info("Creating table")
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS voice_responses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT,
-                    message TEXT,
-                    datetime TEXT
-                )
+        self.db.call(self._create_table)
+
+    async def ensure_table(self):
+        """`create_table` for callers on the event loop."""
+        await self.db.run(self._create_table)
+
+    @staticmethod
+    def _create_table(conn):
+        conn.executescript(
             """
+            CREATE TABLE IF NOT EXISTS voice_responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                message TEXT,
+                datetime TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_voice_responses_user_time
+                ON voice_responses(user_id, datetime);
+            CREATE INDEX IF NOT EXISTS idx_voice_responses_time
+                ON voice_responses(datetime);
+            CREATE VIRTUAL TABLE IF NOT EXISTS voice_responses_fts USING fts5(
+                message, content='voice_responses', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS voice_responses_ai
+            AFTER INSERT ON voice_responses BEGIN
+                INSERT INTO voice_responses_fts(rowid, message)
+                VALUES (new.id, new.message);
+            END;
+            CREATE TRIGGER IF NOT EXISTS voice_responses_ad
+            AFTER DELETE ON voice_responses BEGIN
+                INSERT INTO voice_responses_fts(voice_responses_fts, rowid, message)
+                VALUES ('delete', old.id, old.message);
+            END;
+        """
+        )
+        # Index rows written before the search index existed
+        indexed = conn.execute(
+            "SELECT COUNT(*) FROM voice_responses_fts_docsize"
+        ).fetchone()[0]
+        if not indexed:
+            conn.execute(
+                "INSERT INTO voice_responses_fts(voice_responses_fts) VALUES ('rebuild')"
             )
 
     def insert_entry(self, user_id: str, message: str):
-        """Insert a new entry into the table."""
-        logger.info("Inserting entry into the db")
+        """Queue a new entry, the batch is written once it is full or stale."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+        with self.lock:
+            self.pending.append((user_id, message.strip(), timestamp))
+            due = (
+                len(self.pending) >= TRANSCRIPT_BATCH_SIZE
+                or time.monotonic() - self.last_flush >= TRANSCRIPT_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Queue all pending entries as one transaction on the database thread."""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.pending:
+                return None
+            batch, self.pending = self.pending, []
+        logger.info(f"Inserting {len(batch)} entries into the db")
+        return self.db.submit(
+            lambda conn: self._insert(conn, batch), "insert voice_responses"
+        )
+
+    def _insert(self, conn, batch):
+        # Runs on the database thread, nothing waits on a regular flush
+        try:
+            conn.executemany(
                 """
                 INSERT INTO voice_responses(user_id, message, datetime)
                 VALUES(?, ?, ?)
             """,
-                (user_id, message.strip(), timestamp),
+                batch,
             )
+        except Exception as e:
+            logger.error(f"Inserting {len(batch)} entries failed, keeping them: {e}")
+            with self.lock:
+                self.pending[:0] = batch
+            raise
+
+    def close(self):
+        """Write out pending entries and wait for them to land."""
+        future = self.flush()
+        if future:
+            future.exception()
 
-    def get_all_entries(self):
+    async def get_all_entries(self):
         """Retrieve all entries from the table."""
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM voice_responses")
-            rows = cursor.fetchall()
-            return rows
+        self.flush()
+        return await self.db.fetchall(
+            "SELECT id, user_id, message, datetime FROM voice_responses ORDER BY id"
+        )
+
+    async def search(self, query: str, limit: int = 10):
+        """Full text search, best matches first.
+
+        Returns (user_id, datetime, snippet) rows.
+        """
+        return await self.db.fetchall(
+            """
+            SELECT v.user_id, v.datetime,
+                snippet(voice_responses_fts, 0, '**', '**', '…', 16)
+            FROM voice_responses_fts
+            JOIN voice_responses v ON v.id = voice_responses_fts.rowid
+            WHERE voice_responses_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """,
+            (fts_query(query), limit),
+        )
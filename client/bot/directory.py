@@ -0,0 +1,140 @@
+"""Shared ID to display name lookups for users, members and channels.
+
+Names are served from a TTL-bounded LRU. Misses are answered from the
+gateway cache when possible and only fall back to the HTTP API, with a cap
+on concurrent fetches, for IDs the gateway doesn't know about. A lookup
+that comes back NotFound is cached as None, any other HTTP error is not, so
+a rate limit blip doesn't hide a name for the whole TTL.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import discord
+
+from bot.constants import (
+    DIRECTORY_TTL_SECONDS,
+    DIRECTORY_MAX_ENTRIES,
+    DIRECTORY_FETCH_CONCURRENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Directory:
+    def __init__(
+        self,
+        bot,
+        ttl: float = DIRECTORY_TTL_SECONDS,
+        max_entries: int = DIRECTORY_MAX_ENTRIES,
+        concurrency: int = DIRECTORY_FETCH_CONCURRENCY,
+    ):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires, name = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, name
+
+    def _put(self, key, name: Optional[str]):
+        self.entries[key] = (time.monotonic() + self.ttl, name)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def _cached(self, key, resolve) -> Optional[str]:
+        found, name = self._get(key)
+        if found:
+            self.hits += 1
+            return name
+        self.misses += 1
+        try:
+            name = await resolve()
+        except discord.HTTPException as e:
+            logger.warning(f"Couldn't resolve {key}: {e}")
+            return None
+        self._put(key, name)
+        return name
+
+    async def user_name(
+        self, user_id: int, guild: Optional[discord.Guild] = None
+    ) -> Optional[str]:
+        """Display name for a user, their nickname if `guild` is given.
+
+        Returns None when the user can't be found.
+        """
+
+        async def resolve():
+            member = guild.get_member(user_id) if guild else None
+            if member:
+                return member.display_name
+            user = self.bot.get_user(user_id)
+            if user is None:
+                async with self.semaphore:
+                    self.fetches += 1
+                    try:
+                        user = await self.bot.fetch_user(user_id)
+                    except discord.NotFound:
+                        return None
+            return user.display_name
+
+        return await self._cached(
+            ("user", getattr(guild, "id", None), user_id), resolve
+        )
+
+    async def channel_name(self, channel_id: int) -> Optional[str]:
+        async def resolve():
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                async with self.semaphore:
+                    self.fetches += 1
+                    try:
+                        channel = await self.bot.fetch_channel(channel_id)
+                    except discord.NotFound:
+                        return None
+            return getattr(channel, "name", None)
+
+        return await self._cached(("channel", channel_id), resolve)
+
+    async def user_names(
+        self, user_ids: Iterable[int], guild: Optional[discord.Guild] = None
+    ) -> Dict[int, Optional[str]]:
+        """Resolve many users at once, misses are fetched concurrently."""
+        user_ids = list(dict.fromkeys(user_ids))
+        names = await asyncio.gather(
+            *(self.user_name(user_id, guild) for user_id in user_ids)
+        )
+        return dict(zip(user_ids, names))
+
+    async def channel_names(
+        self, channel_ids: Iterable[int]
+    ) -> Dict[int, Optional[str]]:
+        channel_ids = list(dict.fromkeys(channel_ids))
+        names = await asyncio.gather(
+            *(self.channel_name(channel_id) for channel_id in channel_ids)
+        )
+        return dict(zip(channel_ids, names))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+        }
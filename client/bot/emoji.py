@@ -1,65 +1,153 @@
-from collections import defaultdict
-import sqlite3
-import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
 import logging
 
-import emoji
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from bot.constants import (
     EMOJI_DB,
+    EMOJI_DAILY_RETENTION_DAYS,
+    TOPK_CAPACITY,
 )
+from bot.database import WriteBehind, get_database
+from bot.pipeline import MessageFeatures
+from bot.topk import TopK
 
 
 logger = logging.getLogger(__name__)
 
-CUSTOM_EMOJI_REGEX = re.compile(r"<a?:\w+:\d+>")
-
-conn = sqlite3.connect(EMOJI_DB)
-c = conn.cursor()
-
-# Ensure quotes table exists
-c.execute(
-    """
-    CREATE TABLE IF NOT EXISTS emoji_usage (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    emoji TEXT NOT NULL,
-    usage_count INTEGER DEFAULT 1,
-    last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(user_id, emoji)
-);
-"""
-)
-conn.commit()
-
 
 class EmojiUsageCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.db = get_database(EMOJI_DB)
+        self.usage = WriteBehind(self.db, self._write_usage, aggregate=True)
+        # "emoji" server wide, "user:<id>" per user, "pair" for "<user_id>:<emoji>"
+        self.topk = TopK(self.db, {"emoji": TOPK_CAPACITY, "pair": TOPK_CAPACITY})
+
+    async def cog_load(self):
+        await self.db.run(self._ensure_tables)
+        await self.topk.load(seed=self._seed_topk)
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+        self.downsample_daily.start()
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister(self.qualified_name)
+        self.downsample_daily.cancel()
+        await self.usage.close()
+        await self.topk.close()
+
+    @staticmethod
+    def _ensure_tables(conn):
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS emoji_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            usage_count INTEGER DEFAULT 1,
+            last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, emoji)
+        );
+            -- Per day totals for trends, the primary key makes one emoji's
+            -- history a range scan
+            CREATE TABLE IF NOT EXISTS emoji_daily (
+                emoji TEXT NOT NULL,
+                day TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (emoji, day)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_emoji_daily_day ON emoji_daily(day);
+        """
+        )
+        # Seed from the totals, which only know the last day each was used
+        if conn.execute("SELECT 1 FROM emoji_daily LIMIT 1").fetchone() is None:
+            conn.execute(
+                """
+                INSERT INTO emoji_daily (emoji, day, count)
+                SELECT emoji, date(last_used), SUM(usage_count)
+                FROM emoji_usage
+                GROUP BY 1, 2
+            """
+            )
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    @staticmethod
+    def _write_usage(conn, counts):
+        totals = Counter()
+        daily = Counter()
+        for user_id, emoji_used, day, count in counts:
+            totals[(user_id, emoji_used)] += count
+            daily[(emoji_used, day)] += count
+        conn.executemany(
+            """
+            INSERT INTO emoji_usage (user_id, emoji, usage_count)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id, emoji)
+            DO UPDATE SET usage_count = usage_count + excluded.usage_count,
+                last_used = CURRENT_TIMESTAMP
+        """,
+            [(*key, count) for key, count in totals.items()],
+        )
+        conn.executemany(
+            """
+            INSERT INTO emoji_daily (emoji, day, count) VALUES (?, ?, ?)
+            ON CONFLICT(emoji, day) DO UPDATE SET count = count + excluded.count
+        """,
+            [(*key, count) for key, count in daily.items()],
+        )
+
+    @staticmethod
+    def _seed_topk(conn):
+        yield from conn.execute(
+            "SELECT 'emoji', emoji, SUM(usage_count) FROM emoji_usage GROUP BY emoji"
+        )
+        yield from conn.execute(
+            "SELECT 'user:' || user_id, emoji, usage_count FROM emoji_usage"
+        )
+        yield from conn.execute(
+            "SELECT 'pair', user_id || ':' || emoji, usage_count FROM emoji_usage"
+        )
 
-        emojis = extract_emojis(message.content)
-        if emojis:
-            with sqlite3.connect(EMOJI_DB) as conn:
-                c = conn.cursor()
-                for em in emojis:
-                    c.execute(
-                        """
-                        INSERT INTO emoji_usage (user_id, emoji, usage_count)
-                        VALUES (?, ?, 1)
-                        ON CONFLICT(user_id, emoji)
-                        DO UPDATE SET usage_count = usage_count + 1, last_used = CURRENT_TIMESTAMP
-                    """,
-                        (message.author.id, em),
-                    )
-                conn.commit()
-        # await bot.process_commands(message)  # important to not block commands
+    def record(self, user_id, emoji_used):
+        """Count one use, bucketed by the UTC day it happened on."""
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        self.usage.add((user_id, emoji_used, day))
+        self.topk.add("emoji", emoji_used)
+        self.topk.add(f"user:{user_id}", emoji_used)
+        self.topk.add("pair", f"{user_id}:{emoji_used}")
+
+    @tasks.loop(hours=24)
+    async def downsample_daily(self):
+        cutoff = (
+            datetime.now(timezone.utc) - timedelta(days=EMOJI_DAILY_RETENTION_DAYS)
+        ).strftime("%Y-%m-%d")
+        await self.db.run(lambda conn: self._downsample_daily(conn, cutoff))
+
+    @staticmethod
+    def _downsample_daily(conn, cutoff):
+        """Fold buckets before `cutoff` into one per week, keyed by its Monday.
+
+        Folded buckets are Mondays before the cutoff themselves, so running
+        this again leaves them as they are.
+        """
+        weekly = conn.execute(
+            """
+            SELECT emoji, date(day, '-6 days', 'weekday 1') AS week, SUM(count)
+            FROM emoji_daily
+            WHERE day < ?
+            GROUP BY 1, 2
+        """,
+            (cutoff,),
+        ).fetchall()
+        conn.execute("DELETE FROM emoji_daily WHERE day < ?", (cutoff,))
+        conn.executemany(
+            "INSERT INTO emoji_daily (emoji, day, count) VALUES (?, ?, ?)", weekly
+        )
+
+    async def handle_message(self, features: MessageFeatures):
+        for em in features.emojis:
+            self.record(features.message.author.id, em)
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction, user):
@@ -69,35 +157,13 @@ class EmojiUsageCog(commands.Cog):
         # Get the emoji as a string
         emoji_used = str(reaction.emoji)
 
-        with sqlite3.connect(EMOJI_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO emoji_usage (user_id, emoji, usage_count)
-                VALUES (?, ?, 1)
-                ON CONFLICT(user_id, emoji)
-                DO UPDATE SET usage_count = usage_count + 1, last_used = CURRENT_TIMESTAMP
-            """,
-                (user.id, emoji_used),
-            )
-            conn.commit()
+        self.record(user.id, emoji_used)
 
     @commands.command(name="emojistats", aliases=["es"])
     async def emojistats(self, ctx, user: discord.User = None):
         """Show emoji usage stats for a user (or yourself)."""
         user = user or ctx.author
-        with sqlite3.connect(EMOJI_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT emoji, usage_count FROM emoji_usage
-                WHERE user_id = ?
-                ORDER BY usage_count DESC
-                LIMIT 10
-            """,
-                (user.id,),
-            )
-            results = c.fetchall()
+        results = self.topk.top(f"user:{user.id}", 10)
 
         if not results:
             await ctx.send(f"{user.display_name} hasn't used any emojis yet!")
@@ -108,19 +174,7 @@ class EmojiUsageCog(commands.Cog):
 
     @commands.command(name="emojileaderboard", aliases=["el"])
     async def emoji_leaderboard(self, ctx, top_n: int = 10):
-        with sqlite3.connect(EMOJI_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT user_id, emoji, SUM(usage_count) as total_usage
-                FROM emoji_usage
-                GROUP BY user_id, emoji
-                ORDER BY total_usage DESC
-                LIMIT ?
-            """,
-                (top_n,),
-            )
-            rows = c.fetchall()
+        rows = self.topk.top("pair", top_n)
 
         if not rows:
             await ctx.send("No emoji data yet! 😢")
@@ -128,14 +182,15 @@ class EmojiUsageCog(commands.Cog):
 
         # Build user stats
         user_emoji_stats = defaultdict(list)
-        for user_id, emoji_used, count in rows:
-            user_emoji_stats[user_id].append((emoji_used, count))
+        for pair, count in rows:
+            user_id, emoji_used = pair.split(":", 1)
+            user_emoji_stats[int(user_id)].append((emoji_used, count))
 
         # Fetch usernames
+        names = await ctx.bot.directory.user_names(user_emoji_stats, ctx.guild)
         leaderboard_entries = []
         for user_id, emoji_stats in user_emoji_stats.items():
-            user = await ctx.bot.fetch_user(user_id)
-            username = user.display_name if user else f"User {user_id}"
+            username = names[user_id] or f"User {user_id}"
 
             total_user_usage = sum(count for _, count in emoji_stats)
             top_emojis = sorted(emoji_stats, key=lambda x: -x[1])[:3]
@@ -177,19 +232,3 @@ class EmojiUsageCog(commands.Cog):
 async def setup(bot):
     await bot.add_cog(EmojiUsageCog(bot))
     logger.info("EMOJI Cog loaded successfully.")
-
-
-def extract_emojis(text):
-    found = []
-
-    # 1. Find unicode emojis
-    for character in text:
-        if emoji.is_emoji(character):
-            found.append(character)
-
-    # 2. Find custom emojis
-    custom_matches = CUSTOM_EMOJI_REGEX.findall(text)
-    for match in custom_matches:
-        found.append(match)
-
-    return found
@@ -0,0 +1,88 @@
+"""Emoji extraction from message text.
+
+Kept free of Discord and database imports so it can be benchmarked on its
+own, see bench_emoji.py.
+"""
+
+import re
+
+import emoji
+
+CUSTOM_EMOJI_REGEX = re.compile(r"<a?:\w+:\d+>")
+
+
+# Neighbouring start characters closer than this are merged into one range,
+# a short class is much cheaper for the regex engine to test than an exact one
+START_RANGE_GAP = 16
+
+
+def build_trie(sequences) -> dict:
+    """Nested dicts keyed by character, "" marks the end of a sequence."""
+    trie = {}
+    for sequence in sequences:
+        node = trie
+        for char in sequence:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return trie
+
+
+def start_class(chars, gap: int = START_RANGE_GAP) -> str:
+    """A regex character class covering `chars` with few ranges."""
+    ranges = []
+    for code in sorted(map(ord, chars)):
+        if ranges and code - ranges[-1][1] <= gap:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return "[{}]".format(
+        "".join(
+            re.escape(chr(low)) + ("-" + re.escape(chr(high)) if high > low else "")
+            for low, high in ranges
+        )
+    )
+
+
+# Built once at import from the emoji package's data, so multi codepoint
+# sequences like ZWJ families, flags, keycaps and skin tones come out whole
+EMOJI_TRIE = build_trie(emoji.EMOJI_DATA)
+CANDIDATE_REGEX = re.compile(f"{CUSTOM_EMOJI_REGEX.pattern}|{start_class(EMOJI_TRIE)}")
+
+
+def extract_emojis(text):
+    """Unicode and custom Discord emojis in `text`, in order of appearance.
+
+    The regex skips to the next character that can start an emoji, the trie
+    then takes the longest sequence from there.
+    """
+    if text.isascii():
+        # Every unicode emoji has a non ASCII codepoint, even keycaps
+        return CUSTOM_EMOJI_REGEX.findall(text) if "<" in text else []
+
+    found = []
+    pos = 0
+    length = len(text)
+    while match := CANDIDATE_REGEX.search(text, pos):
+        start = match.start()
+        if match.end() - start > 1:
+            # custom emoji
+            found.append(match.group())
+            pos = match.end()
+            continue
+
+        node = EMOJI_TRIE
+        end = None
+        index = start
+        while index < length:
+            node = node.get(text[index])
+            if node is None:
+                break
+            index += 1
+            if "" in node:
+                end = index
+        if end:
+            found.append(text[start:end])
+            pos = end
+        else:
+            pos = start + 1
+    return found
@@ -1,204 +1,283 @@
-import sqlite3
 import random
 import logging
 from datetime import datetime, timedelta, timezone
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from bot.constants import FACTION_DB, DEFAULT_FACTIONS
 from bot.config import CHAT_CHANNEL_ID
-from bot.emoji import extract_emojis
+from bot.database import WriteBehind, get_database
+from bot.pipeline import MessageFeatures
+from bot.timers import TimerService
+from bot.topk import TopK
 
 logger = logging.getLogger(__name__)
 
+WAR_DURATION = timedelta(days=7)
+# (war_state column, time left when sent, announcement), in war_state order
+WAR_WARNINGS = (
+    (
+        "warning_24h_sent",
+        timedelta(hours=24),
+        "⚔️ **24 hours remaining in the War!** Rally your forces and make every emoji count!",
+    ),
+    (
+        "warning_12h_sent",
+        timedelta(hours=12),
+        "⏳ **12 hours left!** The final stretch is here — unleash your emoji power!",
+    ),
+    (
+        "warning_1h_sent",
+        timedelta(hours=1),
+        "🔥 **Only 1 hour left!!** Everything you do now could change the outcome!",
+    ),
+)
+
 
 class FactionCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.init_db()
-        self.check_war_end.start()
-        self.check_war_warnings.start()
+        self.db = get_database(FACTION_DB)
+        self.scores = WriteBehind(self.db, self._write_scores, aggregate=True)
+        # Resident copies so scoring and standings never wait on SQLite
+        self.factions = {}  # faction_id -> (name, symbol, color)
+        self.members = {}  # user_id -> faction_id
+        self.totals = {}  # faction_id -> score in the current war
+        self.war_start = None  # datetime the current war started, if any
+        self.warnings_sent = set()  # war_state warning columns already sent
+        self.timers = TimerService()
+        self.topk = TopK(self.db)  # "faction:<id>" -> emojis used in the war
+
+    async def cog_load(self):
+        await self.db.run(self.init_db)
+        await self.load_state()
+        await self.topk.load(seed=self._seed_topk)
+        self.schedule_war_timers()
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+
+    @staticmethod
+    def init_db(conn):
+        c = conn.cursor()
+
+        c.execute(
+            """
+        CREATE TABLE IF NOT EXISTS factions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            symbol TEXT,
+            color TEXT
+        )
+        """
+        )
 
-    def init_db(self):
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
+        c.execute(
+            """
+        CREATE TABLE IF NOT EXISTS user_factions (
+            user_id INTEGER PRIMARY KEY,
+            faction_id INTEGER,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (faction_id) REFERENCES factions(id)
+        )
+        """
+        )
 
-            c.execute(
-                """
-            CREATE TABLE IF NOT EXISTS factions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE,
-                symbol TEXT,
-                color TEXT
-            )
+        c.execute(
             """
-            )
+        CREATE TABLE IF NOT EXISTS faction_scores (
+            faction_id INTEGER,
+            emoji TEXT,
+            usage_count INTEGER DEFAULT 1,
+            last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (faction_id, emoji),
+            FOREIGN KEY (faction_id) REFERENCES factions(id)
+        )
+        """
+        )
 
-            c.execute(
-                """
-            CREATE TABLE IF NOT EXISTS user_factions (
-                user_id INTEGER PRIMARY KEY,
-                faction_id INTEGER,
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (faction_id) REFERENCES factions(id)
-            )
+        c.execute(
             """
-            )
+        CREATE TABLE IF NOT EXISTS war_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ended_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            faction_id INTEGER,
+            emoji TEXT,
+            usage_count INTEGER,
+            FOREIGN KEY (faction_id) REFERENCES factions(id)
+        )
+        """
+        )
 
-            c.execute(
-                """
-            CREATE TABLE IF NOT EXISTS faction_scores (
-                faction_id INTEGER,
-                emoji TEXT,
-                usage_count INTEGER DEFAULT 1,
-                last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (faction_id, emoji),
-                FOREIGN KEY (faction_id) REFERENCES factions(id)
-            )
+        c.execute(
             """
-            )
+        CREATE TABLE IF NOT EXISTS war_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            started_at TIMESTAMP
+        )
+        """
+        )
 
+        # Add warning columns if they don't exist yet (safe even if they already exist)
+        c.execute("PRAGMA table_info(war_state)")
+        columns = [row[1] for row in c.fetchall()]
+        if "warning_24h_sent" not in columns:
             c.execute(
-                """
-            CREATE TABLE IF NOT EXISTS war_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ended_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                faction_id INTEGER,
-                emoji TEXT,
-                usage_count INTEGER,
-                FOREIGN KEY (faction_id) REFERENCES factions(id)
+                "ALTER TABLE war_state ADD COLUMN warning_24h_sent INTEGER DEFAULT 0"
             )
-            """
-            )
-
+        if "warning_12h_sent" not in columns:
             c.execute(
-                """
-            CREATE TABLE IF NOT EXISTS war_state (
-                id INTEGER PRIMARY KEY CHECK (id = 1),
-                started_at TIMESTAMP
+                "ALTER TABLE war_state ADD COLUMN warning_12h_sent INTEGER DEFAULT 0"
             )
-            """
+        if "warning_1h_sent" not in columns:
+            c.execute(
+                "ALTER TABLE war_state ADD COLUMN warning_1h_sent INTEGER DEFAULT 0"
             )
 
-            # Add warning columns if they don't exist yet (safe even if they already exist)
-            c.execute("PRAGMA table_info(war_state)")
-            columns = [row[1] for row in c.fetchall()]
-            if "warning_24h_sent" not in columns:
+        # Seed factions if empty
+        c.execute("SELECT COUNT(*) FROM factions")
+        if c.fetchone()[0] == 0:
+            for faction in DEFAULT_FACTIONS:
                 c.execute(
-                    "ALTER TABLE war_state ADD COLUMN warning_24h_sent INTEGER DEFAULT 0"
+                    "INSERT INTO factions (name, symbol, color) VALUES (?, ?, ?)",
+                    (faction["name"], faction["symbol"], faction["color"]),
                 )
-            if "warning_12h_sent" not in columns:
-                c.execute(
-                    "ALTER TABLE war_state ADD COLUMN warning_12h_sent INTEGER DEFAULT 0"
-                )
-            if "warning_1h_sent" not in columns:
-                c.execute(
-                    "ALTER TABLE war_state ADD COLUMN warning_1h_sent INTEGER DEFAULT 0"
-                )
-
-            # Seed factions if empty
-            c.execute("SELECT COUNT(*) FROM factions")
-            if c.fetchone()[0] == 0:
-                for faction in DEFAULT_FACTIONS:
-                    c.execute(
-                        "INSERT INTO factions (name, symbol, color) VALUES (?, ?, ?)",
-                        (faction["name"], faction["symbol"], faction["color"]),
-                    )
 
-            # Ensure war_state exists
-            c.execute(
-                "INSERT OR IGNORE INTO war_state (id, started_at) VALUES (1, NULL)"
+        # Ensure war_state exists
+        c.execute("INSERT OR IGNORE INTO war_state (id, started_at) VALUES (1, NULL)")
+
+    async def load_state(self):
+        def load(conn):
+            factions = conn.execute(
+                "SELECT id, name, symbol, color FROM factions"
+            ).fetchall()
+            members = conn.execute(
+                "SELECT user_id, faction_id FROM user_factions"
+            ).fetchall()
+            totals = conn.execute(
+                "SELECT faction_id, SUM(usage_count) FROM faction_scores GROUP BY faction_id"
+            ).fetchall()
+            war_row = conn.execute(
+                """
+                SELECT started_at, warning_24h_sent, warning_12h_sent, warning_1h_sent
+                FROM war_state WHERE id = 1
+            """
+            ).fetchone()
+            return factions, members, totals, war_row
+
+        factions, members, totals, war_row = await self.db.run(load)
+        self.war_start = (
+            datetime.fromisoformat(war_row[0]).replace(tzinfo=timezone.utc)
+            if war_row and war_row[0]
+            else None
+        )
+        self.warnings_sent = {
+            column
+            for (column, _, _), sent in zip(
+                WAR_WARNINGS, war_row[1:] if war_row else ()
             )
+            if sent
+        }
+        self.factions = {
+            fid: (name, symbol, color) for fid, name, symbol, color in factions
+        }
+        self.members = dict(members)
+        self.totals = {fid: 0 for fid in self.factions}
+        self.totals.update(totals)
+        logger.info(
+            f"Loaded {len(self.factions)} factions with {len(self.members)} members"
+        )
 
-            conn.commit()
+    def standings(self):
+        """(faction_id, name, symbol, color, score) rows, highest score first."""
+        rows = [
+            (fid, name, symbol, color, self.totals.get(fid, 0))
+            for fid, (name, symbol, color) in self.factions.items()
+        ]
+        rows.sort(key=lambda row: -row[4])
+        return rows
+
+    def add_score(self, faction_id, emoji):
+        self.totals[faction_id] = self.totals.get(faction_id, 0) + 1
+        self.scores.add((faction_id, emoji))
+        self.topk.add(f"faction:{faction_id}", emoji)
+
+    @staticmethod
+    def _seed_topk(conn):
+        return conn.execute(
+            "SELECT 'faction:' || faction_id, emoji, usage_count FROM faction_scores"
+        )
 
     async def cog_unload(self):
-        self.check_war_warnings.cancel()
-
-    @tasks.loop(minutes=5)
-    async def check_war_warnings(self):
-        WAR_DURATION_DAYS = 7
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                "SELECT started_at, warning_24h_sent, warning_12h_sent, warning_1h_sent FROM war_state WHERE id = 1"
-            )
-            row = c.fetchone()
-
-            if not row or not row[0]:
-                return  # No war active
-
-            war_start = datetime.fromisoformat(row[0]).replace(tzinfo=timezone.utc)
-            war_end = war_start + timedelta(days=WAR_DURATION_DAYS)
-            now = datetime.now(timezone.utc)
-            time_left = war_end - now
-
-            warning_24h_sent, warning_12h_sent, warning_1h_sent = row[1:]
-
-            channel = self.bot.get_channel(CHAT_CHANNEL_ID)
-            if channel is None:
-                return  # channel doesn't exist, fail silently
-
-            updates = {}
-
-            if time_left.total_seconds() <= 86400 and not warning_24h_sent:
-                await channel.send(
-                    "⚔️ **24 hours remaining in the War!** Rally your forces and make every emoji count!"
-                )
-                updates["warning_24h_sent"] = 1
-
-            if time_left.total_seconds() <= 43200 and not warning_12h_sent:
-                await channel.send(
-                    "⏳ **12 hours left!** The final stretch is here — unleash your emoji power!"
-                )
-                updates["warning_12h_sent"] = 1
-
-            if time_left.total_seconds() <= 3600 and not warning_1h_sent:
-                await channel.send(
-                    "🔥 **Only 1 hour left!!** Everything you do now could change the outcome!"
-                )
-                updates["warning_1h_sent"] = 1
-
-            if updates:
-                # Save which warnings fired
-                set_clause = ", ".join([f"{key} = ?" for key in updates])
-                params = list(updates.values())
-                params.append(1)  # WHERE id = 1
-                c.execute(f"UPDATE war_state SET {set_clause} WHERE id = ?", params)
-                conn.commit()
-
-    def assign_faction(self, user_id):
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-
-            c.execute(
-                """
-                SELECT factions.id, COUNT(user_factions.user_id) as count
-                FROM factions
-                LEFT JOIN user_factions ON factions.id = user_factions.faction_id
-                GROUP BY factions.id
+        self.bot.pipeline.unregister(self.qualified_name)
+        self.timers.cancel_all()
+        await self.scores.close()
+        await self.topk.close()
+
+    @staticmethod
+    def _write_scores(conn, counts):
+        conn.executemany(
             """
-            )
-            faction_counts = c.fetchall()
-            min_count = min(fc[1] for fc in faction_counts)
-            least_filled = [fc[0] for fc in faction_counts if fc[1] == min_count]
-            chosen_faction = random.choice(least_filled)
+            INSERT INTO faction_scores (faction_id, emoji, usage_count)
+            VALUES (?, ?, ?)
+            ON CONFLICT(faction_id, emoji) DO UPDATE SET
+                usage_count = usage_count + excluded.usage_count,
+                last_used = CURRENT_TIMESTAMP
+        """,
+            counts,
+        )
 
-            c.execute(
-                "INSERT INTO user_factions (user_id, faction_id) VALUES (?, ?)",
-                (user_id, chosen_faction),
-            )
-            conn.commit()
-            return chosen_faction
+    def schedule_war_timers(self):
+        """Register the warning and end timers of the running war, if any."""
+        self.timers.cancel_all()
+        if not self.war_start:
+            return
+        war_end = self.war_start + WAR_DURATION
+        if datetime.now(timezone.utc) < war_end:
+            for column, time_left, text in WAR_WARNINGS:
+                if column not in self.warnings_sent:
+                    self.timers.schedule(
+                        column,
+                        war_end - time_left,
+                        lambda column=column, text=text: self.send_war_warning(
+                            column, text
+                        ),
+                    )
+        self.timers.schedule("war_end", war_end, self.end_war)
+
+    async def send_war_warning(self, column, text):
+        await self.bot.wait_until_ready()
+        channel = self.bot.get_channel(CHAT_CHANNEL_ID)
+        if channel is None:
+            return  # channel doesn't exist, fail silently
+
+        await channel.send(text)
+        # Save which warnings fired
+        self.warnings_sent.add(column)
+        await self.db.execute(f"UPDATE war_state SET {column} = 1 WHERE id = 1")
+
+    async def assign_faction(self, user_id):
+        """Put the user in the least filled faction and return its id."""
+        counts = {fid: 0 for fid in self.factions}
+        for faction_id in self.members.values():
+            if faction_id in counts:
+                counts[faction_id] += 1
+        min_count = min(counts.values())
+        least_filled = [fid for fid, count in counts.items() if count == min_count]
+        chosen_faction = random.choice(least_filled)
+
+        # Claimed in memory first so concurrent events can't assign twice
+        self.members[user_id] = chosen_faction
+        await self.db.execute(
+            "INSERT OR IGNORE INTO user_factions (user_id, faction_id) VALUES (?, ?)",
+            (user_id, chosen_faction),
+        )
+        return chosen_faction
 
     def get_user_faction(self, user_id):
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                "SELECT faction_id FROM user_factions WHERE user_id = ?", (user_id,)
-            )
-            result = c.fetchone()
-            return result[0] if result else None
+        return self.members.get(user_id)
+
+    async def ensure_faction(self, user_id):
+        """The user's faction, assigning one on their first contribution."""
+        return self.get_user_faction(user_id) or await self.assign_faction(user_id)
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction, user):
@@ -207,98 +286,37 @@ class FactionCog(commands.Cog):
 
         # Get the emoji as a string
         emoji = str(reaction.emoji)
-        user_id = user.id
         if not emoji:
             return
 
-        faction_id = self.get_user_faction(user_id)
-        if not faction_id:
-            faction_id = self.assign_faction(user_id)
+        self.add_score(await self.ensure_faction(user.id), emoji)
 
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO faction_scores (faction_id, emoji, usage_count)
-                VALUES (?, ?, 1)
-                ON CONFLICT(faction_id, emoji) DO UPDATE SET
-                    usage_count = usage_count + 1,
-                    last_used = CURRENT_TIMESTAMP
-            """,
-                (faction_id, emoji),
-            )
-            conn.commit()
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
-
-        user_id = message.author.id
-        emojis = extract_emojis(message.content)
-        if not emojis:
+    async def handle_message(self, features: MessageFeatures):
+        if not features.emojis:
             return
 
-        faction_id = self.get_user_faction(user_id)
-        if not faction_id:
-            faction_id = self.assign_faction(user_id)
-
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            for emj in emojis:
-                c.execute(
-                    """
-                    INSERT INTO faction_scores (faction_id, emoji, usage_count)
-                    VALUES (?, ?, 1)
-                    ON CONFLICT(faction_id, emoji) DO UPDATE SET
-                        usage_count = usage_count + 1,
-                        last_used = CURRENT_TIMESTAMP
-                """,
-                    (faction_id, emj),
-                )
-            conn.commit()
+        faction_id = await self.ensure_faction(features.message.author.id)
+        for emj in features.emojis:
+            self.add_score(faction_id, emj)
 
     @commands.command(name="factioninfo", aliases=["fi"])
     async def factioninfo(self, ctx):
         """Gives the faction information for the user."""
         user_id = ctx.author.id
-        faction_id = self.get_user_faction(user_id)
-
-        if not faction_id:
-            faction_id = self.assign_faction(user_id)
-
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-
-            # Faction details
-            c.execute(
-                "SELECT name, symbol, color FROM factions WHERE id = ?", (faction_id,)
-            )
-            name, symbol, color = c.fetchone()
-
-            # Join date
-            c.execute(
-                "SELECT joined_at FROM user_factions WHERE user_id = ?", (user_id,)
-            )
-            joined_at_row = c.fetchone()
-            joined_at = (
-                datetime.fromisoformat(joined_at_row[0]).replace(tzinfo=timezone.utc)
-                if joined_at_row
-                else None
-            )
-
-            # Faction members (fetch all user_ids instead of just count)
-            c.execute(
-                "SELECT user_id FROM user_factions WHERE faction_id = ?", (faction_id,)
-            )
-            user_ids = [row[0] for row in c.fetchall()]
-
-            # Faction score
-            c.execute(
-                "SELECT SUM(usage_count) FROM faction_scores WHERE faction_id = ?",
-                (faction_id,),
-            )
-            score = c.fetchone()[0] or 0
+        faction_id = await self.ensure_faction(user_id)
+        name, symbol, color = self.factions[faction_id]
+        user_ids = [uid for uid, fid in self.members.items() if fid == faction_id]
+        score = self.totals.get(faction_id, 0)
+
+        # Join date
+        joined_at_row = await self.db.fetchone(
+            "SELECT joined_at FROM user_factions WHERE user_id = ?", (user_id,)
+        )
+        joined_at = (
+            datetime.fromisoformat(joined_at_row[0]).replace(tzinfo=timezone.utc)
+            if joined_at_row
+            else None
+        )
 
         # Fetch usernames
         members = []
@@ -330,6 +348,14 @@ class FactionCog(commands.Cog):
         embed.add_field(name="🧑‍🤝‍🧑 Members", value=str(len(user_ids)), inline=True)
         embed.add_field(name="💥 Faction Score", value=str(score), inline=True)
 
+        top_emojis = self.topk.top(f"faction:{faction_id}", 5)
+        if top_emojis:
+            embed.add_field(
+                name="🔥 Top Emojis",
+                value=" ".join(f"{emj}({count})" for emj, count in top_emojis),
+                inline=False,
+            )
+
         # New: add a field listing the members
         member_list = ", ".join(members)
         if len(member_list) > 1024:
@@ -347,47 +373,21 @@ class FactionCog(commands.Cog):
     @commands.command(name="factionleaderboard", aliases=["fl"])
     async def factionleaderboard(self, ctx):
         """Show the faction leaderboard."""
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
 
-            # Fetch war start date
-            c.execute("SELECT started_at FROM war_state WHERE id = 1")
-            war_row = c.fetchone()
-            war_start = (
-                datetime.fromisoformat(war_row[0]).replace(tzinfo=timezone.utc)
-                if war_row and war_row[0]
-                else None
-            )
-
-            # Get faction scores
-            c.execute(
-                """
-                SELECT factions.id, factions.name, factions.symbol, factions.color, 
-                    SUM(faction_scores.usage_count) as score
-                FROM factions
-                LEFT JOIN faction_scores ON factions.id = faction_scores.faction_id
-                GROUP BY factions.id
-                ORDER BY score DESC
-            """
-            )
-            rows = c.fetchall()
-
-            # Get faction members
-            c.execute(
-                """
-                SELECT user_id, faction_id 
-                FROM user_factions
-            """
-            )
-            all_members = c.fetchall()
-            member_map = {}
-            for user_id, faction_id in all_members:
-                member_map.setdefault(faction_id, []).append(user_id)
+        war_start = self.war_start
+        rows = self.standings()
+        member_map = {}
+        for user_id, faction_id in self.members.items():
+            member_map.setdefault(faction_id, []).append(user_id)
 
         if not rows:
             await ctx.send("No faction scores yet!")
             return
 
+        names = await self.bot.directory.user_names(
+            [uid for member_ids in member_map.values() for uid in member_ids],
+            ctx.guild,
+        )
         medals = ["🥇", "🥈", "🥉"]
         embed_color = int(rows[0][3].replace("#", "0x"), 16)
         embed = discord.Embed(title="🌟 Faction Leaderboard", color=embed_color)
@@ -396,14 +396,9 @@ class FactionCog(commands.Cog):
             medal = medals[idx] if idx < len(medals) else "🏅"
             member_ids = member_map.get(fid, [])
 
-            members = []
-            for member_id in member_ids:
-                member = self.bot.get_user(member_id) or await self.bot.fetch_user(
-                    member_id
-                )
-                members.append(
-                    member.display_name if member else f"User ID {member_id}"
-                )
+            members = [
+                names[member_id] or f"User ID {member_id}" for member_id in member_ids
+            ]
 
             member_list = ", ".join(members) if members else "No members"
             if len(member_list) > 1024:
@@ -426,35 +421,17 @@ class FactionCog(commands.Cog):
     @commands.command(name="warstatus", aliases=["ws", "war_status"])
     async def war_status(self, ctx):
         """Outputs the current war status"""
-        WAR_DURATION_DAYS = 7
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-
-            # War start date
-            c.execute("SELECT started_at FROM war_state WHERE id = 1")
-            war_row = c.fetchone()
-            if not war_row or not war_row[0]:
-                await ctx.send("No war is currently active!")
-                return
-            war_start = datetime.fromisoformat(war_row[0]).replace(tzinfo=timezone.utc)
-            war_end = war_start + timedelta(days=WAR_DURATION_DAYS)
-            time_remaining = war_end - datetime.now(timezone.utc)
+        war_start = self.war_start
+        if not war_start:
+            await ctx.send("No war is currently active!")
+            return
+        war_end = war_start + WAR_DURATION
+        time_remaining = war_end - datetime.now(timezone.utc)
 
-            # Total emoji usages
-            c.execute("SELECT SUM(usage_count) FROM faction_scores")
-            total_usage = c.fetchone()[0] or 0
-
-            # Faction scores
-            c.execute(
-                """
-                SELECT factions.name, factions.symbol, SUM(faction_scores.usage_count) as score
-                FROM factions
-                LEFT JOIN faction_scores ON factions.id = faction_scores.faction_id
-                GROUP BY factions.id
-                ORDER BY score DESC
-            """
-            )
-            faction_rows = c.fetchall()
+        total_usage = sum(self.totals.values())
+        faction_rows = [
+            (name, symbol, score) for _, name, symbol, _, score in self.standings()
+        ]
 
         if not faction_rows:
             await ctx.send("No faction scores yet!")
@@ -507,115 +484,120 @@ class FactionCog(commands.Cog):
     @commands.command(name="startwar")
     async def startwar(self, ctx):
         """Start a emoji war if one isn't already on-going"""
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            c.execute("SELECT started_at FROM war_state WHERE id = 1")
-            row = c.fetchone()
-
-            if row and row[0]:
-                started_at = datetime.fromisoformat(row[0]).replace(tzinfo=timezone.utc)
-                delta = datetime.now(timezone.utc) - started_at
-                if delta.days < 7:
-                    await ctx.send(
-                        f":warning: An emoji war is already ongoing! It started on `{started_at.date()}`."
-                    )
-                    return
+        started_at = self.war_start
+        if started_at:
+            delta = datetime.now(timezone.utc) - started_at
+            if delta < WAR_DURATION:
+                await ctx.send(
+                    f":warning: An emoji war is already ongoing! It started on `{started_at.date()}`."
+                )
+                return
+
+        now = datetime.now(timezone.utc)
+        await self.scores.flush()
 
-            now = datetime.now(timezone.utc).isoformat()
-            c.execute("UPDATE war_state SET started_at = ? WHERE id = 1", (now,))
+        def start(conn):
+            c = conn.cursor()
+            c.execute(
+                """
+                UPDATE war_state SET started_at = ?, warning_24h_sent = 0,
+                    warning_12h_sent = 0, warning_1h_sent = 0
+                WHERE id = 1
+            """,
+                (now.isoformat(),),
+            )
             c.execute("DELETE FROM faction_scores")
-            conn.commit()
+
+        await self.db.run(start)
+        self.war_start = now
+        self.warnings_sent = set()
+        self.totals = {fid: 0 for fid in self.factions}
+        self.topk.clear("faction:")
+        await self.topk.checkpoint()
+        self.schedule_war_timers()
 
         await ctx.send(
             ":crossed_swords: A new emoji war has begun! Use emojis to represent your faction!"
         )
 
-    @tasks.loop(minutes=5)
-    async def check_war_end(self):
-        logger.debug("Checking if the emoji war should end.")
-        with sqlite3.connect(FACTION_DB) as conn:
+    async def end_war(self):
+        if not self.war_start:
+            return
+        await self.bot.wait_until_ready()
+        await self.scores.flush()
+        # Final faction scores
+        scores = [
+            (name, symbol, score) for _, name, symbol, _, score in self.standings()
+        ]
+
+        # Prepare the announcement message
+        if scores:
+            winner_name, winner_symbol, winner_score = scores[0]
+            message = (
+                f":trophy: The emoji war has ended!\n\n"
+                f"🏆 **Winner:** {winner_symbol} **{winner_name}** with **{winner_score:,}** points!\n\n"
+                f"📊 **Final Standings:**\n"
+            )
+            medals = ["🥇", "🥈", "🥉"]
+            for idx, (name, symbol, score) in enumerate(scores[:3]):
+                medal = medals[idx] if idx < len(medals) else ""
+                message += f"{medal} {symbol} **{name}** - {score or 0:,} points\n"
+        else:
+            message = ":trophy: The emoji war has ended, but no scores were recorded!"
+
+        # Send the announcement
+        channel = discord.utils.get(self.bot.get_all_channels(), name="bot-spam")
+        if channel:
+            try:
+                await channel.send(message)
+            except Exception as e:
+                # The war still has to end, or its timer never fires again
+                logger.error(f"Announcing the end of the emoji war failed: {e}")
+
+        # Archive scores and reset war state
+        def archive(conn):
             c = conn.cursor()
-            c.execute("SELECT started_at FROM war_state WHERE id = 1")
-            result = c.fetchone()
-            if not result or not result[0]:
-                return
-            start_time = datetime.fromisoformat(result[0]).replace(tzinfo=timezone.utc)
-            if datetime.now(timezone.utc) - start_time >= timedelta(weeks=1):
-                # Fetch faction scores
-                c.execute(
-                    """
-                    SELECT factions.name, factions.symbol, SUM(faction_scores.usage_count) as score
-                    FROM factions
-                    LEFT JOIN faction_scores ON factions.id = faction_scores.faction_id
-                    GROUP BY factions.id
-                    ORDER BY score DESC
-                    """
-                )
-                scores = c.fetchall()
-
-                # Prepare the announcement message
-                if scores:
-                    winner_name, winner_symbol, winner_score = scores[0]
-                    message = (
-                        f":trophy: The emoji war has ended!\n\n"
-                        f"🏆 **Winner:** {winner_symbol} **{winner_name}** with **{winner_score:,}** points!\n\n"
-                        f"📊 **Final Standings:**\n"
-                    )
-                    medals = ["🥇", "🥈", "🥉"]
-                    for idx, (name, symbol, score) in enumerate(scores[:3]):
-                        medal = medals[idx] if idx < len(medals) else ""
-                        message += (
-                            f"{medal} {symbol} **{name}** - {score or 0:,} points\n"
-                        )
-                else:
-                    message = (
-                        ":trophy: The emoji war has ended, but no scores were recorded!"
-                    )
+            c.execute(
+                """
+                INSERT INTO war_history (faction_id, emoji, usage_count, ended_at)
+                SELECT faction_id, emoji, usage_count, CURRENT_TIMESTAMP
+                FROM faction_scores
+            """
+            )
+            c.execute(
+                """
+                UPDATE war_state SET started_at = NULL, warning_24h_sent = 0,
+                    warning_12h_sent = 0, warning_1h_sent = 0
+                WHERE id = 1
+            """
+            )
 
-                # Send the announcement
-                channel = discord.utils.get(
-                    self.bot.get_all_channels(), name="bot-spam"
-                )
-                if channel:
-                    await channel.send(message)
-
-                # Archive scores and reset war state
-                for faction_id, emoji, count, _ in scores:
-                    c.execute(
-                        "INSERT INTO war_history (faction_id, emoji, usage_count, ended_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
-                        (faction_id, emoji, count),
-                    )
-                c.execute("DELETE FROM faction_scores")
-                c.execute("UPDATE war_state SET started_at = NULL WHERE id = 1")
-                conn.commit()
-                await self.reset_factions()
+        await self.db.run(archive)
+        self.war_start = None
+        self.warnings_sent = set()
+        await self.reset_factions()
 
     async def reset_factions(self):
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            # Clear faction scores
-            c.execute("DELETE FROM faction_scores")
-            # Clear factions
-            c.execute("DELETE FROM factions")
-            conn.commit()
+        # Faction rows stay, members and past wars still point at them
+        await self.db.execute("DELETE FROM faction_scores")
+        self.totals = {fid: 0 for fid in self.factions}
+        self.topk.clear("faction:")
+        await self.topk.checkpoint()
 
         return "All factions and scores have been reset. Ready for the next war!"
 
     @commands.command(name="war_history")
     async def show_war_history(self, ctx):
         """Displays the results of past wars from the war_history table."""
-        with sqlite3.connect(FACTION_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT factions.name, factions.symbol, COALESCE(SUM(war_history.usage_count), 0) as score
-                FROM factions
-                LEFT JOIN war_history ON factions.id = war_history.faction_id
-                GROUP BY factions.id
-                ORDER BY score DESC
-                """
-            )
-            results = c.fetchall()
+        results = await self.db.fetchall(
+            """
+            SELECT factions.name, factions.symbol, COALESCE(SUM(war_history.usage_count), 0) as score
+            FROM factions
+            LEFT JOIN war_history ON factions.id = war_history.faction_id
+            GROUP BY factions.id
+            ORDER BY score DESC
+            """
+        )
 
         if not results:
             await ctx.send("No war history available.")
@@ -1,22 +1,25 @@
-import sqlite3
 import datetime
 import random
 import asyncio
 
 import logging
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 logger = logging.getLogger(__name__)
 
 from bot.constants import (
     XP_DB,
     XP_COOLDOWN_SECONDS,
+    XP_FLUSH_SECONDS,
     LEVEL_THRESHOLDS,
-    LEVEL_ROLE_MAPPING,
     PRESTIGE_ROLE_ID,
 )
 from bot.config import CHAT_CHANNEL_ID
+from bot.database import get_database
+from bot.pipeline import MessageFeatures
+from bot.ranking import Ranking
+from bot.role_sync import RoleSync
 
 
 async def send_fancy_levelup(destination, user, level, new_title=None, next_title=None):
@@ -69,196 +72,229 @@ async def setup(bot):
     logger.info("Leveling Cog loaded successfully.")
 
 
+class UserXP:
+    """Resident copy of a user_xp row."""
+
+    __slots__ = ("xp", "level", "prestige", "last_ts")
+
+    def __init__(self, xp=0, level=1, prestige=0, last_ts=None):
+        self.xp = xp
+        self.level = level
+        self.prestige = prestige
+        self.last_ts = last_ts
+
+    def on_cooldown(self, now_ts):
+        return bool(self.last_ts) and (now_ts - self.last_ts) < XP_COOLDOWN_SECONDS
+
+
 class Leveling(commands.Cog):
+    """XP and levels.
+
+    Every user's row is kept in memory so the cooldown check and level math
+    never wait on disk. Changed rows are marked dirty and written back in one
+    batch every `XP_FLUSH_SECONDS`, and once more when the cog unloads.
+    """
+
     def __init__(self, bot):
         logger.info("Initializing Leveling Cog")
         self.bot = bot
-        self.init_db()
+        self.db = get_database(XP_DB)
+        self.users: dict[int, UserXP] = {}
+        self.dirty: set[int] = set()
+        self.ranking = Ranking()
+
+    async def cog_load(self):
+        await self.init_db()
+        await self.load_users()
+        self.flush_xp.start()
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister(self.qualified_name)
+        task = self.flush_xp.get_task()
+        self.flush_xp.cancel()
+        if task:
+            try:
+                # An interrupted flush marks its users dirty again first
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def load_users(self):
+        rows = await self.db.fetchall(
+            "SELECT user_id, xp, level, prestige, last_message_ts FROM user_xp"
+        )
+        self.users = {user_id: UserXP(*values) for user_id, *values in rows}
+        self.ranking = Ranking(
+            {user_id: entry.xp for user_id, entry in self.users.items()}
+        )
+        logger.info(f"Loaded XP for {len(self.users)} users")
 
-    def init_db(self):
-        logger.info("Initializing XP database")
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute(
+    async def flush(self):
+        """Write every dirty user back in a single transaction."""
+        if not self.dirty:
+            return
+        user_ids, self.dirty = self.dirty, set()
+        rows = []
+        for user_id in user_ids:
+            entry = self.users[user_id]
+            rows.append((user_id, entry.xp, entry.level, entry.prestige, entry.last_ts))
+        try:
+            await self.db.executemany(
                 """
-                CREATE TABLE IF NOT EXISTS user_xp (
-                    user_id INTEGER PRIMARY KEY,
-                    xp INTEGER DEFAULT 0,
-                    level INTEGER DEFAULT 1,
-                    prestige INTEGER DEFAULT 0,
-                    last_message_ts REAL
-                )
-            """
+                INSERT INTO user_xp (user_id, xp, level, prestige, last_message_ts)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    xp = excluded.xp,
+                    level = excluded.level,
+                    prestige = excluded.prestige,
+                    last_message_ts = excluded.last_message_ts
+            """,
+                rows,
             )
-            conn.commit()
+        except asyncio.CancelledError:
+            # Rows hold the full state, writing them twice is harmless
+            self.dirty |= user_ids
+            raise
+        except Exception as e:
+            logger.error(f"Failed to flush XP for {len(rows)} users: {e}")
+            self.dirty |= user_ids
+
+    @tasks.loop(seconds=XP_FLUSH_SECONDS)
+    async def flush_xp(self):
+        await self.flush()
+
+    async def init_db(self):
+        logger.info("Initializing XP database")
+        await self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS user_xp (
+                user_id INTEGER PRIMARY KEY,
+                xp INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 1,
+                prestige INTEGER DEFAULT 0,
+                last_message_ts REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_user_xp_xp ON user_xp(xp DESC);
+        """
+        )
 
     async def check_and_assign_roles(self, member, new_level):
-        roles_to_assign = []
-
-        for level_req, role_id in LEVEL_ROLE_MAPPING.items():
-            if new_level >= level_req:
-                role = member.guild.get_role(role_id)
-                if role:
-                    roles_to_assign.append(role)
-
-        if roles_to_assign:
-            # Optionally: remove lower level roles first
-            current_roles = set(member.roles)
-            valid_role_ids = set(LEVEL_ROLE_MAPPING.values())
-            roles_to_remove = [
-                role for role in current_roles if role.id in valid_role_ids
-            ]
-
-            try:
-                await member.remove_roles(*roles_to_remove)
-                await member.add_roles(roles_to_assign[-1])  # Assign highest one
-            except (discord.Forbidden, discord.HTTPException) as e:
-                logger.error(f"Failed to assign roles for {member.display_name}: {e}")
+        await RoleSync().sync_member(member, new_level)
 
     @commands.command(name="reassign_all_roles")
     @commands.has_permissions(administrator=True)
     @commands.guild_only()
     async def reassign_all_roles(self, ctx):
         """Re-calculate and assign roles for all members based on their levels. Admin-only"""
-        await ctx.send(
-            "Reassigning roles based on user levels. This may take a moment..."
+        members = [
+            (member, self.users[member.id].level)
+            for member in ctx.guild.members
+            if not member.bot and member.id in self.users
+        ]
+        status = await ctx.send(
+            f"Reassigning roles for {len(members)} members based on their levels..."
         )
 
-        success_count = 0
-        fail_count = 0
-
-        for member in ctx.guild.members:
-            if member.bot:
-                continue
+        async def report(sync):
+            await status.edit(
+                content=f"Reassigning roles... {sync.checked}/{sync.total} checked, "
+                f"{sync.changed} updated, {sync.failed} failed."
+            )
 
-            level = self.get_user_level(member.id)  # Replace this with your own method
-            if level is None:
-                continue
+        sync = RoleSync()
+        await sync.run(members, progress=report)
 
-            try:
-                await self.check_and_assign_roles(member, level)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Failed to assign role for {member.display_name}: {e}")
-                fail_count += 1
-
-        await ctx.send(
-            f"Finished! ✅ {success_count} users updated, ❌ {fail_count} failed."
+        await status.edit(
+            content=f"Finished! ✅ {sync.changed} users updated, "
+            f"{sync.checked - sync.changed - sync.failed} already correct, "
+            f"❌ {sync.failed} failed."
         )
 
-    def get_user_level(self, user_id: int) -> int | None:
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute("SELECT level FROM user_xp WHERE user_id = ?", (user_id,))
-            level = c.fetchone()
-            return level[0] if level else None
+    async def get_user_level(self, user_id: int) -> int | None:
+        entry = self.users.get(user_id)
+        return entry.level if entry else None
 
     async def get_user_stats(self, ctx, guild=None, channel=None):
-        user_id = ctx.author.id
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
+        entry = self.users.get(ctx.author.id)
 
-            # Fetch current XP
-            c.execute(
-                "SELECT level, prestige FROM user_xp WHERE user_id = ?",
-                (user_id,),
+        if entry:
+            level, prestige = entry.level, entry.prestige
+            user = ctx.author
+            title = get_title_for_level(level)
+            flair = get_prestige_flair(prestige)
+            prestige_title = get_prestige_title(prestige)
+            bold_prestige_title = (
+                f"{flair}***{prestige_title}*** " if prestige_title else ""
             )
-            row = c.fetchone()
-
-            if row:
-                level, prestige = row
-                user = ctx.author
-                title = get_title_for_level(level)
-                flair = get_prestige_flair(prestige)
-                prestige_title = get_prestige_title(prestige)
-                bold_prestige_title = (
-                    f"{flair}***{prestige_title}*** " if prestige_title else ""
-                )
-                return f"**{user}** the level {level} ({bold_prestige_title} {title} {flair})"
-
-    async def add_xp(self, user_id, amount, guild=None, channel=None):
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-
-            # Fetch current XP
-            c.execute(
-                "SELECT xp, level, last_message_ts, prestige FROM user_xp WHERE user_id = ?",
-                (user_id,),
+            return (
+                f"**{user}** the level {level} ({bold_prestige_title} {title} {flair})"
             )
-            row = c.fetchone()
 
-            now_ts = get_current_timestamp()
-            if row:
-                xp, level, last_ts, prestige = row
-                if last_ts and (now_ts - last_ts) < XP_COOLDOWN_SECONDS:
-                    return
-                # prestige bonus
-                bonus_mult = 1 + (prestige * 0.10)
-                amount = int(amount * bonus_mult)
-
-                xp += amount
-                old_level = level
-                new_level = level
-                while xp >= LEVEL_THRESHOLDS(new_level):
-                    new_level += 1
-
-                c.execute(
-                    """
-                    UPDATE user_xp SET xp = ?, level = ?, last_message_ts = ?
-                    WHERE user_id = ?
-                """,
-                    (xp, new_level, now_ts, user_id),
-                )
+    def apply_xp(self, user_id, amount, now_ts):
+        """Add XP to a user unless they're on cooldown.
+
+        Returns (old_level, new_level), or None when on cooldown or new.
+        """
+        entry = self.users.get(user_id)
+
+        if entry:
+            if entry.on_cooldown(now_ts):
+                return None
+            # prestige bonus
+            bonus_mult = 1 + (entry.prestige * 0.10)
+            amount = int(amount * bonus_mult)
+
+            old_level = entry.level
+            entry.xp += amount
+            while entry.xp >= LEVEL_THRESHOLDS(entry.level):
+                entry.level += 1
+            entry.last_ts = now_ts
+            self.dirty.add(user_id)
+            self.ranking.update(user_id, entry.xp)
+            return old_level, entry.level
+
+        entry = self.users[user_id] = UserXP(xp=amount, last_ts=now_ts)
+        while entry.xp >= LEVEL_THRESHOLDS(entry.level):
+            entry.level += 1
+        self.dirty.add(user_id)
+        self.ranking.update(user_id, entry.xp)
+        return None
 
-                conn.commit()
-                if new_level > old_level and guild:
-                    member = guild.get_member(user_id)
-                    if member is None:
-                        try:
-                            member = await guild.fetch_member(user_id)
-                        except discord.NotFound:
-                            logger.warning(
-                                f"Member {user_id} not found in guild {guild.name}"
-                            )
-                            return
-
-                    await self.check_and_assign_roles(member, new_level)
-
-                    channel = self.bot.get_channel(CHAT_CHANNEL_ID)
-                    if not channel:
-                        channel = member.guild.system_channel
-                    old_title = get_title_for_level(old_level)
-                    new_title = get_title_for_level(new_level)
-                    # only show title if it changed
-                    title_changed = old_title != new_title
-                    await send_fancy_levelup(
-                        channel,
-                        member,
-                        new_level,
-                        new_title if title_changed else None,
-                        next_title=get_title_for_level(new_level + 1),
-                    )
-
-            else:
-                xp = amount
-                level = 1
-                while xp >= LEVEL_THRESHOLDS(level):
-                    level += 1
-
-                c.execute(
-                    """
-                    INSERT INTO user_xp (user_id, xp, level, last_message_ts)
-                    VALUES (?, ?, ?, ?)
-                """,
-                    (user_id, xp, level, now_ts),
-                )
+    async def add_xp(self, user_id, amount, guild=None, channel=None):
+        levels = self.apply_xp(user_id, amount, get_current_timestamp())
+        if not levels:
+            return
+        old_level, new_level = levels
+        if new_level > old_level and guild:
+            member = guild.get_member(user_id)
+            if member is None:
+                try:
+                    member = await guild.fetch_member(user_id)
+                except discord.NotFound:
+                    logger.warning(f"Member {user_id} not found in guild {guild.name}")
+                    return
 
-                conn.commit()
+            await self.check_and_assign_roles(member, new_level)
+
+            channel = self.bot.get_channel(CHAT_CHANNEL_ID)
+            if not channel:
+                channel = member.guild.system_channel
+            old_title = get_title_for_level(old_level)
+            new_title = get_title_for_level(new_level)
+            # only show title if it changed
+            title_changed = old_title != new_title
+            await send_fancy_levelup(
+                channel,
+                member,
+                new_level,
+                new_title if title_changed else None,
+                next_title=get_title_for_level(new_level + 1),
+            )
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def handle_message(self, features: MessageFeatures):
+        message = features.message
         await self.add_xp(
             message.author.id, 10, guild=message.guild, channel=message.channel
         )
@@ -275,18 +311,13 @@ class Leveling(commands.Cog):
     async def profile(self, ctx, user: discord.User = None):
         """Displays the users profile"""
         user = user or ctx.author
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                "SELECT xp, level, prestige FROM user_xp WHERE user_id = ?", (user.id,)
-            )
-            row = c.fetchone()
+        entry = self.users.get(user.id)
 
-        if not row:
+        if not entry:
             await ctx.send(f"{user.display_name} hasn't earned any XP yet!")
             return
 
-        xp, level, prestige = row
+        xp, level, prestige = entry.xp, entry.level, entry.prestige
         next_level_xp = LEVEL_THRESHOLDS(level)
         title = get_title_for_level(level)
         flair = get_prestige_flair(prestige)
@@ -327,49 +358,39 @@ class Leveling(commands.Cog):
     async def rank(self, ctx, user: discord.User = None):
         """Shows the rank of the user"""
         user = user or ctx.author
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute("SELECT user_id, xp, prestige FROM user_xp ORDER BY xp DESC")
-            rows = c.fetchall()
-
-        user_ids = [row[0] for row in rows]
-        prestige_lookup = {row[0]: row[2] for row in rows}
+        rank = self.ranking.rank(user.id)
 
-        if user.id not in user_ids:
+        if rank is None:
             await ctx.send(f"{user.display_name} hasn't earned any XP yet!")
             return
 
-        rank = user_ids.index(user.id) + 1
-        prestige = prestige_lookup.get(user.id, 0)
-        flair = get_prestige_flair(prestige)
+        flair = get_prestige_flair(self.users[user.id].prestige)
 
         medals = {1: "🥇", 2: "🥈", 3: "🥉"}
         medal = medals.get(rank, "🎖️")
 
         await ctx.send(
-            f"{medal} {user.display_name} {flair} is ranked **#{rank}** out of {len(user_ids)} adventurers!"
+            f"{medal} {user.display_name} {flair} is ranked **#{rank}** out of {len(self.ranking)} adventurers!"
         )
 
     @commands.command(name="leaderboard", aliases=["lb"])
     async def leaderboard(self, ctx, limit: int = 10):
         """Show the level leaderboard"""
         limit = max(1, min(limit, 20))
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                "SELECT user_id, xp, level, prestige FROM user_xp ORDER BY xp DESC LIMIT ?",
-                (limit,),
-            )
-            rows = c.fetchall()
+        rows = [
+            (user_id, xp, self.users[user_id].level, self.users[user_id].prestige)
+            for user_id, xp in self.ranking.top(limit)
+        ]
 
         if not rows:
             await ctx.send("No adventurers found on the leaderboard yet!")
             return
 
+        names = await self.bot.directory.user_names([row[0] for row in rows], ctx.guild)
         medals = ["🥇", "🥈", "🥉"]
         description = ""
         for idx, (user_id, xp, level, prestige) in enumerate(rows, start=1):
-            user = await self.bot.fetch_user(user_id)
+            name = names[user_id] or f"User {user_id}"
             title = get_title_for_level(level)
             flair = get_prestige_flair(prestige)
             prestige_title = get_prestige_title(prestige)
@@ -378,7 +399,7 @@ class Leveling(commands.Cog):
             )
             medal = medals[idx - 1] if idx <= 3 else "🎖️"
 
-            description += f"{medal} **{idx}. {user.display_name} ** — Level {level} ({bold_prestige_title}{title}{flair}) — {xp} XP\n"
+            description += f"{medal} **{idx}. {name} ** — Level {level} ({bold_prestige_title}{title}{flair}) — {xp} XP\n"
 
         embed = discord.Embed(
             title="🏆 Server Leaderboard",
@@ -394,20 +415,15 @@ class Leveling(commands.Cog):
         user_id = ctx.author.id
         guild = ctx.guild
         member = guild.get_member(user_id)
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                "SELECT xp, level, prestige FROM user_xp WHERE user_id = ?", (user_id,)
-            )
-            row = c.fetchone()
+        entry = self.users.get(user_id)
 
-        if not row:
+        if not entry:
             await ctx.send(
                 "You haven't started your journey yet! Keep chatting to earn XP."
             )
             return
 
-        xp, level, prestige = row
+        level = entry.level
 
         if level < 50:
             await ctx.send(
@@ -456,19 +472,14 @@ class Leveling(commands.Cog):
             return
 
         # Actually prestige the user
-        with sqlite3.connect(XP_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                UPDATE user_xp 
-                SET xp = 0, level = 1, prestige = prestige + 1
-                WHERE user_id = ?
-                """,
-                (user_id,),
-            )
-            conn.commit()
-
-        new_prestige = prestige + 1
+        entry.xp = 0
+        entry.level = 1
+        entry.prestige += 1
+        self.dirty.add(user_id)
+        self.ranking.update(user_id, entry.xp)
+        await self.flush()
+
+        new_prestige = entry.prestige
         await self.check_and_assign_roles(member, 0)
 
         prestige_role = guild.get_role(PRESTIGE_ROLE_ID)
@@ -3,6 +3,8 @@ import sqlite3
 
 from discord.ext import commands
 from bot.constants import MACRO_DB
+from bot.database import get_database
+from bot.pipeline import MessageFeatures
 
 logger = logging.getLogger(__name__)
 
@@ -10,21 +12,37 @@ logger = logging.getLogger(__name__)
 class MacroCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = sqlite3.connect(MACRO_DB)
-        self._create_table()
-
-    def _create_table(self):
-        with self.db:
-            self.db.execute(
-                """CREATE TABLE IF NOT EXISTS macros (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER,
-                    name TEXT,
-                    response TEXT,
-                    created_by TEXT,
-                    UNIQUE(guild_id, name)
-                )"""
-            )
+        self.db = get_database(MACRO_DB)
+        # guild_id -> {name: response}, loaded once and kept in step with the table
+        self.macros = {}
+
+    async def cog_load(self):
+        await self.db.run(self._create_table)
+        await self.load_macros()
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister(self.qualified_name)
+
+    @staticmethod
+    def _create_table(conn):
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS macros (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER,
+                name TEXT,
+                response TEXT,
+                created_by TEXT,
+                UNIQUE(guild_id, name)
+            )"""
+        )
+
+    async def load_macros(self):
+        rows = await self.db.fetchall("SELECT guild_id, name, response FROM macros")
+        self.macros = {}
+        for guild_id, name, response in rows:
+            self.macros.setdefault(guild_id, {})[name] = response
+        logger.info(f"Loaded {len(rows)} macros for {len(self.macros)} guilds")
 
     @commands.command()
     async def addmacro(self, ctx, name: str, *, response: str):
@@ -32,15 +50,17 @@ class MacroCog(commands.Cog):
         if ctx.guild is None:
             await ctx.send("This command can only be used in a server.")
             return
+        name = name.lower()
         try:
-            with self.db:
-                self.db.execute(
-                    "INSERT INTO macros (guild_id, name, response, created_by) VALUES (?, ?, ?, ?)",
-                    (ctx.guild.id, name.lower(), response, str(ctx.author)),
-                )
-            await ctx.send(f"Macro `{name}` added! ✅")
+            await self.db.execute(
+                "INSERT INTO macros (guild_id, name, response, created_by) VALUES (?, ?, ?, ?)",
+                (ctx.guild.id, name, response, str(ctx.author)),
+            )
         except sqlite3.IntegrityError:
             await ctx.send("A macro with that name already exists.")
+            return
+        self.macros.setdefault(ctx.guild.id, {})[name] = response
+        await ctx.send(f"Macro `{name}` added! ✅")
 
     @commands.command()
     async def delmacro(self, ctx, name: str):
@@ -48,12 +68,12 @@ class MacroCog(commands.Cog):
         if ctx.guild is None:
             await ctx.send("This command can only be used in a server.")
             return
-        with self.db:
-            cur = self.db.execute(
-                "DELETE FROM macros WHERE guild_id = ? AND name = ?",
-                (ctx.guild.id, name.lower()),
-            )
-        if cur.rowcount:
+        deleted = await self.db.execute(
+            "DELETE FROM macros WHERE guild_id = ? AND name = ?",
+            (ctx.guild.id, name.lower()),
+        )
+        self.macros.get(ctx.guild.id, {}).pop(name.lower(), None)
+        if deleted:
             await ctx.send(f"Macro `{name}` deleted.")
         else:
             await ctx.send("No such macro found.")
@@ -64,36 +84,24 @@ class MacroCog(commands.Cog):
         if ctx.guild is None:
             await ctx.send("This command can only be used in a server.")
             return
-        cur = self.db.execute(
-            "SELECT name FROM macros WHERE guild_id = ? ORDER BY name",
-            (ctx.guild.id,),
-        )
-        macros = [row[0] for row in cur.fetchall()]
+        macros = sorted(self.macros.get(ctx.guild.id, {}))
         if macros:
             await ctx.send("Available macros:\n" + ", ".join(f"`{m}`" for m in macros))
         else:
             await ctx.send("No macros set up in this server.")
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def handle_message(self, features: MessageFeatures):
+        message = features.message
         if message.guild is None:
             return  # Ignore DMs
-        if message.author.bot:
-            return
 
-        if not message.content.startswith("!"):
+        # Real commands are dispatched by the bot, never look them up as macros
+        if not features.command or features.command in self.bot.all_commands:
             return
 
-        command_name = message.content[1:].split()[0].lower()
-
-        cur = self.db.execute(
-            "SELECT response FROM macros WHERE guild_id = ? AND name = ?",
-            (message.guild.id, command_name),
-        )
-        result = cur.fetchone()
-        if result:
-            await message.channel.send(result[0])
-            return
+        response = self.macros.get(message.guild.id, {}).get(features.command)
+        if response:
+            await message.channel.send(response)
 
 
 async def setup(bot):
@@ -0,0 +1,237 @@
+import os
+import time
+import logging
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+import discord
+from discord.ext import commands, tasks
+
+from bot.constants import (
+    METRICS_DB,
+    EMOJI_DB,
+    FACTION_DB,
+    XP_DB,
+    VOICE_RESPONSES_DB,
+    NEWS_DB,
+    QUOTES_DB,
+    MACRO_DB,
+    MAINTENANCE_HOUR_UTC,
+    MAINTENANCE_VACUUM_PAGES,
+    MAINTENANCE_FRAGMENTATION,
+    MAINTENANCE_RETENTION,
+)
+from bot.database import get_database, open_databases
+
+logger = logging.getLogger(__name__)
+
+DATABASES = [
+    METRICS_DB,
+    EMOJI_DB,
+    FACTION_DB,
+    XP_DB,
+    VOICE_RESPONSES_DB,
+    NEWS_DB,
+    QUOTES_DB,
+    MACRO_DB,
+]
+
+
+def file_size(path):
+    """Size of the database plus its WAL, in bytes."""
+    return sum(
+        os.path.getsize(name) for name in (path, f"{path}-wal") if os.path.exists(name)
+    )
+
+
+class MaintenanceCog(commands.Cog):
+    """Daily retention, statistics, vacuum and WAL checkpoints for the bot's
+    SQLite files, run at `MAINTENANCE_HOUR_UTC` when the server is quiet."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.last_run = None  # (finished at, seconds taken, rows deleted)
+
+    async def cog_load(self):
+        self.maintain.start()
+
+    async def cog_unload(self):
+        self.maintain.cancel()
+
+    @staticmethod
+    def _apply_retention(conn, table, column, cutoff):
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if not exists:
+            return 0
+        return conn.execute(
+            f"DELETE FROM {table} WHERE {column} < ?", (cutoff,)
+        ).rowcount
+
+    @staticmethod
+    def _analyze(conn):
+        # Sample at most ~1000 rows per index so this stays cheap on big tables
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+
+    @staticmethod
+    def _page_stats(conn):
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return page_count, freelist, page_size, auto_vacuum
+
+    @classmethod
+    def _vacuum(cls, conn, allow_full=False):
+        """Give free pages back to the file system.
+
+        Files in incremental mode release a bounded number of pages per run.
+        A file without auto vacuum is switched over with one full VACUUM once
+        enough of it is free pages, after which the cheap path applies. The
+        full VACUUM rewrites the file and holds up every other write to it,
+        so it only runs when `allow_full` is set.
+        """
+        page_count, freelist, _, auto_vacuum = cls._page_stats(conn)
+        if not freelist:
+            return "clean"
+        if auto_vacuum == 2:  # incremental
+            # Frees one page per step, so the statement has to be run to completion
+            conn.execute(
+                f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})"
+            ).fetchall()
+            return "incremental"
+        if freelist / page_count < MAINTENANCE_FRAGMENTATION:
+            return "skipped"
+        if not allow_full:
+            return "full deferred"
+        start = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return f"full, took {time.perf_counter() - start:.1f}s"
+
+    @staticmethod
+    def _checkpoint(conn):
+        return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+
+    async def run_maintenance(self, allow_full_vacuum=False):
+        start = time.perf_counter()
+        today = datetime.now(timezone.utc)
+        deleted = 0
+        for path, table, column, days in MAINTENANCE_RETENTION:
+            if not os.path.exists(path):
+                continue
+            cutoff = (today - timedelta(days=days)).strftime("%Y-%m-%d")
+            try:
+                rows = await get_database(path).run(
+                    lambda conn: self._apply_retention(conn, table, column, cutoff),
+                    f"retention {table}",
+                )
+            except Exception as e:
+                logger.error(f"Retention on {path}:{table} failed: {e}")
+                continue
+            deleted += rows
+            logger.info(f"Retention removed {rows} rows from {path}:{table}")
+
+        for path in DATABASES:
+            if not os.path.exists(path):
+                continue
+            db = get_database(path)
+            try:
+                await db.run(self._analyze)
+                vacuum = await db.run(
+                    lambda conn: self._vacuum(conn, allow_full_vacuum), "vacuum"
+                )
+                busy, wal_pages, checkpointed = await db.run(self._checkpoint)
+            except Exception as e:
+                logger.error(f"Maintenance of {path} failed: {e}")
+                continue
+            logger.info(
+                f"Maintained {path}: vacuum {vacuum}, checkpointed "
+                f"{checkpointed}/{wal_pages} WAL pages{' (busy)' if busy else ''}"
+            )
+
+        elapsed = time.perf_counter() - start
+        self.last_run = (datetime.now(timezone.utc), elapsed, deleted)
+        logger.info(f"Database maintenance finished in {elapsed:.1f}s")
+
+    @tasks.loop(time=dt_time(hour=MAINTENANCE_HOUR_UTC, tzinfo=timezone.utc))
+    async def maintain(self):
+        # Quiet hours, the one time a full VACUUM may hold up writes
+        await self.run_maintenance(allow_full_vacuum=True)
+
+    @maintain.before_loop
+    async def before_maintain(self):
+        await self.bot.wait_until_ready()
+
+    @commands.command(name="db_maintenance")
+    @commands.has_permissions(administrator=True)
+    async def db_maintenance(self, ctx, mode: str = ""):
+        """Run the database maintenance now instead of waiting for quiet hours. format: [full]:str
+
+        A full VACUUM blocks writes to the file while it runs, so it's left to
+        the scheduled run unless `full` is given.
+        """
+        await ctx.send("Running database maintenance...")
+        await self.run_maintenance(allow_full_vacuum=mode.lower() == "full")
+        _, elapsed, deleted = self.last_run
+        await ctx.send(
+            f"Database maintenance done in {elapsed:.1f}s, {deleted} expired rows removed."
+        )
+
+    @commands.command(name="db_report")
+    @commands.has_permissions(administrator=True)
+    async def db_report(self, ctx):
+        """Shows database sizes, fragmentation and the slowest queries"""
+        embed = discord.Embed(
+            title="🗄️ Database Report", color=discord.Color.dark_grey()
+        )
+
+        lines = []
+        for path in DATABASES:
+            if not os.path.exists(path):
+                continue
+            page_count, freelist, page_size, auto_vacuum = await get_database(path).run(
+                self._page_stats
+            )
+            mode = {0: "none", 1: "full", 2: "incremental"}.get(auto_vacuum, "?")
+            lines.append(
+                f"`{path}` {file_size(path) / 1024 / 1024:.1f} MiB, "
+                f"{freelist * page_size / 1024 / 1024:.1f} MiB free "
+                f"({100 * freelist / max(page_count, 1):.0f}%), vacuum {mode}"
+            )
+        embed.add_field(
+            name="Files", value="\n".join(lines)[:1024] or "None", inline=False
+        )
+
+        slowest = sorted(
+            (
+                (avg, slowest, calls, label, db.path)
+                for db in open_databases()
+                for label, calls, avg, slowest in db.slowest()
+            ),
+            reverse=True,
+        )[:5]
+        embed.add_field(
+            name="Slowest queries (avg / max)",
+            value="\n".join(
+                f"`{path}` {avg:.1f} / {worst:.1f} ms x{calls}: `{label[:80]}`"
+                for avg, worst, calls, label, path in slowest
+            )[:1024]
+            or "None yet",
+            inline=False,
+        )
+
+        if self.last_run:
+            finished, elapsed, deleted = self.last_run
+            embed.set_footer(
+                text=f"Last maintenance {finished:%Y-%m-%d %H:%M} UTC, "
+                f"{elapsed:.1f}s, {deleted} expired rows removed"
+            )
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(MaintenanceCog(bot))
+    logger.info("Maintenance Cog loaded successfully.")
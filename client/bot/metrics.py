@@ -1,17 +1,28 @@
 import io
-import sqlite3
+import asyncio
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 import logging
 
 import discord
 from discord.ext import commands, tasks
 
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-
 import pandas as pd
 
-from bot.constants import METRICS_DB, EMOJI_DB
+from bot import charts
+from bot.archive import EventArchive
+from bot.constants import (
+    METRICS_DB,
+    EMOJI_DB,
+    METRICS_ARCHIVE_DIR,
+    METRICS_ARCHIVE_BATCH,
+    METRICS_RAW_RETENTION_DAYS,
+    TOPK_CAPACITY,
+    USAGE_HOURLY_RETENTION_DAYS,
+)
+from bot.database import WriteBehind, get_database
+from bot.pipeline import MessageFeatures
+from bot.topk import TopK
 
 logger = logging.getLogger(__name__)
 
@@ -19,347 +30,582 @@ logger = logging.getLogger(__name__)
 class Metrics(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.ensure_tables()
+        self.db = get_database(METRICS_DB)
+        self.emoji_db = get_database(EMOJI_DB)
+        self.usage = WriteBehind(self.db, self._write_usage)
+        self.archive = EventArchive(METRICS_ARCHIVE_DIR)
+        self.topk = TopK(self.db, {"command": TOPK_CAPACITY})
+        self.aggregations = 0
+        self.charts = charts.ChartCache()
+
+    async def cog_load(self):
+        await self.ensure_tables()
+        await self.topk.load(seed=self._seed_topk)
         self.aggregate_metrics.start()
-        self.user_cache = {}
-        self.channel_cache = {}
-
-    def ensure_tables(self):
-        with sqlite3.connect(METRICS_DB) as conn:
-            c = conn.cursor()
-            c.execute(
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister(self.qualified_name)
+        self.aggregate_metrics.cancel()
+        await self.usage.close()
+        await self.topk.close()
+        charts.shutdown()
+
+    async def ensure_tables(self):
+        await self.db.run(self._ensure_tables)
+
+    @staticmethod
+    def _ensure_tables(conn):
+        # usage_daily used to allow NULL ids, which never match on upsert.
+        # Move it aside, it is copied into the new table below.
+        nullable = conn.execute(
+            "SELECT 1 FROM pragma_table_info('usage_daily') "
+            "WHERE name = 'user_id' AND \"notnull\" = 0"
+        ).fetchone()
+        if nullable:
+            conn.executescript(
                 """
-                CREATE TABLE IF NOT EXISTS bot_usage (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    type TEXT,
-                    name TEXT,
-                    user_id INTEGER,
-                    channel_id INTEGER,
-                    guild_id INTEGER,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                DROP INDEX IF EXISTS idx_usage_daily_type_name_day;
+                DROP INDEX IF EXISTS idx_usage_daily_user;
+                DROP INDEX IF EXISTS idx_usage_daily_channel;
+                ALTER TABLE usage_daily RENAME TO usage_daily_nullable;
             """
             )
-            c.execute(
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bot_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT,
+                name TEXT,
+                user_id INTEGER,
+                channel_id INTEGER,
+                guild_id INTEGER,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS weekly_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                week TEXT,
+                type TEXT,
+                name TEXT,
+                count INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_bot_usage_timestamp
+                ON bot_usage(timestamp);
+
+            -- Rollups kept up to date by every flush of new events. name is ''
+            -- and unknown ids are 0 rather than NULL so rows upsert on the
+            -- primary key.
+            CREATE TABLE IF NOT EXISTS usage_hourly (
+                hour TEXT NOT NULL,
+                type TEXT NOT NULL,
+                name TEXT NOT NULL DEFAULT '',
+                count INTEGER NOT NULL,
+                PRIMARY KEY (hour, type, name)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                day TEXT NOT NULL,
+                type TEXT NOT NULL,
+                name TEXT NOT NULL DEFAULT '',
+                user_id INTEGER NOT NULL DEFAULT 0,
+                channel_id INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, type, name, user_id, channel_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_usage_daily_type_name_day
+                ON usage_daily(type, name, day, count);
+            CREATE INDEX IF NOT EXISTS idx_usage_daily_user
+                ON usage_daily(user_id, type, count);
+            CREATE INDEX IF NOT EXISTS idx_usage_daily_channel
+                ON usage_daily(channel_id, type, count);
+        """
+        )
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'usage_daily_nullable'"
+        ).fetchone():
+            conn.execute(
                 """
-                CREATE TABLE IF NOT EXISTS weekly_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    week TEXT,
-                    type TEXT,
-                    name TEXT,
-                    count INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                INSERT INTO usage_daily (day, type, name, user_id, channel_id, count)
+                SELECT day, type, name, COALESCE(user_id, 0),
+                    COALESCE(channel_id, 0), SUM(count)
+                FROM usage_daily_nullable
+                GROUP BY 1, 2, 3, 4, 5
             """
             )
-            conn.commit()
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
-
-        with sqlite3.connect(METRICS_DB) as conn:
-            c = conn.cursor()
-            c.execute(
+            conn.execute("DROP TABLE usage_daily_nullable")
+        # Seed the rollups from whatever raw events are still around
+        if conn.execute("SELECT 1 FROM usage_daily LIMIT 1").fetchone() is None:
+            conn.execute(
                 """
-                INSERT INTO bot_usage (type, user_id, channel_id, guild_id)
-                VALUES (?, ?, ?, ?)
-            """,
-                (
-                    "message",
-                    message.author.id,
-                    message.channel.id,
-                    getattr(message.guild, "id", None),
-                ),
+                INSERT INTO usage_hourly (hour, type, name, count)
+                SELECT strftime('%Y-%m-%d %H:00', timestamp), type,
+                    COALESCE(name, ''), COUNT(*)
+                FROM bot_usage
+                GROUP BY 1, 2, 3
+            """
             )
-            conn.commit()
+            conn.execute(
+                """
+                INSERT INTO usage_daily (day, type, name, user_id, channel_id, count)
+                SELECT date(timestamp), type, COALESCE(name, ''),
+                    COALESCE(user_id, 0), COALESCE(channel_id, 0), COUNT(*)
+                FROM bot_usage
+                GROUP BY 1, 2, 3, 4, 5
+            """
+            )
+
+    @staticmethod
+    def _seed_topk(conn):
+        return conn.execute(
+            """
+            SELECT 'command', name, SUM(count) FROM usage_daily
+            WHERE type = 'command'
+            GROUP BY name
+        """
+        )
+
+    async def read_frame(self, db, sql, params=()):
+        """Run a pandas query on the database thread."""
+        if db is self.db:
+            await self.usage.flush()
+        return await db.run(lambda conn: pd.read_sql_query(sql, conn, params=params))
+
+    async def read_events(self, columns, since, **equals):
+        """Raw bot_usage events since `since`, from the archive and SQLite.
+
+        `equals` are column equality filters, pushed down into the Parquet
+        scan. The timestamp column comes back as UTC datetimes.
+        """
+        columns = list(dict.fromkeys([*columns, "timestamp"]))
+        archived = await asyncio.to_thread(
+            self.archive.scan, columns, since=since, **equals
+        )
+        where = " AND ".join(["timestamp >= ?", *(f"{key} = ?" for key in equals)])
+        recent = await self.read_frame(
+            self.db,
+            f"SELECT {', '.join(columns)} FROM bot_usage WHERE {where}",
+            params=(since.strftime("%Y-%m-%d %H:%M:%S"), *equals.values()),
+        )
+        recent["timestamp"] = pd.to_datetime(recent["timestamp"], utc=True)
+        if archived.empty:
+            return recent
+        return pd.concat([archived, recent], ignore_index=True)
+
+    @staticmethod
+    def _write_usage(conn, rows):
+        conn.executemany(
+            """
+            INSERT INTO bot_usage (type, name, user_id, channel_id, guild_id, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            rows,
+        )
+
+        hourly = Counter()
+        daily = Counter()
+        for typ, name, user_id, channel_id, _, timestamp in rows:
+            name = name or ""
+            hourly[(f"{timestamp[:13]}:00", typ, name)] += 1
+            daily[(timestamp[:10], typ, name, user_id or 0, channel_id or 0)] += 1
+        conn.executemany(
+            """
+            INSERT INTO usage_hourly (hour, type, name, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(hour, type, name) DO UPDATE SET
+                count = count + excluded.count
+        """,
+            [(*key, count) for key, count in hourly.items()],
+        )
+        conn.executemany(
+            """
+            INSERT INTO usage_daily (day, type, name, user_id, channel_id, count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(day, type, name, user_id, channel_id) DO UPDATE SET
+                count = count + excluded.count
+        """,
+            [(*key, count) for key, count in daily.items()],
+        )
+
+    def record(self, typ, name, user_id, channel_id, guild_id):
+        """Queue a bot_usage row, stamped now so batching doesn't skew times."""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.usage.add((typ, name, user_id, channel_id, guild_id, timestamp))
+
+    async def handle_message(self, features: MessageFeatures):
+        message = features.message
+        self.record(
+            "message",
+            None,
+            message.author.id,
+            message.channel.id,
+            getattr(message.guild, "id", None),
+        )
 
     @commands.Cog.listener()
     async def on_command(self, ctx):
-        with sqlite3.connect(METRICS_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO bot_usage (type, name, user_id, channel_id, guild_id)
-                VALUES (?, ?, ?, ?, ?)
-            """,
-                (
-                    "command",
-                    ctx.command.name,
-                    ctx.author.id,
-                    ctx.channel.id,
-                    getattr(ctx.guild, "id", None),
-                ),
-            )
-            conn.commit()
+        self.topk.add("command", ctx.command.name)
+        self.record(
+            "command",
+            ctx.command.name,
+            ctx.author.id,
+            ctx.channel.id,
+            getattr(ctx.guild, "id", None),
+        )
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction, user):
         if user.bot:
             return
 
-        with sqlite3.connect(METRICS_DB) as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO bot_usage (type, name, user_id, channel_id, guild_id)
-                VALUES (?, ?, ?, ?, ?)
-            """,
-                (
-                    "reaction",
-                    str(reaction.emoji),
-                    user.id,
-                    reaction.message.channel.id,
-                    getattr(reaction.message.guild, "id", None),
-                ),
-            )
-            conn.commit()
+        self.record(
+            "reaction",
+            str(reaction.emoji),
+            user.id,
+            reaction.message.channel.id,
+            getattr(reaction.message.guild, "id", None),
+        )
 
     @tasks.loop(hours=24)
     async def aggregate_metrics(self):
-        one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        with sqlite3.connect(METRICS_DB) as conn:
-            c = conn.cursor()
-            c.execute(
+        if not self.archive.available:
+            # Raw events are only dropped once they made it into the archive
+            logger.warning("Event archive unavailable, keeping expired metrics")
+            return
+        await self.usage.flush()
+        cutoff = (
+            datetime.now(timezone.utc) - timedelta(days=METRICS_RAW_RETENTION_DAYS)
+        ).strftime("%Y-%m-%d %H:%M:%S")
+        # Archive in id order, a batch at a time, so memory stays bounded and
+        # everything up to `archived` is safe to delete if a later batch fails
+        archived = 0
+        while True:
+            rows = await self.db.fetchall(
                 """
-                SELECT strftime('%Y-%W', timestamp) as week, type, name, COUNT(*) as count
+                SELECT id, type, name, user_id, channel_id, guild_id, timestamp
                 FROM bot_usage
-                WHERE timestamp <= ?
-                GROUP BY week, type, name
+                WHERE timestamp <= ? AND id > ?
+                ORDER BY id
+                LIMIT ?
             """,
-                (one_week_ago.isoformat(),),
+                (cutoff, archived, METRICS_ARCHIVE_BATCH),
             )
-            results = c.fetchall()
+            if not rows:
+                break
+            try:
+                await asyncio.to_thread(self.archive.write, rows)
+            except Exception as e:
+                logger.error(f"Archiving expired metrics failed: {e}")
+                break
+            archived = rows[-1][0]
+        if archived:
+            await self.db.run(
+                lambda conn: self._aggregate_metrics(conn, cutoff, archived)
+            )
+            self.aggregations += 1
 
-            for week, typ, name, count in results:
-                c.execute(
-                    """
-                    INSERT INTO weekly_metrics (week, type, name, count)
-                    VALUES (?, ?, ?, ?)
-                """,
-                    (week, typ, name, count),
-                )
+    @staticmethod
+    def _aggregate_metrics(conn, cutoff, last_id):
+        """Fold archived events up to `last_id` into weekly_metrics, then drop them."""
+        c = conn.cursor()
+        c.execute(
+            """
+            SELECT strftime('%Y-%W', timestamp) as week, type, name, COUNT(*) as count
+            FROM bot_usage
+            WHERE timestamp <= ? AND id <= ?
+            GROUP BY week, type, name
+        """,
+            (cutoff, last_id),
+        )
+        results = c.fetchall()
 
+        for week, typ, name, count in results:
             c.execute(
-                "DELETE FROM bot_usage WHERE timestamp <= ?",
-                (one_week_ago.isoformat(),),
+                """
+                INSERT INTO weekly_metrics (week, type, name, count)
+                VALUES (?, ?, ?, ?)
+            """,
+                (week, typ, name, count),
             )
-            conn.commit()
+
+        c.execute(
+            "DELETE FROM bot_usage WHERE timestamp <= ? AND id <= ?", (cutoff, last_id)
+        )
 
     @aggregate_metrics.before_loop
     async def before_aggregate_metrics(self):
         await self.bot.wait_until_ready()
 
-    def create_plot_and_send(self, ctx, df, title, xlabel, ylabel):
-        rcParams["font.family"] = "Symbola"
-
-        plt.figure(figsize=(10, 6))
-        df.plot()
-        plt.title(title)
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-        plt.close()
-        return discord.File(buf, filename="plot.png")
+    def data_version(self):
+        return (self.usage.flushes, self.aggregations)
+
+    def emoji_data_version(self):
+        emoji_cog = self.bot.get_cog("EmojiUsageCog")
+        return emoji_cog.usage.flushes if emoji_cog else None
+
+    async def send_chart(self, ctx, key, version, build, filename="plot.png"):
+        """Send the chart for `key`, rendering it with `build()` on a cache miss.
+
+        `build` reads the data and returns the PNG. `version()` is checked
+        after it ran, so the entry is tagged with the data it actually saw.
+        """
+        png = self.charts.get(key, version())
+        if png is None:
+            png = await build()
+            self.charts.put(key, version(), png)
+        await ctx.send(file=discord.File(io.BytesIO(png), filename=filename))
 
     @commands.command(name="emoji_usage")
     async def emoji_usage(self, ctx):
         """Show overall emoji usage metrics."""
-        with sqlite3.connect(EMOJI_DB) as conn:
-            df = pd.read_sql_query(
-                """
-                SELECT emoji, SUM(usage_count) as total_usage
-                FROM emoji_usage
-                GROUP BY emoji
-                ORDER BY total_usage DESC
-                LIMIT 10
-                """,
-                conn,
+        emoji_cog = self.bot.get_cog("EmojiUsageCog")
+        if emoji_cog is None:
+            await ctx.send("Emoji tracking isn't loaded.")
+            return
+
+        async def build():
+            df = pd.DataFrame(
+                emoji_cog.topk.top("emoji", 10), columns=["emoji", "total_usage"]
             )
-        df.set_index("emoji", inplace=True)
-        file = self.create_plot_and_send(ctx, df, "Top Emojis", "Emoji", "Usage Count")
-        await ctx.send(file=file)
+            df.set_index("emoji", inplace=True)
+            return await charts.render(df, "Top Emojis", "Emoji", "Usage Count")
+
+        await self.send_chart(ctx, ("emoji_usage",), self.emoji_data_version, build)
 
     @commands.command(name="emoji_trends")
     async def emoji_trends(self, ctx, emoji_char: str):
         """Show usage trends for a specific emoji. format: <emoji>:str"""
-        with sqlite3.connect(EMOJI_DB) as conn:
-            df = pd.read_sql_query(
+
+        async def build():
+            df = await self.read_frame(
+                self.emoji_db,
                 """
-                SELECT date(last_used) as day, SUM(usage_count) as count
-                FROM emoji_usage
+                SELECT day, count
+                FROM emoji_daily
                 WHERE emoji = ?
-                GROUP BY day
                 ORDER BY day ASC
                 """,
-                conn,
                 params=(emoji_char,),
             )
-        df.set_index("day", inplace=True)
-        file = self.create_plot_and_send(
-            ctx, df, f"Usage Trend: {emoji_char}", "Date", "Usage Count"
+            df.set_index("day", inplace=True)
+            return await charts.render(
+                df, f"Usage Trend: {emoji_char}", "Date", "Usage Count"
+            )
+
+        await self.send_chart(
+            ctx, ("emoji_trends", emoji_char), self.emoji_data_version, build
         )
-        await ctx.send(file=file)
 
     @commands.command(name="activity_over_time")
     async def activity_over_time(self, ctx):
         """Shows the activity over time"""
-        with sqlite3.connect(METRICS_DB) as conn:
-            df = pd.read_sql_query(
+
+        async def build():
+            df = await self.read_frame(
+                self.db,
                 """
-                SELECT date(timestamp) as day, type, COUNT(*) as count
-                FROM bot_usage
+                SELECT day, type, SUM(count) as count
+                FROM usage_daily
                 GROUP BY day, type
                 ORDER BY day ASC
             """,
-                conn,
             )
-        pivot = df.pivot(index="day", columns="type", values="count").fillna(0)
-        file = self.create_plot_and_send(
-            ctx, pivot, "Bot Activity Over Time", "Date", "Count"
-        )
-        await ctx.send(file=file)
+            pivot = df.pivot(index="day", columns="type", values="count").fillna(0)
+            return await charts.render(pivot, "Bot Activity Over Time", "Date", "Count")
+
+        await self.send_chart(ctx, ("activity_over_time",), self.data_version, build)
+
+    @commands.command(name="recent_activity")
+    async def recent_activity(self, ctx, days: int = 7):
+        """Activity per hour (UTC) over the last few days. format: [days]:int"""
+        if not 1 <= days <= USAGE_HOURLY_RETENTION_DAYS:
+            await ctx.send(
+                f"Pick between 1 and {USAGE_HOURLY_RETENTION_DAYS} days, "
+                "older hourly activity isn't kept."
+            )
+            return
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        start = since.strftime("%Y-%m-%d %H:00")
+
+        async def build():
+            df = await self.read_frame(
+                self.db,
+                """
+                SELECT hour, type, SUM(count) as count
+                FROM usage_hourly
+                WHERE hour >= ?
+                GROUP BY hour, type
+            """,
+                params=(start,),
+            )
+            # Quiet hours have no rows, plot them as zero
+            hours = pd.date_range(start, periods=days * 24 + 1, freq="h")
+            pivot = (
+                df.pivot(index="hour", columns="type", values="count")
+                .reindex(hours.strftime("%Y-%m-%d %H:00"))
+                .fillna(0)
+            )
+            return await charts.render(
+                pivot, f"Activity, last {days} days", "Hour (UTC)", "Count"
+            )
+
+        await self.send_chart(ctx, ("recent_activity", days), self.data_version, build)
 
     @commands.command(name="top_users")
     async def top_users(self, ctx):
         """Show the top users"""
-        with sqlite3.connect(METRICS_DB) as conn:
-            df = pd.read_sql_query(
+
+        async def build():
+            df = await self.read_frame(
+                self.db,
                 """
-                SELECT user_id, type, COUNT(*) as count
-                FROM bot_usage
+                SELECT user_id, type, SUM(count) as count
+                FROM usage_daily
+                WHERE user_id != 0
                 GROUP BY user_id, type
             """,
-                conn,
             )
 
-        top = df.groupby("user_id")["count"].sum().sort_values(ascending=False).head(10)
-
-        # Resolve user_ids to display names (with caching)
-        display_names = []
-        for user_id in top.index:
-            if user_id in self.user_cache:
-                name = self.user_cache[user_id]
-            else:
-                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
-                name = user.display_name if hasattr(user, "display_name") else user.name
-                self.user_cache[user_id] = name
-            display_names.append(name)
-
-        top.index = display_names  # Replace user_id with display names
-
-        top.plot(kind="bar", figsize=(10, 6), title="Top Users by Total Activity")
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-        plt.close()
-        await ctx.send(file=discord.File(buf, filename="top_users.png"))
+            top = (
+                df.groupby("user_id")["count"]
+                .sum()
+                .sort_values(ascending=False)
+                .head(10)
+            )
+
+            # Resolve user_ids to display names
+            names = await self.bot.directory.user_names(top.index.tolist())
+            top.index = [names[user_id] or f"User {user_id}" for user_id in top.index]
+
+            return await charts.render(top, "Top Users by Total Activity", kind="bar")
+
+        await self.send_chart(
+            ctx,
+            ("top_users",),
+            self.data_version,
+            build,
+            filename="top_users.png",
+        )
 
     @commands.command(name="channel_breakdown")
     async def channel_breakdown(self, ctx):
         """Show the channel breakdown graph"""
-        with sqlite3.connect(METRICS_DB) as conn:
-            df = pd.read_sql_query(
+
+        async def build():
+            df = await self.read_frame(
+                self.db,
                 """
-                SELECT channel_id, type, COUNT(*) as count
-                FROM bot_usage
+                SELECT channel_id, type, SUM(count) as count
+                FROM usage_daily
+                WHERE channel_id != 0
                 GROUP BY channel_id, type
             """,
-                conn,
             )
 
-        # Get top 10 by total activity
-        totals = (
-            df.groupby("channel_id")["count"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(10)
-        )
-        top_ids = totals.index.tolist()
-        df = df[df["channel_id"].isin(top_ids)]
-
-        # Pivot for plotting
-        pivot = df.pivot(index="channel_id", columns="type", values="count").fillna(0)
-
-        # Replace IDs with names using cache
-        display_names = []
-        for cid in pivot.index:
-            if cid in self.channel_cache:
-                name = self.channel_cache[cid]
-            else:
-                channel = self.bot.get_channel(cid)
-                if channel is None:
-                    try:
-                        channel = await self.bot.fetch_channel(cid)
-                    except discord.NotFound:
-                        channel = None
-                name = channel.name if channel else f"Unknown ({cid})"
-                self.channel_cache[cid] = name
-            display_names.append(name)
-
-        pivot.index = display_names
-
-        file = self.create_plot_and_send(
-            ctx, pivot, "Top Channels by Type", "Channel", "Count"
-        )
-        await ctx.send(file=file)
+            # Get top 10 by total activity
+            totals = (
+                df.groupby("channel_id")["count"]
+                .sum()
+                .sort_values(ascending=False)
+                .head(10)
+            )
+            top_ids = totals.index.tolist()
+            df = df[df["channel_id"].isin(top_ids)]
+
+            # Pivot for plotting
+            pivot = df.pivot(index="channel_id", columns="type", values="count").fillna(
+                0
+            )
+
+            # Replace IDs with names
+            names = await self.bot.directory.channel_names(pivot.index.tolist())
+            pivot.index = [names[cid] or f"Unknown ({cid})" for cid in pivot.index]
+
+            return await charts.render(
+                pivot, "Top Channels by Type", "Channel", "Count"
+            )
+
+        await self.send_chart(ctx, ("channel_breakdown",), self.data_version, build)
 
     @commands.command(name="command_usage")
     async def command_usage(self, ctx):
         """Shows the aggregate command usage"""
-        with sqlite3.connect(METRICS_DB) as conn:
-            df = pd.read_sql_query(
-                """
-                SELECT name, COUNT(*) as count FROM bot_usage
-                WHERE type = 'command'
-                GROUP BY name ORDER BY count DESC LIMIT 10
-            """,
-                conn,
-            )
-        df.set_index("name", inplace=True)
-        file = self.create_plot_and_send(ctx, df, "Top Commands", "Command", "Count")
-        await ctx.send(file=file)
+
+        async def build():
+            df = pd.DataFrame(self.topk.top("command", 10), columns=["name", "count"])
+            df.set_index("name", inplace=True)
+            return await charts.render(df, "Top Commands", "Command", "Count")
+
+        await self.send_chart(ctx, ("command_usage",), self.data_version, build)
 
     @commands.command(name="weekly_summary")
     async def weekly_summary(self, ctx):
         """Show the weekly summary"""
-        with sqlite3.connect(METRICS_DB) as conn:
-            df = pd.read_sql_query(
+
+        async def build():
+            df = await self.read_frame(
+                self.db,
                 """
                 SELECT week, type, SUM(count) as total FROM weekly_metrics
                 GROUP BY week, type ORDER BY week ASC
             """,
-                conn,
             )
-        pivot = df.pivot(index="week", columns="type", values="total").fillna(0)
-        file = self.create_plot_and_send(
-            ctx, pivot, "Weekly Bot Summary", "Week", "Total"
-        )
-        await ctx.send(file=file)
+            pivot = df.pivot(index="week", columns="type", values="total").fillna(0)
+            return await charts.render(pivot, "Weekly Bot Summary", "Week", "Total")
+
+        await self.send_chart(ctx, ("weekly_summary",), self.data_version, build)
 
     @commands.command(name="command_trends")
     async def command_trends(self, ctx, command_name):
         """Show the command trends of a particular command, format: <command_name>:str"""
-        with sqlite3.connect(METRICS_DB) as conn:
-            df = pd.read_sql_query(
+
+        async def build():
+            df = await self.read_frame(
+                self.db,
                 """
-                SELECT date(timestamp) as day, COUNT(*) as count FROM bot_usage
+                SELECT day, SUM(count) as count FROM usage_daily
                 WHERE type = 'command' AND name = ?
                 GROUP BY day ORDER BY day ASC
             """,
-                conn,
                 params=(command_name,),
             )
-        df.set_index("day", inplace=True)
-        file = self.create_plot_and_send(
-            ctx, df, f"Usage Trend: {command_name}", "Date", "Count"
+            df.set_index("day", inplace=True)
+            return await charts.render(
+                df, f"Usage Trend: {command_name}", "Date", "Count"
+            )
+
+        await self.send_chart(
+            ctx, ("command_trends", command_name), self.data_version, build
+        )
+
+    @commands.command(name="active_hours")
+    async def active_hours(self, ctx, member: discord.Member = None, weeks: int = 52):
+        """Activity by hour of day (UTC), from the full event history. format: [@member] [weeks]:int"""
+        since = datetime.now(timezone.utc) - timedelta(weeks=weeks)
+        filters = {"user_id": member.id} if member else {}
+
+        async def build():
+            df = await self.read_events(["type"], since, **filters)
+            df["hour"] = df["timestamp"].dt.hour
+            pivot = (
+                df.groupby(["hour", "type"])
+                .size()
+                .unstack(fill_value=0)
+                .reindex(range(24), fill_value=0)
+            )
+            who = member.display_name if member else "Everyone"
+            return await charts.render(
+                pivot,
+                f"Active Hours: {who}, last {weeks} weeks",
+                "Hour (UTC)",
+                "Count",
+                kind="bar",
+            )
+
+        await self.send_chart(
+            ctx,
+            ("active_hours", member.id if member else None, weeks),
+            self.data_version,
+            build,
         )
-        await ctx.send(file=file)
 
 
 async def setup(bot):
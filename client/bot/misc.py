@@ -4,7 +4,7 @@ import dice
 import discord
 from discord.ext import commands
 from bot.utilities import get_random_image_path
-from rapidfuzz import fuzz
+from bot.pipeline import MessageFeatures
 
 logger = logging.getLogger(__name__)
 from bot.constants import (
@@ -17,6 +17,14 @@ class MiscCog(commands.Cog):
         self.bot = bot
         self.bot.launch_time = discord.utils.utcnow()
 
+    async def cog_load(self):
+        self.bot.pipeline.register(
+            self.qualified_name, self.handle_message, keywords=["chup"]
+        )
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister(self.qualified_name)
+
     @commands.command(name="list", aliases=["commands"])
     async def list_commands(self, ctx):
         """Lists all commands, their parameter combinations, and aliases."""
@@ -45,6 +53,35 @@ class MiscCog(commands.Cog):
             f"Bots found: {', '.join(bots) if bots else 'No bots detected.'}"
         )
 
+    @commands.command()
+    async def voice_buffers(self, ctx):
+        """Shows the voice capture buffer memory usage"""
+        sink = getattr(self.bot, "audio_sink", None)
+        if not sink:
+            return await ctx.send("Voice capture isn't running.")
+        stats = sink.memory_stats()
+        speakers = "\n".join(
+            f"<@{user_id}>: {size // 1024} KiB"
+            for user_id, size in stats["speakers"].items()
+        )
+        await ctx.send(
+            f"Speaking: {len(stats['speakers'])} using {stats['speaker_bytes'] // 1024} KiB\n"
+            f"Pooled: {stats['pooled_buffers']} buffers, {stats['pooled_bytes'] // 1024} KiB\n"
+            f"New buffer size: {stats['buffer_target_size'] // 1024} KiB, "
+            f"allocated {stats['allocations']} total, {stats['decoders']} decoders\n"
+            f"{speakers}",
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    @commands.command()
+    async def message_pipeline(self, ctx):
+        """Shows per handler timings of the message pipeline"""
+        lines = [
+            f"`{name}`: {calls} calls, avg {avg:.2f} ms, max {slowest:.2f} ms, {errors} errors"
+            for name, calls, errors, avg, slowest in self.bot.pipeline.report()
+        ]
+        await ctx.send("\n".join(lines))
+
     @commands.command()
     async def frieren(self, ctx):
         """Sends a random image from the frieren directory."""
@@ -60,17 +97,10 @@ class MiscCog(commands.Cog):
         else:
             await ctx.send(f"No images found in the '{FRIEREN_DIR}' directory.")
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-
-        if message.author.bot:
-            return  # Ignore bot messages
-
-        content = message.content.strip()
-
-        # Check for variations of "chup" using fuzzy matching
-        if fuzz.partial_ratio(content.lower(), "chup") > 80:
-            await message.channel.send("NO U CHUP!")
+    async def handle_message(self, features: MessageFeatures):
+        # Variations of "chup", fuzzy matched by the pipeline
+        if "chup" in features.keywords:
+            await features.message.channel.send("NO U CHUP!")
             return
 
     @commands.command()
@@ -0,0 +1,155 @@
+"""Single pass message analysis shared by the chat listeners.
+
+Every non-bot message is parsed once into a `MessageFeatures` and handed to
+every registered handler concurrently, instead of every cog getting its own
+`on_message` dispatch and re-parsing the same content. Handlers are started
+in registration order, but one waiting on I/O doesn't hold up the others, so
+they must not rely on each other having finished.
+
+    async def cog_load(self):
+        self.bot.pipeline.register(self.qualified_name, self.handle_message)
+
+    async def handle_message(self, features: MessageFeatures):
+        ...
+"""
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import discord
+from rapidfuzz import fuzz
+
+from bot.constants import PIPELINE_KEYWORD_THRESHOLD
+from bot.emoji_match import extract_emojis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    message: discord.Message
+    content: str  # stripped message text
+    normalized: str  # lowercased with whitespace collapsed
+    emojis: Tuple[str, ...]
+    prefix: Optional[str]  # the command prefix the message starts with
+    command: Optional[str]  # lowercased first word after the prefix
+    mentions: Tuple[int, ...]
+    keywords: FrozenSet[str]  # registered keywords that fuzzily match
+
+
+Handler = Callable[[MessageFeatures], Awaitable]
+
+
+class HandlerStats:
+    __slots__ = ("calls", "errors", "total", "slowest")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+
+
+class MessagePipeline:
+    def __init__(self, bot):
+        self.bot = bot
+        self.handlers: Dict[str, Handler] = {}
+        self.keywords: Dict[str, FrozenSet[str]] = {}
+        self.stats: Dict[str, HandlerStats] = {}
+        self.parse_stats = HandlerStats()
+
+    def register(self, name: str, handler: Handler, keywords: Iterable[str] = ()):
+        """Add a handler, called for every message."""
+        self.handlers[name] = handler
+        self.keywords[name] = frozenset(keyword.lower() for keyword in keywords)
+        self.stats.setdefault(name, HandlerStats())
+
+    def unregister(self, name: str):
+        self.handlers.pop(name, None)
+        self.keywords.pop(name, None)
+
+    def _prefix(self, content: str) -> Optional[str]:
+        prefixes = self.bot.command_prefix
+        if isinstance(prefixes, str):
+            prefixes = (prefixes,)
+        elif not isinstance(prefixes, (list, tuple)):
+            return None  # callable prefixes need the message, not supported here
+        for prefix in prefixes:
+            if content.startswith(prefix):
+                return prefix
+        return None
+
+    def parse(self, message: discord.Message) -> MessageFeatures:
+        content = message.content.strip()
+        normalized = " ".join(content.lower().split())
+        prefix = self._prefix(content)
+        command = None
+        if prefix:
+            words = content[len(prefix) :].split(maxsplit=1)
+            command = words[0].lower() if words else None
+        wanted = frozenset().union(*self.keywords.values())
+        keywords = frozenset(
+            keyword
+            for keyword in wanted
+            if fuzz.partial_ratio(normalized, keyword) > PIPELINE_KEYWORD_THRESHOLD
+        )
+        return MessageFeatures(
+            message=message,
+            content=content,
+            normalized=normalized,
+            emojis=tuple(extract_emojis(message.content)),
+            prefix=prefix,
+            command=command,
+            mentions=tuple(user.id for user in message.mentions),
+            keywords=keywords,
+        )
+
+    async def on_message(self, message: discord.Message):
+        if message.author.bot or not self.handlers:
+            return
+
+        start = time.perf_counter()
+        features = self.parse(message)
+        self.parse_stats.record(time.perf_counter() - start)
+
+        await asyncio.gather(
+            *(
+                self._dispatch(name, handler, features)
+                for name, handler in list(self.handlers.items())
+            ),
+            return_exceptions=True,
+        )
+
+    async def _dispatch(self, name: str, handler: Handler, features: MessageFeatures):
+        stats = self.stats[name]
+        start = time.perf_counter()
+        try:
+            await handler(features)
+        except Exception as e:
+            stats.errors += 1
+            logger.exception(f"Message handler {name} failed: {e}")
+        # Wall time, including any time spent waiting on the other handlers
+        stats.record(time.perf_counter() - start)
+
+    def report(self) -> list:
+        """(name, calls, errors, avg ms, max ms) rows, slowest average first."""
+        rows = [
+            (
+                name,
+                stats.calls,
+                stats.errors,
+                1000 * stats.total / stats.calls if stats.calls else 0.0,
+                1000 * stats.slowest,
+            )
+            for name, stats in [("parse", self.parse_stats), *self.stats.items()]
+        ]
+        rows.sort(key=lambda row: -row[3])
+        return rows
@@ -1,36 +1,145 @@
-import sqlite3
+import re
+import random
+import hashlib
 import discord
 from discord.ext import commands
 import logging
 
+from bot.constants import QUOTES_DB, QUOTE_RANDOM_ATTEMPTS
+from bot.database import get_database
+
 logger = logging.getLogger(__name__)
 
 
-# Connect to your SQLite DB
-conn = sqlite3.connect("quotes.db")
-c = conn.cursor()
+def quote_hash(author, quote_text):
+    """Dedupe key for a quote, the same text from the same author."""
+    normalized = " ".join(quote_text.split()).lower()
+    return hashlib.sha256(f"{author or ''}\0{normalized}".encode()).hexdigest()
+
 
-# Ensure quotes table exists
-c.execute(
-    """
-CREATE TABLE IF NOT EXISTS quotes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    author TEXT,
-    quote_text TEXT NOT NULL,
-    added_by TEXT,
-    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    source TEXT,
-    pinned BOOLEAN DEFAULT 0
-)
-"""
-)
-conn.commit()
+def match_query(keyword):
+    """Turn user input into an FTS5 query, every word as a quoted prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", keyword))
 
 
 class QuoteCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.quote_emoji = "🏆"
+        self.db = get_database(QUOTES_DB)
+
+    async def cog_load(self):
+        await self.db.run(self._ensure_tables)
+
+    @staticmethod
+    def _ensure_tables(conn):
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            author TEXT,
+            quote_text TEXT NOT NULL,
+            added_by TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            source TEXT,
+            pinned BOOLEAN DEFAULT 0
+        )
+        """
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(quotes)")}
+        if "content_hash" not in columns:
+            conn.execute("ALTER TABLE quotes ADD COLUMN content_hash TEXT")
+            # Only the first copy of an existing duplicate gets its hash
+            seen = set()
+            updates = []
+            for id, author, quote_text in conn.execute(
+                "SELECT id, author, quote_text FROM quotes ORDER BY id"
+            ):
+                digest = quote_hash(author, quote_text)
+                if digest not in seen:
+                    seen.add(digest)
+                    updates.append((digest, id))
+            conn.executemany("UPDATE quotes SET content_hash = ? WHERE id = ?", updates)
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_quotes_content_hash ON quotes(content_hash)"
+        )
+
+        # Full text index over the quotes table, kept in sync by triggers
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'quotes_fts'"
+        ).fetchone()
+        conn.executescript(
+            """
+        CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+            quote_text, author, content='quotes', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN
+            INSERT INTO quotes_fts (rowid, quote_text, author)
+            VALUES (new.id, new.quote_text, new.author);
+        END;
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, quote_text, author)
+            VALUES ('delete', old.id, old.quote_text, old.author);
+        END;
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE OF quote_text, author ON quotes
+        BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, quote_text, author)
+            VALUES ('delete', old.id, old.quote_text, old.author);
+            INSERT INTO quotes_fts (rowid, quote_text, author)
+            VALUES (new.id, new.quote_text, new.author);
+        END;
+        """
+        )
+        if not exists:
+            conn.execute("INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')")
+
+    async def save_quote(self, author, quote_text, added_by, source=None) -> bool:
+        """Insert a quote, False if the same author already has this quote."""
+        rowcount = await self.db.execute(
+            """
+            INSERT OR IGNORE INTO quotes
+                (author, quote_text, added_by, source, content_hash)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+            (author, quote_text, added_by, source, quote_hash(author, quote_text)),
+        )
+        return rowcount > 0
+
+    @staticmethod
+    def _random_quote(conn):
+        """Pick a random rowid in range, retrying on gaps left by deletes."""
+        low, high = conn.execute("SELECT min(id), max(id) FROM quotes").fetchone()
+        if low is None:
+            return None
+        query = "SELECT id, author, quote_text, source FROM quotes WHERE id = ?"
+        for _ in range(QUOTE_RANDOM_ATTEMPTS):
+            row = conn.execute(query, (random.randint(low, high),)).fetchone()
+            if row:
+                return row
+        # Mostly gaps, settle for the next quote after a random point
+        return conn.execute(
+            "SELECT id, author, quote_text, source FROM quotes WHERE id >= ? ORDER BY id LIMIT 1",
+            (random.randint(low, high),),
+        ).fetchone()
+
+    async def search(self, keyword, limit=10):
+        """(id, author, quote_text, snippet) rows, best match first."""
+        query = match_query(keyword)
+        if not query:
+            return []
+        return await self.db.fetchall(
+            """
+            SELECT quotes.id, quotes.author, quotes.quote_text,
+                snippet(quotes_fts, 0, '**', '**', '…', 16)
+            FROM quotes_fts
+            JOIN quotes ON quotes.id = quotes_fts.rowid
+            WHERE quotes_fts MATCH ?
+            ORDER BY quotes_fts.rank
+            LIMIT ?
+        """,
+            (query, limit),
+        )
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User):
@@ -43,20 +152,11 @@ class QuoteCog(commands.Cog):
 
         message = reaction.message
 
-        # Avoid re-quoting already quoted messages if needed
-        c.execute(
-            "SELECT 1 FROM quotes WHERE quote_text = ? AND author = ?",
-            (message.content, str(message.author)),
-        )
-        if c.fetchone():
-            return  # Already quoted
-
-        # Save quote to the DB
-        c.execute(
-            "INSERT INTO quotes (author, quote_text, added_by, source) VALUES (?, ?, ?, ?)",
-            (str(message.author), message.content, str(user), message.jump_url),
-        )
-        conn.commit()
+        # Already quoted messages hit the content hash index and are skipped
+        if not await self.save_quote(
+            str(message.author), message.content, str(user), message.jump_url
+        ):
+            return
 
         await message.channel.send(
             f"🏆 Quote saved from {message.author.display_name}!"
@@ -67,21 +167,21 @@ class QuoteCog(commands.Cog):
         """Spits out a random quote, or a specific quote if a number is passed in"""
         if arg is None:
             # Fetch random quote
-            c.execute(
-                "SELECT id, author, quote_text, source FROM quotes ORDER BY RANDOM() LIMIT 1"
-            )
+            result = await self.db.run(self._random_quote)
         elif arg.isdigit():
-            c.execute(
+            result = await self.db.fetchone(
                 "SELECT id, author, quote_text, source FROM quotes WHERE id = ?", (arg,)
             )
         else:
-            # Search quotes by keyword
-            c.execute(
-                "SELECT id, author, quote_text FROM quotes WHERE quote_text LIKE ?",
-                (f"%{arg}%",),
-            )
+            # Best match for the keyword
+            matches = await self.search(arg, limit=1)
+            result = None
+            if matches:
+                result = await self.db.fetchone(
+                    "SELECT id, author, quote_text, source FROM quotes WHERE id = ?",
+                    (matches[0][0],),
+                )
 
-        result = c.fetchone()
         if result:
             id, author, quote_text, source = result
             await ctx.send(
@@ -102,11 +202,9 @@ class QuoteCog(commands.Cog):
             author = None
             quote = text.strip()
 
-        c.execute(
-            "INSERT INTO quotes (author, quote_text, added_by) VALUES (?, ?, ?)",
-            (author, quote, str(ctx.author)),
-        )
-        conn.commit()
+        if not await self.save_quote(author, quote, str(ctx.author)):
+            await ctx.send("That quote is already saved.")
+            return
         await ctx.send("Quote added! ✅")
 
     @commands.command(name="listquotes", aliases=["lq"])
@@ -114,11 +212,10 @@ class QuoteCog(commands.Cog):
         """List the quotes, format: <page>:int"""
         per_page = 5
         offset = (page - 1) * per_page
-        c.execute(
+        quotes = await self.db.fetchall(
             "SELECT id, author, quote_text FROM quotes ORDER BY id LIMIT ? OFFSET ?",
             (per_page, offset),
         )
-        quotes = c.fetchall()
         if not quotes:
             await ctx.send("No quotes found on that page.")
             return
@@ -134,25 +231,20 @@ class QuoteCog(commands.Cog):
     @commands.has_permissions(manage_messages=True)
     async def deletequote(self, ctx, id: int):
         """Delete a specific quote passin in a number, format: <number>:int"""
-        c.execute("DELETE FROM quotes WHERE id = ?", (id,))
-        conn.commit()
+        await self.db.execute("DELETE FROM quotes WHERE id = ?", (id,))
         await ctx.send(f"Quote #{id} deleted! 🗑️")
 
     @commands.command(name="searchquote", aliases=["sq"])
     async def searchquote(self, ctx, *, keyword):
         """Search quotes for a keyword, format: <keyword>:str"""
-        c.execute(
-            "SELECT id, author, quote_text FROM quotes WHERE quote_text LIKE ?",
-            (f"%{keyword}%",),
-        )
-        results = c.fetchall()
+        results = await self.search(keyword)
         if not results:
             await ctx.send("No quotes matching that keyword.")
             return
         text = "\n".join(
             [
-                f"**#{id}** {author+': ' if author else ''}{quote}"
-                for id, author, quote in results
+                f"**#{id}** {author+': ' if author else ''}{snippet}"
+                for id, author, _, snippet in results
             ]
         )
         await ctx.send(f"**Search Results:**\n{text[:2000]}")
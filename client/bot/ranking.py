@@ -0,0 +1,50 @@
+"""Order statistics over user scores for rank and leaderboard lookups."""
+
+from bisect import bisect_left, insort
+from typing import List, Optional, Tuple
+
+
+class Ranking:
+    """Users sorted by score, highest first.
+
+    Entries are kept as `(-score, user_id)` in a sorted list, so finding a
+    user's rank is a binary search and the leaderboard is a slice. Updates
+    move a single entry instead of re-sorting.
+    """
+
+    def __init__(self, scores: Optional[dict] = None):
+        self.scores: dict[int, int] = dict(scores or {})
+        self.order: List[Tuple[int, int]] = sorted(
+            (-score, user_id) for user_id, score in self.scores.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.scores
+
+    def update(self, user_id: int, score: int):
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self.order[bisect_left(self.order, (-old, user_id))]
+        self.scores[user_id] = score
+        insort(self.order, (-score, user_id))
+
+    def remove(self, user_id: int):
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            del self.order[bisect_left(self.order, (-old, user_id))]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based position of the user, or None if they have no score."""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self.order, (-score, user_id)) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, int]]:
+        """The `limit` best (user_id, score) pairs."""
+        return [(user_id, -neg) for neg, user_id in self.order[:limit]]
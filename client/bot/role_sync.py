@@ -0,0 +1,115 @@
+"""Bulk level role sync.
+
+Works out the role list every member should have and only calls Discord
+for members whose roles actually differ, one `member.edit` each. Edits run
+through a small semaphore and back off when Discord rate limits us.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+import discord
+
+from bot.constants import (
+    LEVEL_ROLE_MAPPING,
+    ROLE_SYNC_CONCURRENCY,
+    ROLE_SYNC_MAX_RETRIES,
+    ROLE_SYNC_PROGRESS_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+LEVEL_ROLE_IDS = frozenset(LEVEL_ROLE_MAPPING.values())
+
+
+def level_role_id(level: int) -> Optional[int]:
+    """The highest level role unlocked at `level`."""
+    role_id = None
+    for level_req, mapped_id in sorted(LEVEL_ROLE_MAPPING.items()):
+        if level >= level_req:
+            role_id = mapped_id
+    return role_id
+
+
+def desired_roles(member: discord.Member, level: int) -> Optional[list]:
+    """Member's roles with exactly one level role, or None if nothing changes."""
+    target = member.guild.get_role(level_role_id(level))
+    if target is None:
+        return None
+    current = [role for role in member.roles if not role.is_default()]
+    roles = [role for role in current if role.id not in LEVEL_ROLE_IDS]
+    roles.append(target)
+    if set(roles) == set(current):
+        return None
+    return roles
+
+
+class RoleSync:
+    """Applies level roles to many members with bounded concurrency."""
+
+    def __init__(self, concurrency: int = ROLE_SYNC_CONCURRENCY):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.total = 0
+        self.checked = 0
+        self.changed = 0
+        self.failed = 0
+
+    async def edit_roles(self, member: discord.Member, roles: list) -> bool:
+        for attempt in range(ROLE_SYNC_MAX_RETRIES + 1):
+            try:
+                async with self.semaphore:
+                    await member.edit(roles=roles, reason="Level role sync")
+                return True
+            except discord.Forbidden as e:
+                logger.error(f"Failed to assign roles for {member.display_name}: {e}")
+                return False
+            except discord.HTTPException as e:
+                retryable = e.status == 429 or e.status >= 500
+                if not retryable or attempt == ROLE_SYNC_MAX_RETRIES:
+                    logger.error(
+                        f"Failed to assign roles for {member.display_name}: {e}"
+                    )
+                    return False
+                # discord.py already waits out 429 buckets it knows about,
+                # this covers what still gets through
+                delay = 2**attempt
+                logger.warning(
+                    f"Role edit for {member.display_name} got {e.status}, retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
+        return False
+
+    async def sync_member(self, member: discord.Member, level: int) -> bool:
+        """Bring one member's level role in line, returns False on failure."""
+        roles = desired_roles(member, level)
+        ok = True
+        if roles is not None:
+            ok = await self.edit_roles(member, roles)
+            if ok:
+                self.changed += 1
+        if not ok:
+            self.failed += 1
+        self.checked += 1
+        return ok
+
+    async def run(
+        self,
+        members: Iterable[Tuple[discord.Member, int]],
+        progress: Optional[Callable[["RoleSync"], Awaitable]] = None,
+    ):
+        """Sync every (member, level) pair, reporting progress periodically."""
+        members = list(members)
+        self.total = len(members)
+        tasks = [
+            asyncio.create_task(self.sync_member(member, level))
+            for member, level in members
+        ]
+        last_report = time.monotonic()
+        for task in asyncio.as_completed(tasks):
+            await task
+            now = time.monotonic()
+            if progress and now - last_report >= ROLE_SYNC_PROGRESS_SECONDS:
+                last_report = now
+                await progress(self)
@@ -1,49 +1,68 @@
+import json
 import logging
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
 from discord.ext import commands
 
 logger = logging.getLogger(__name__)
 from bot.config import AvatarState
-from bot.constants import AVATAR_STATE_DB_PATH
+from bot.constants import (
+    AVATAR_STATE_KEY,
+    AVATAR_STATE_CHANNEL,
+    AVATAR_STATE_HISTORY_KEY,
+    AVATAR_STATE_HISTORY_SIZE,
+)
+from bot.redis_client import redis_client
 
 
 class StateManager(commands.Cog):
+    """Current avatar state for the Godot client.
+
+    The state lives in memory. Every change is written to Redis as the
+    current value, published on `AVATAR_STATE_CHANNEL` for the API's
+    websocket stream, and pushed onto a short capped history list that
+    is only there for debugging.
+    """
+
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = AVATAR_STATE_DB_PATH
-        self._initialize_database()
-
-    def _initialize_database(self):
-        """Creates the database and table if they don't exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS avatar_state (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                state TEXT NOT NULL CHECK(state IN ('idle', 'talking', 'thinking', 'drawing')),
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """
+        self.state = None
+        # One thread, so changes reach Redis in the order they happened
+        self.publisher = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="avatar-state"
         )
-        conn.commit()
-        cursor.execute(
-            # test entries
-            # "INSERT INTO avatar_state (state) VALUES (?)", (AvatarState.TALKING.value,)
-            # "INSERT INTO avatar_state (state) VALUES (?)", (AvatarState.THINKING.value,)
-            "INSERT INTO avatar_state (state) VALUES (?)",
-            (AvatarState.IDLE.value,),
-        )
-        conn.commit()
-        conn.close()
+
+    async def cog_load(self):
+        self.update_state(AvatarState.IDLE)
+
+    async def cog_unload(self):
+        self.publisher.shutdown(wait=False)
+
+    @staticmethod
+    def _publish(payload: str):
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(AVATAR_STATE_KEY, payload)
+        pipe.publish(AVATAR_STATE_CHANNEL, payload)
+        pipe.lpush(AVATAR_STATE_HISTORY_KEY, payload)
+        pipe.ltrim(AVATAR_STATE_HISTORY_KEY, 0, AVATAR_STATE_HISTORY_SIZE - 1)
+        try:
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Publishing avatar state failed: {e}")
 
     def update_state(self, state: AvatarState):
-        """Updates the avatar state in the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO avatar_state (state) VALUES (?)", (state.value,))
-        conn.commit()
-        conn.close()
+        """Set the avatar state and publish it, without waiting on Redis."""
+        if state == self.state:
+            return
+        self.state = state
+        payload = json.dumps(
+            {
+                "state": state.value,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        self.publisher.submit(self._publish, payload)
 
     def update_state_idle(self):
         logger.info("Updating state to IDLE")
@@ -61,16 +80,9 @@ class StateManager(commands.Cog):
         logger.info("Updating state to DRAWING")
         self.update_state(AvatarState.DRAWING)
 
-    def get_current_state(self) -> str:
-        """Retrieves the most recent avatar state from the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT state FROM avatar_state ORDER BY updated_at DESC LIMIT 1"
-        )
-        row = cursor.fetchone()
-        conn.close()
-        return row[0] if row else AvatarState.IDLE.value
+    async def get_current_state(self) -> str:
+        """The current avatar state."""
+        return (self.state or AvatarState.IDLE).value
 
 
 async def setup(bot):
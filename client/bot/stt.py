@@ -0,0 +1,246 @@
+"""Speech to text backend registry with load-aware routing and failover."""
+
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import aiohttp
+
+from bot.constants import (
+    STT_REQUEST_TIMEOUT,
+    STT_MAX_IN_FLIGHT,
+    STT_HEALTH_CHECK_INTERVAL,
+    STT_LATENCY_SMOOTHING,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class STTUnavailable(Exception):
+    """The backend can't serve requests right now, try another one."""
+
+
+class STTRequestError(Exception):
+    """The backend rejected the request itself, another one would too."""
+
+
+class STTBackend(ABC):
+    """Base class for anything that can turn a wav file into text."""
+
+    def __init__(self, name: str, max_in_flight: int = STT_MAX_IN_FLIGHT):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.latency = 1.0  # smoothed seconds per request, optimistic start
+        self.healthy = True
+        self.next_health_check = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @abstractmethod
+    async def transcribe(self, audio_file_path: str) -> str:
+        """The text spoken in the wav file."""
+
+    async def health_check(self) -> bool:
+        return True
+
+    def has_capacity(self) -> bool:
+        return self.healthy and self.in_flight < self.max_in_flight
+
+    def score(self) -> float:
+        """Expected wait if one more request is routed here, lower is better."""
+        return (self.in_flight + 1) * self.latency
+
+    def record_success(self, elapsed: float):
+        self.requests += 1
+        self.latency += STT_LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def mark_unhealthy(self):
+        self.failures += 1
+        self.healthy = False
+        self.next_health_check = time.monotonic() + STT_HEALTH_CHECK_INTERVAL
+        logger.warning(f"STT backend {self.name} marked unhealthy")
+
+
+class HTTPWhisperBackend(STTBackend):
+    """A whisper.cpp compatible `/inference` HTTP endpoint."""
+
+    def __init__(self, url: str, max_in_flight: int = STT_MAX_IN_FLIGHT):
+        super().__init__(name=url, max_in_flight=max_in_flight)
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=STT_REQUEST_TIMEOUT)
+
+    async def transcribe(self, audio_file_path: str) -> str:
+        headers = {
+            "accept": "application/json",
+        }
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            with open(audio_file_path, "rb") as audio_file:
+                async with session.post(
+                    self.url, headers=headers, data={"file": audio_file}
+                ) as response:
+                    if response.status >= 500:
+                        raise STTUnavailable(
+                            f"{response.status} - {await response.text()}"
+                        )
+                    if response.status != 200:
+                        raise STTRequestError(
+                            f"{response.status} - {await response.text()}"
+                        )
+                    json_response = await response.json()
+                    return json_response.get("text", "")
+
+    async def health_check(self) -> bool:
+        # whisper.cpp serves its index page from the server root
+        base_url = self.url.rsplit("/", 1)[0] + "/"
+        try:
+            async with aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=2)
+            ) as session:
+                async with session.get(base_url) as response:
+                    return response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+
+class LocalWhisperBackend(STTBackend):
+    """In-process CPU int8 model via faster-whisper, used as extra capacity.
+
+    The model is loaded lazily on first use so the worker only pays for it
+    when the remote servers are saturated or down.
+    """
+
+    def __init__(self, model_name: str):
+        super().__init__(name=f"local:{model_name}", max_in_flight=1)
+        self.model_name = model_name
+        self.model = None
+        # CPU inference is slower than a GPU server, so prefer the remotes
+        self.latency = 5.0
+
+    def _load_model(self):
+        if self.model is None:
+            from faster_whisper import WhisperModel
+
+            logger.info(f"Loading local whisper model {self.model_name} (int8)")
+            try:
+                self.model = WhisperModel(
+                    self.model_name, device="cpu", compute_type="int8"
+                )
+            except Exception as e:
+                raise STTUnavailable(f"Loading {self.model_name} failed: {e}")
+        return self.model
+
+    def _transcribe_sync(self, audio_file_path: str) -> str:
+        segments, _ = self._load_model().transcribe(audio_file_path, beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments)
+
+    async def transcribe(self, audio_file_path: str) -> str:
+        return await asyncio.to_thread(self._transcribe_sync, audio_file_path)
+
+
+class STTRouter:
+    """Routes transcriptions to the least loaded healthy backend.
+
+    Backends are ranked by in-flight requests weighted by their observed
+    latency. A backend that is down (connection error, timeout or a 5xx) is
+    taken out of rotation and probed again after `STT_HEALTH_CHECK_INTERVAL`
+    seconds, and the request fails over to the next best backend. Any other
+    error, like a 4xx, is about the request and isn't retried elsewhere.
+    """
+
+    def __init__(self, backends: List[STTBackend]):
+        if not backends:
+            raise ValueError("At least one STT backend is required.")
+        self.backends = backends
+
+    @property
+    def capacity(self) -> int:
+        return sum(backend.max_in_flight for backend in self.backends)
+
+    async def check_health(self):
+        """Probe backends that are out of rotation and due for a retry."""
+        now = time.monotonic()
+        for backend in self.backends:
+            if backend.healthy or now < backend.next_health_check:
+                continue
+            if await backend.health_check():
+                logger.info(f"STT backend {backend.name} is healthy again")
+                backend.healthy = True
+            else:
+                backend.next_health_check = now + STT_HEALTH_CHECK_INTERVAL
+
+    def pick(self, tried=()) -> Optional[STTBackend]:
+        candidates = [
+            backend
+            for backend in self.backends
+            if backend.has_capacity() and backend not in tried
+        ]
+        if not candidates:
+            # Everything is busy, queue onto the best healthy one anyway
+            candidates = [
+                backend
+                for backend in self.backends
+                if backend.healthy and backend not in tried
+            ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda backend: backend.score())
+
+    async def transcribe(self, audio_file_path: str) -> str:
+        await self.check_health()
+        tried = []
+        while True:
+            backend = self.pick(tried)
+            if backend is None:
+                logger.error(f"No STT backend available for {audio_file_path}")
+                return ""
+            tried.append(backend)
+            backend.in_flight += 1
+            start = time.monotonic()
+            try:
+                text = await backend.transcribe(audio_file_path)
+                backend.record_success(time.monotonic() - start)
+                return text
+            except (
+                STTUnavailable,
+                aiohttp.ClientConnectionError,
+                asyncio.TimeoutError,
+            ) as e:
+                logger.error(f"STT backend {backend.name} failed: {e!r}")
+                backend.mark_unhealthy()
+            except Exception as e:
+                logger.error(
+                    f"STT backend {backend.name} rejected {audio_file_path}: {e!r}"
+                )
+                return ""
+            finally:
+                backend.in_flight -= 1
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "name": backend.name,
+                "healthy": backend.healthy,
+                "in_flight": backend.in_flight,
+                "latency": round(backend.latency, 3),
+                "requests": backend.requests,
+                "failures": backend.failures,
+            }
+            for backend in self.backends
+        ]
+
+
+def build_router(urls: List[str], local_model: str = "") -> STTRouter:
+    backends: List[STTBackend] = [HTTPWhisperBackend(url) for url in urls]
+    if local_model:
+        try:
+            import faster_whisper  # noqa: F401
+
+            backends.append(LocalWhisperBackend(local_model))
+        except ImportError:
+            logger.warning(
+                "WHISPER_LOCAL_MODEL is set but faster-whisper is not installed, skipping the local backend."
+            )
+    return STTRouter(backends)
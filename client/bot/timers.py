@@ -0,0 +1,54 @@
+"""One-shot timers at wall clock deadlines.
+
+The service only holds the in-process timers. Owners persist whatever they
+need to re-register them (the deadline and whether it already fired) and
+schedule them again on startup. A deadline that is already in the past
+fires straight away.
+
+    timers.schedule("war_end", war_end, self.end_war)
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class TimerService:
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.deadlines: Dict[str, datetime] = {}
+
+    def schedule(self, name: str, when: datetime, callback: Callable[[], Awaitable]):
+        """Run `callback()` at `when`, replacing any timer with the same name."""
+        self.cancel(name)
+        self.deadlines[name] = when
+        self.tasks[name] = asyncio.create_task(self._run(name, when, callback))
+        logger.info(f"Timer {name} scheduled for {when.isoformat()}")
+
+    async def _run(self, name: str, when: datetime, callback):
+        delay = (when - datetime.now(timezone.utc)).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Done with the timer before the callback, so it can reschedule itself
+        self.tasks.pop(name, None)
+        self.deadlines.pop(name, None)
+        try:
+            await callback()
+        except Exception as e:
+            logger.exception(f"Timer {name} failed: {e}")
+
+    def cancel(self, name: str):
+        task = self.tasks.pop(name, None)
+        self.deadlines.pop(name, None)
+        if task:
+            task.cancel()
+
+    def cancel_all(self):
+        for name in list(self.tasks):
+            self.cancel(name)
+
+    def pending(self) -> Dict[str, datetime]:
+        return dict(self.deadlines)
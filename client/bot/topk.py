@@ -0,0 +1,207 @@
+"""Bounded memory heavy hitters for the leaderboards.
+
+`SpaceSaving` keeps at most `capacity` counters (Metwally, Agrawal and El
+Abbadi). An item that isn't tracked replaces the smallest counter and
+inherits its count, remembered as the item's error, so a count is an upper
+bound that is off by at most that error. Anything used more often than
+total / capacity times is guaranteed to be in the table.
+
+`TopK` keeps one table per scope, like "emoji" or "user:1234", and
+checkpoints the scopes that changed to the owner's database every
+`TOPK_CHECKPOINT_SECONDS`, so leaderboards are answered from memory.
+
+    self.topk = TopK(self.db, {"emoji": TOPK_CAPACITY})
+    await self.topk.load(seed=self._seed_topk)
+    self.topk.add("emoji", "🔥")
+    self.topk.top("emoji", 10)
+"""
+
+import heapq
+import asyncio
+import logging
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from bot.constants import TOPK_CHECKPOINT_SECONDS, TOPK_SCOPE_CAPACITY
+from bot.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class SpaceSaving:
+    """Counters for at most `capacity` items.
+
+    A min-heap of (count, item) finds the counter to evict. Increments don't
+    touch the heap, so an entry can hold an older, lower count than the item
+    has now. Such stale entries are fixed up when they reach the top, which
+    keeps `add` O(log capacity) without a scan.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "heap")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # One entry per tracked item, its count may be out of date
+        self.heap: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def restore(self, item: str, count: int, error: int = 0):
+        """Track `item` with a known count, used when loading a checkpoint."""
+        self.counts[item] = count
+        self.errors[item] = error
+        heapq.heappush(self.heap, (count, item))
+
+    def add(self, item: str, amount: int = 1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += amount
+        elif len(counts) < self.capacity:
+            self.restore(item, amount)
+        else:
+            heap = self.heap
+            # Counts only grow, so refresh stale entries until the top is current
+            while heap[0][0] != counts[heap[0][1]]:
+                heapq.heapreplace(heap, (counts[heap[0][1]], heap[0][1]))
+            floor, victim = heap[0]
+            del counts[victim]
+            del self.errors[victim]
+            counts[item] = floor + amount
+            self.errors[item] = floor
+            heapq.heapreplace(heap, (floor + amount, item))
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """The `n` highest (item, count) pairs."""
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+
+class TopK:
+    def __init__(
+        self,
+        db: Database,
+        capacities: Optional[Dict[str, int]] = None,
+        interval: float = TOPK_CHECKPOINT_SECONDS,
+    ):
+        self.db = db
+        # Capacity by scope kind, the part before the first ":"
+        self.capacities = capacities or {}
+        self.interval = interval
+        self.tables: Dict[str, SpaceSaving] = {}
+        self.dirty: set = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def _table(self, scope: str) -> SpaceSaving:
+        table = self.tables.get(scope)
+        if table is None:
+            kind = scope.split(":", 1)[0]
+            capacity = self.capacities.get(kind, TOPK_SCOPE_CAPACITY)
+            table = self.tables[scope] = SpaceSaving(capacity)
+        return table
+
+    def add(self, scope: str, item: str, amount: int = 1):
+        self._table(scope).add(item, amount)
+        self.dirty.add(scope)
+        if self.task is None:
+            self.task = asyncio.create_task(self._checkpoint_periodically())
+
+    def top(self, scope: str, n: int) -> List[Tuple[str, int]]:
+        table = self.tables.get(scope)
+        return table.top(n) if table else []
+
+    def clear(self, prefix: str = ""):
+        """Forget every scope starting with `prefix`."""
+        for scope in [scope for scope in self.tables if scope.startswith(prefix)]:
+            del self.tables[scope]
+            self.dirty.add(scope)
+
+    @staticmethod
+    def _ensure_table(conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS topk (
+                scope TEXT NOT NULL,
+                item TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                error INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, item)
+            ) WITHOUT ROWID
+        """
+        )
+
+    async def load(
+        self, seed: Optional[Callable[..., Iterable[Tuple[str, str, int]]]] = None
+    ):
+        """Restore the last checkpoint.
+
+        With nothing checkpointed yet, `seed(conn)` can supply exact
+        (scope, item, count) rows from the existing tables. Only the
+        largest `capacity` of each scope are kept.
+        """
+
+        def load(conn):
+            self._ensure_table(conn)
+            rows = conn.execute("SELECT scope, item, count, error FROM topk").fetchall()
+            if rows or seed is None:
+                return rows, False
+            return [(*row, 0) for row in seed(conn)], True
+
+        rows, seeded = await self.db.run(load)
+        self.tables = {}
+        if seeded:
+            by_scope: Dict[str, list] = {}
+            for row in rows:
+                by_scope.setdefault(row[0], []).append(row)
+            rows = [
+                row
+                for scope, scope_rows in by_scope.items()
+                for row in heapq.nlargest(
+                    self._table(scope).capacity, scope_rows, key=itemgetter(2)
+                )
+            ]
+        for scope, item, count, error in rows:
+            self._table(scope).restore(item, count, error)
+        logger.info(
+            f"Loaded {len(rows)} top-k counters in {len(self.tables)} scopes"
+            f"{' from existing data' if seeded else ''} for {self.db.path}"
+        )
+        if seeded:
+            self.dirty.update(self.tables)
+            await self.checkpoint()
+
+    @staticmethod
+    def _write(conn, scopes, rows):
+        conn.executemany("DELETE FROM topk WHERE scope = ?", [(s,) for s in scopes])
+        conn.executemany(
+            "INSERT INTO topk (scope, item, count, error) VALUES (?, ?, ?, ?)", rows
+        )
+
+    async def checkpoint(self):
+        if not self.dirty:
+            return
+        scopes, self.dirty = self.dirty, set()
+        rows = [
+            (scope, item, count, table.errors[item])
+            for scope in scopes
+            if (table := self.tables.get(scope)) is not None
+            for item, count in table.counts.items()
+        ]
+        try:
+            await self.db.run(lambda conn: self._write(conn, scopes, rows))
+        except Exception as e:
+            logger.error(f"Top-k checkpoint to {self.db.path} failed: {e}")
+            self.dirty |= scopes
+
+    async def _checkpoint_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.checkpoint()
+
+    async def close(self):
+        """Stop the timer and write out the changed scopes."""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.checkpoint()
@@ -0,0 +1,49 @@
+import logging
+
+import discord
+from discord.ext import commands
+
+from bot.db import SQLiteDB
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = SQLiteDB()
+
+    async def cog_load(self):
+        await self.db.ensure_table()
+
+    @commands.command(name="transcripts", aliases=["tr"])
+    async def transcripts(self, ctx, *, query: str):
+        """Search the voice chat transcripts, format: <query>:str"""
+        try:
+            rows = await self.db.search(query)
+        except Exception as e:
+            logger.error(f"Transcript search failed for {query}: {e}")
+            await ctx.send("Couldn't search the transcripts for that.")
+            return
+
+        if not rows:
+            await ctx.send("No transcripts matching that.")
+            return
+
+        lines = []
+        for user_id, spoken_at, snippet in rows:
+            member = ctx.guild.get_member(int(user_id)) if ctx.guild else None
+            name = member.display_name if member else f"User {user_id}"
+            lines.append(f"`{spoken_at}` **{name}**: {snippet}")
+
+        embed = discord.Embed(
+            title=f"🎙️ Transcripts for: {query}"[:256],
+            description="\n".join(lines)[:4096],
+            color=discord.Color.blurple(),
+        )
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(TranscriptCog(bot))
+    logger.info("Transcript Cog loaded successfully.")
@@ -216,6 +216,7 @@ async def start_capture(guild, channel, bot):
 
         ring_buffer_sink = RingBufferAudioSink(bot=bot, buffer_size=1024 * 1024)
         vc.listen(ring_buffer_sink)
+        bot.audio_sink = ring_buffer_sink
         logger.info(f"Recording started in channel {channel.name}")
         logger.info(f"Sweeping channel {channel.name} for existing members...")
         for member in channel.members:
@@ -1,28 +1,41 @@
 """Derfbot, the logical iteration of DORFBOT"""
 
+import signal
 import asyncio
 import logging
 
-from bot.bots import DerfBot, NicBot
 from bot.log_config import setup_logging
-from bot.config import NIC_DISCORD_BOT_TOKEN, DISCORD_BOT_TOKEN
 
-import logging
-
-setup_logging()
 logger = logging.getLogger(__name__)
 
-# Create bots
-derf_bot = DerfBot()
-nic_bot = NicBot()
-
 
 async def main():
-    await asyncio.gather(
-        nic_bot.start(NIC_DISCORD_BOT_TOKEN),
-        derf_bot.start(DISCORD_BOT_TOKEN),
+    # Imported here rather than at the top: chart render workers are spawned
+    # and re-import this module, and must not load the bots, kokoro and torch
+    from bot.bots import DerfBot, NicBot
+    from bot.config import NIC_DISCORD_BOT_TOKEN, DISCORD_BOT_TOKEN
+    from bot.database import close_databases
+
+    # Create bots
+    derf_bot = DerfBot()
+    nic_bot = NicBot()
+
+    # Shut down through the finally below on SIGTERM too, not only Ctrl-C
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
     )
+    try:
+        await asyncio.gather(
+            nic_bot.start(NIC_DISCORD_BOT_TOKEN),
+            derf_bot.start(DISCORD_BOT_TOKEN),
+        )
+    finally:
+        # Closing the bots unloads their cogs, which flush what they buffer
+        await asyncio.gather(nic_bot.close(), derf_bot.close())
+        # Let the database threads finish queued writes
+        close_databases()
 
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
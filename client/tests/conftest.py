@@ -0,0 +1,7 @@
+import os
+
+# bot.config refuses to import without these, the tests never talk to Discord
+for name in ("AUTH_TOKEN", "NIC_DISCORD_BOT_TOKEN", "DISCORD_BOT_TOKEN"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("VOICE_CHANNEL_ID", "0")
+os.environ.setdefault("CHAT_CHANNEL_ID", "0")
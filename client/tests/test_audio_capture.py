@@ -0,0 +1,144 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from bot import audio_capture
+from bot.audio_capture import BufferPool, RingBuffer, RingBufferAudioSink
+
+
+def test_ring_buffer_wraps_and_keeps_newest():
+    buffer = RingBuffer(8)
+    buffer.write(b"abcdef")
+    buffer.write(b"ghij")
+    assert buffer.length == 8
+    assert buffer.read_all() == b"cdefghij"
+    assert buffer.is_empty()
+
+
+def test_ring_buffer_wraps_after_read():
+    buffer = RingBuffer(8)
+    buffer.write(b"abcdef")
+    buffer.read_all()
+    buffer.write(b"123456")
+    assert buffer.read_all() == b"123456"
+
+
+def test_ring_buffer_oversized_write_keeps_tail():
+    buffer = RingBuffer(4)
+    buffer.write(b"abcdefgh")
+    assert buffer.read_all() == b"efgh"
+
+
+def test_ring_buffer_grows_up_to_max_size():
+    buffer = RingBuffer(4, max_size=16)
+    buffer.write(b"abc")
+    buffer.write(b"defgh")
+    assert buffer.size == 8
+    assert buffer.read_all() == b"abcdefgh"
+    buffer.write(bytes(range(20)))
+    assert buffer.size == 16
+    assert buffer.read_all() == bytes(range(4, 20))
+
+
+def test_buffer_pool_reuses_released_buffers():
+    pool = BufferPool(initial_size=4, max_size=16, max_free=1)
+    first = pool.acquire()
+    first.write(b"abcdefgh")
+    pool.release(first, 8)
+    assert pool.acquire() is first
+    assert first.is_empty()
+    assert pool.allocations == 1
+
+
+def drain_flushes():
+    """Wait until every save queued before now has finished."""
+    workers = audio_capture.flush_executor._max_workers
+    barrier = threading.Barrier(workers)
+    for future in [
+        audio_capture.flush_executor.submit(barrier.wait) for _ in range(workers)
+    ]:
+        future.result()
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    loop = asyncio.new_event_loop()
+    saved = []
+    monkeypatch.setattr(
+        audio_capture, "save_audio", lambda user_id, pcm, out: saved.append(user_id)
+    )
+    monkeypatch.setattr(
+        audio_capture, "redis_client", SimpleNamespace(lpush=lambda *args: None)
+    )
+    sink = RingBufferAudioSink(SimpleNamespace(loop=loop), output_dir=str(tmp_path))
+    sink.saved = saved
+    yield sink
+    # Flush what a test left behind while save_audio is still patched
+    sink.cleanup()
+    drain_flushes()
+    loop.close()
+
+
+def test_cleanup_releases_every_speaker(sink):
+    for user_id in (1, 2):
+        sink.ring_buffers[user_id] = buffer = sink.pool.acquire()
+        buffer.write(b"\x01\x02")
+        sink.decoders[user_id] = object()
+
+    sink.cleanup()
+    drain_flushes()
+
+    assert sorted(sink.saved) == [1, 2]
+    assert sink.ring_buffers == {}
+    assert sink.decoders == {}
+    assert len(sink.pool.free) == 2
+
+
+class RecordingDecoder:
+    def __init__(self):
+        self.calls = []
+
+    def decode(self, data, *, fec=False):
+        self.calls.append((data, fec))
+        return b"pcm"
+
+
+def voice(opus):
+    return SimpleNamespace(packet=SimpleNamespace(), opus=opus)
+
+
+LOST = SimpleNamespace(packet=None, opus=b"")
+VOICED = bytes([0x78]) + bytes(60)
+
+
+def test_lost_packets_are_concealed(sink, monkeypatch):
+    monkeypatch.setattr(audio_capture, "Decoder", RecordingDecoder)
+    member = SimpleNamespace(id=1)
+    sink.write(member, voice(VOICED))
+    sink.write(member, LOST)
+    sink.write(member, LOST)
+    sink.write(member, voice(VOICED))
+
+    assert sink.decoders[1].calls == [
+        (VOICED, False),
+        (None, False),
+        (VOICED, True),
+        (VOICED, False),
+    ]
+    assert sink.ring_buffers[1].read_all() == b"pcm" * 4
+
+
+def test_silence_starts_a_fresh_decoder(sink, monkeypatch):
+    monkeypatch.setattr(audio_capture, "Decoder", RecordingDecoder)
+    member = SimpleNamespace(id=1)
+    sink.write(member, voice(VOICED))
+    first = sink.decoders[1]
+    sink.write(member, voice(b"\xf8\xff\xfe"))
+    sink.write(member, LOST)
+    sink.write(member, voice(VOICED))
+
+    assert sink.frames_skipped == 1
+    assert sink.decoders[1] is not first
+    assert sink.decoders[1].calls == [(VOICED, False)]
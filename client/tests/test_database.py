@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from bot.database import Database, WriteBehind
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    db.call(lambda conn: conn.execute("CREATE TABLE hits (key TEXT PRIMARY KEY, n)"))
+    yield db
+    db.close()
+
+
+def upsert(conn, items):
+    conn.executemany(
+        "INSERT INTO hits VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET n = n + excluded.n",
+        items,
+    )
+
+
+def hits(db):
+    return dict(db.call(lambda conn: conn.execute("SELECT * FROM hits").fetchall()))
+
+
+def test_write_behind_aggregates_counts(db):
+    async def scenario():
+        buffer = WriteBehind(db, upsert, aggregate=True, max_events=100)
+        for key in "aabac":
+            buffer.add((key,))
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert hits(db) == {"a": 3, "b": 1, "c": 1}
+    assert buffer.flushes == 1
+
+
+def test_write_behind_restores_items_when_the_write_fails(db):
+    failures = [RuntimeError("disk I/O error")]
+
+    def flaky(conn, items):
+        if failures:
+            raise failures.pop()
+        upsert(conn, items)
+
+    async def scenario():
+        buffer = WriteBehind(db, flaky, aggregate=True, max_events=100)
+        buffer.add(("a",), 2)
+        await buffer.flush()
+        assert buffer.events == 1 and buffer.counts == {("a",): 2}
+        buffer.add(("a",))
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert hits(db) == {"a": 3}
+
+
+def test_write_behind_restores_items_when_cancelled_before_the_write(db):
+    gate = threading.Event()
+    # Hold the database thread so the flush is still queued when cancelled
+    db.submit(lambda conn: gate.wait())
+
+    async def scenario():
+        buffer = WriteBehind(db, upsert, max_events=100)
+        buffer.add(("a", 1))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        assert buffer.rows == [("a", 1)]
+        gate.set()
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert hits(db) == {"a": 1}
+
+
+def test_write_behind_keeps_a_started_write_when_cancelled(db):
+    started, gate = threading.Event(), threading.Event()
+
+    def slow(conn, items):
+        started.set()
+        gate.wait()
+        upsert(conn, items)
+
+    async def scenario():
+        buffer = WriteBehind(db, slow, max_events=100)
+        buffer.add(("a", 1))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.to_thread(started.wait)
+        flush.cancel()
+        gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        # Already being written, putting it back would count it twice
+        assert buffer.rows == []
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert hits(db) == {"a": 1}
@@ -0,0 +1,33 @@
+import asyncio
+
+from bot.db import SQLiteDB
+
+
+def test_transcripts_are_batched_and_searchable(tmp_path):
+    db = SQLiteDB(str(tmp_path / "voice.db"))
+    db.create_table()
+    db.insert_entry("1", "hey derf what's the weather ")
+    db.insert_entry("2", "nothing to see here")
+    assert len(db.pending) == 2
+    db.close()
+
+    rows = asyncio.run(db.search("weather"))
+    assert [(user_id, snippet) for user_id, _, snippet in rows] == [
+        ("1", "hey derf what's the **weather**")
+    ]
+    db.db.close()
+
+
+def test_failed_batch_is_kept(tmp_path):
+    db = SQLiteDB(str(tmp_path / "voice.db"))
+    # No table yet, so the insert fails on the database thread
+    db.insert_entry("1", "first")
+    db.close()
+    assert [message for _, message, _ in db.pending] == ["first"]
+
+    db.create_table()
+    db.insert_entry("1", "second")
+    db.close()
+    rows = asyncio.run(db.get_all_entries())
+    assert [message for _, _, message, _ in rows] == ["first", "second"]
+    db.db.close()
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from bot.directory import Directory
+
+
+def http_error(cls, status):
+    response = SimpleNamespace(status=status, reason="")
+    return cls(response, "")
+
+
+class FakeBot:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.fetched = 0
+
+    def get_user(self, user_id):
+        return None
+
+    async def fetch_user(self, user_id):
+        self.fetched += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(display_name=f"user{user_id}")
+
+
+def test_transient_errors_are_not_cached():
+    bot = FakeBot(http_error(discord.HTTPException, 429))
+    directory = Directory(bot)
+
+    async def scenario():
+        return [await directory.user_name(1), await directory.user_name(1)]
+
+    assert asyncio.run(scenario()) == [None, "user1"]
+    assert bot.fetched == 2
+
+
+def test_missing_users_are_cached():
+    bot = FakeBot(http_error(discord.NotFound, 404))
+    directory = Directory(bot)
+
+    async def scenario():
+        return [await directory.user_name(1), await directory.user_name(1)]
+
+    assert asyncio.run(scenario()) == [None, None]
+    assert bot.fetched == 1
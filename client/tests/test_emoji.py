@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+from bot.emoji import EmojiUsageCog
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    EmojiUsageCog._ensure_tables(conn)
+    yield conn
+    conn.close()
+
+
+def daily(conn):
+    return conn.execute(
+        "SELECT emoji, day, count FROM emoji_daily ORDER BY emoji, day"
+    ).fetchall()
+
+
+def test_write_usage_buckets_per_day(conn):
+    EmojiUsageCog._write_usage(
+        conn,
+        [
+            (1, "🔥", "2025-01-06", 2),
+            (2, "🔥", "2025-01-06", 1),
+            (1, "🔥", "2025-01-07", 1),
+        ],
+    )
+    EmojiUsageCog._write_usage(conn, [(1, "🔥", "2025-01-06", 1)])
+    assert daily(conn) == [("🔥", "2025-01-06", 4), ("🔥", "2025-01-07", 1)]
+    assert conn.execute(
+        "SELECT user_id, usage_count FROM emoji_usage ORDER BY user_id"
+    ).fetchall() == [(1, 4), (2, 1)]
+
+
+def test_downsample_folds_old_days_into_their_monday(conn):
+    rows = [
+        ("🔥", "2025-01-06", 1),  # Monday
+        ("🔥", "2025-01-08", 2),
+        ("🔥", "2025-01-12", 3),  # Sunday, same week
+        ("🔥", "2025-01-13", 4),  # next Monday
+        ("🔥", "2025-01-15", 5),
+        ("🔥", "2025-01-16", 6),  # on the cutoff, kept daily
+        ("😂", "2025-01-09", 7),
+    ]
+    conn.executemany("INSERT INTO emoji_daily VALUES (?, ?, ?)", rows)
+
+    EmojiUsageCog._downsample_daily(conn, "2025-01-16")
+    assert daily(conn) == [
+        ("🔥", "2025-01-06", 6),
+        ("🔥", "2025-01-13", 9),
+        ("🔥", "2025-01-16", 6),
+        ("😂", "2025-01-06", 7),
+    ]
+
+    # Running again, or later with the rest of the week, folds into the same
+    # Monday bucket without losing counts
+    EmojiUsageCog._downsample_daily(conn, "2025-01-16")
+    assert sum(count for *_, count in daily(conn)) == 28
+    EmojiUsageCog._downsample_daily(conn, "2025-01-20")
+    assert daily(conn) == [
+        ("🔥", "2025-01-06", 6),
+        ("🔥", "2025-01-13", 15),
+        ("😂", "2025-01-06", 7),
+    ]
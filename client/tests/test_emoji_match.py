@@ -0,0 +1,40 @@
+import emoji
+
+from bot.emoji_match import build_trie, extract_emojis, start_class
+
+
+def test_plain_text_has_no_emojis():
+    assert extract_emojis("") == []
+    assert extract_emojis("just words, <no> emojis 123") == []
+    assert extract_emojis("café naïve — “quotes”") == []
+
+
+def test_custom_discord_emojis():
+    text = "gg <:pog:1234> and <a:dance:5678>"
+    assert extract_emojis(text) == ["<:pog:1234>", "<a:dance:5678>"]
+    assert extract_emojis("héllo <:pog:1234>") == ["<:pog:1234>"]
+
+
+def test_multi_codepoint_sequences_come_out_whole():
+    family = "👨‍👩‍👧‍👦"
+    thumbs = "👍🏽"
+    flag = "🇨🇦"
+    keycap = "1️⃣"
+    text = f"{family} then {thumbs}{flag} and {keycap}!"
+    assert extract_emojis(text) == [family, thumbs, flag, keycap]
+
+
+def test_matches_the_emoji_package_in_order():
+    text = "🔥<:pog:1234>🔥 wow 😂😂 ❤️ text ✨"
+    unicode_only = [match["emoji"] for match in emoji.emoji_list(text)]
+    assert [e for e in extract_emojis(text) if not e.startswith("<")] == unicode_only
+    assert extract_emojis(text)[:3] == ["🔥", "<:pog:1234>", "🔥"]
+
+
+def test_build_trie_marks_sequence_ends():
+    trie = build_trie(["ab", "a"])
+    assert "" in trie["a"] and "" in trie["a"]["b"]
+
+
+def test_start_class_merges_close_characters():
+    assert start_class("abz", gap=2) == "[a-bz]"
@@ -0,0 +1,24 @@
+import sqlite3
+
+from bot.maintenance import MaintenanceCog
+
+
+def fragmented(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("CREATE TABLE blobs (data BLOB)")
+    conn.executemany(
+        "INSERT INTO blobs VALUES (?)", [(b"x" * 4000,) for _ in range(200)]
+    )
+    conn.execute("DELETE FROM blobs")
+    return conn
+
+
+def test_full_vacuum_only_runs_when_allowed(tmp_path):
+    conn = fragmented(str(tmp_path / "test.db"))
+    assert MaintenanceCog._vacuum(conn) == "full deferred"
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+
+    assert MaintenanceCog._vacuum(conn, allow_full=True).startswith("full, took")
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,149 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from bot.archive import EventArchive
+from bot.database import Database, WriteBehind
+from bot.metrics import Metrics
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    Metrics._ensure_tables(conn)
+    yield conn
+    conn.close()
+
+
+def daily(conn):
+    return conn.execute(
+        "SELECT day, type, name, user_id, channel_id, count FROM usage_daily"
+    ).fetchall()
+
+
+def test_write_usage_upserts_rows_without_ids(conn):
+    row = ("message", None, 1, None, None, "2025-01-06 12:30:00")
+    Metrics._write_usage(conn, [row])
+    Metrics._write_usage(conn, [row, row])
+    assert daily(conn) == [("2025-01-06", "message", "", 1, 0, 3)]
+    assert conn.execute("SELECT hour, count FROM usage_hourly").fetchall() == [
+        ("2025-01-06 12:00", 3)
+    ]
+
+
+def test_ensure_tables_migrates_nullable_ids():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        """
+        CREATE TABLE usage_daily (
+            day TEXT NOT NULL,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL DEFAULT '',
+            user_id INTEGER,
+            channel_id INTEGER,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, type, name, user_id, channel_id)
+        );
+        CREATE INDEX idx_usage_daily_user ON usage_daily(user_id, type, count);
+        -- The upsert never matched these, so they piled up as duplicates
+        INSERT INTO usage_daily VALUES ('2025-01-06', 'message', '', 1, NULL, 2);
+        INSERT INTO usage_daily VALUES ('2025-01-06', 'message', '', 1, NULL, 3);
+        INSERT INTO usage_daily VALUES ('2025-01-06', 'command', 'ping', 1, 5, 1);
+    """
+    )
+    Metrics._ensure_tables(conn)
+    assert sorted(daily(conn)) == [
+        ("2025-01-06", "command", "ping", 1, 5, 1),
+        ("2025-01-06", "message", "", 1, 0, 5),
+    ]
+    notnull = {
+        name: flag
+        for _, name, _, flag, *_ in conn.execute("PRAGMA table_info(usage_daily)")
+    }
+    assert notnull["user_id"] and notnull["channel_id"]
+    indexes = {
+        name
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+    assert "idx_usage_daily_user" in indexes
+    # Later starts leave the table alone
+    Metrics._ensure_tables(conn)
+    assert len(daily(conn)) == 2
+    conn.close()
+
+
+@pytest.fixture
+def cog(tmp_path):
+    cog = Metrics.__new__(Metrics)
+    cog.db = Database(str(tmp_path / "metrics.db"))
+    cog.db.call(Metrics._ensure_tables)
+    cog.usage = WriteBehind(cog.db, Metrics._write_usage)
+    cog.archive = EventArchive(str(tmp_path / "archive"))
+    cog.aggregations = 0
+    yield cog
+    cog.db.close()
+
+
+def add_events(cog, *timestamps):
+    cog.db.call(
+        lambda conn: Metrics._write_usage(
+            conn, [("message", None, 1, 2, 3, when) for when in timestamps]
+        )
+    )
+
+
+def remaining(cog):
+    return cog.db.call(
+        lambda conn: conn.execute("SELECT id FROM bot_usage ORDER BY id").fetchall()
+    )
+
+
+def test_aggregate_archives_expired_events_in_batches(cog, monkeypatch):
+    monkeypatch.setattr("bot.metrics.METRICS_ARCHIVE_BATCH", 2)
+    add_events(cog, "2025-01-06 10:00:00", "2025-01-07 10:00:00")
+    add_events(cog, "2025-01-13 10:00:00", "2999-01-01 00:00:00")
+    asyncio.run(Metrics.aggregate_metrics.coro(cog))
+    assert remaining(cog) == [(4,)]
+    assert sorted(cog.archive.scan(["id"])["id"]) == [1, 2, 3]
+    assert cog.aggregations == 1
+
+
+def test_aggregate_keeps_events_that_were_not_archived(cog, monkeypatch):
+    monkeypatch.setattr("bot.metrics.METRICS_ARCHIVE_BATCH", 2)
+    add_events(cog, "2025-01-06 10:00:00", "2025-01-07 10:00:00")
+    add_events(cog, "2025-01-13 10:00:00")
+    write = cog.archive.write
+    batches = []
+
+    def fail_second_batch(rows):
+        batches.append(rows)
+        if len(batches) > 1:
+            raise OSError("disk full")
+        return write(rows)
+
+    monkeypatch.setattr(cog.archive, "write", fail_second_batch)
+    asyncio.run(Metrics.aggregate_metrics.coro(cog))
+    assert remaining(cog) == [(3,)]
+
+    cog.archive.available = False
+    asyncio.run(Metrics.aggregate_metrics.coro(cog))
+    assert remaining(cog) == [(3,)]
+    assert cog.aggregations == 1
+
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+@pytest.mark.parametrize("days", [0, -3, 10**9])
+def test_recent_activity_rejects_out_of_range_days(cog, days):
+    ctx = FakeContext()
+    asyncio.run(Metrics.recent_activity.callback(cog, ctx, days))
+    assert ctx.sent == ["Pick between 1 and 90 days, older hourly activity isn't kept."]
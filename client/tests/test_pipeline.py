@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.pipeline import MessagePipeline
+
+
+def message(content, bot=False, mentions=()):
+    return SimpleNamespace(
+        content=content,
+        author=SimpleNamespace(bot=bot),
+        mentions=[SimpleNamespace(id=user_id) for user_id in mentions],
+    )
+
+
+def pipeline(prefix="!"):
+    return MessagePipeline(SimpleNamespace(command_prefix=prefix))
+
+
+def test_parse_extracts_features_once():
+    pipe = pipeline(("!", "#"))
+    pipe.register("combo", None, keywords=["Hello"])
+    features = pipe.parse(message("  #Roll  2d6 🔥 hello there ", mentions=[42]))
+    assert features.content == "#Roll  2d6 🔥 hello there"
+    assert features.normalized == "#roll 2d6 🔥 hello there"
+    assert features.prefix == "#"
+    assert features.command == "roll"
+    assert features.emojis == ("🔥",)
+    assert features.mentions == (42,)
+    assert features.keywords == {"hello"}
+
+
+def test_dispatch_runs_handlers_concurrently():
+    pipe = pipeline()
+    other_started = asyncio.Event()
+    seen = []
+
+    async def waits_for_other(features):
+        # Would never finish if handlers ran one after another
+        await asyncio.wait_for(other_started.wait(), 1)
+        seen.append("first")
+
+    async def second(features):
+        other_started.set()
+        seen.append(features.command)
+
+    pipe.register("first", waits_for_other)
+    pipe.register("second", second)
+    asyncio.run(pipe.on_message(message("!ping")))
+    assert seen == ["ping", "first"]
+    assert pipe.stats["first"].calls == pipe.stats["second"].calls == 1
+
+
+def test_failing_handler_does_not_stop_the_others():
+    pipe = pipeline()
+    seen = []
+
+    async def broken(features):
+        raise ValueError("boom")
+
+    async def fine(features):
+        seen.append(features.content)
+
+    pipe.register("broken", broken)
+    pipe.register("fine", fine)
+    asyncio.run(pipe.on_message(message("hi")))
+    assert seen == ["hi"]
+    assert pipe.stats["broken"].errors == 1
+    assert [row[0] for row in pipe.report()].count("broken") == 1
+
+
+def test_bot_messages_and_unregistered_handlers_are_skipped():
+    pipe = pipeline()
+    seen = []
+
+    async def handler(features):
+        seen.append(features.content)
+
+    pipe.register("handler", handler)
+    asyncio.run(pipe.on_message(message("from a bot", bot=True)))
+    pipe.unregister("handler")
+    asyncio.run(pipe.on_message(message("after unregister")))
+    assert seen == []
@@ -0,0 +1,67 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from bot.stt import STTBackend, STTRequestError, STTRouter, STTUnavailable
+
+
+class FakeBackend(STTBackend):
+    def __init__(self, name, result, latency=1.0):
+        super().__init__(name)
+        self.result = result
+        self.latency = latency
+        self.calls = 0
+
+    async def transcribe(self, audio_file_path):
+        self.calls += 1
+        if isinstance(self.result, BaseException):
+            raise self.result
+        return self.result
+
+
+def transcribe(router):
+    return asyncio.run(router.transcribe("utterance.wav"))
+
+
+def test_picks_the_least_loaded_backend():
+    fast, slow = FakeBackend("fast", "fast", 0.5), FakeBackend("slow", "slow", 2.0)
+    assert transcribe(STTRouter([slow, fast])) == "fast"
+    fast.in_flight = 4
+    assert STTRouter([slow, fast]).pick() is slow
+
+
+def test_fails_over_when_a_backend_is_down():
+    for error in (
+        STTUnavailable("503 - busy"),
+        aiohttp.ClientConnectionError("refused"),
+        asyncio.TimeoutError(),
+    ):
+        down = FakeBackend("down", error, 0.5)
+        up = FakeBackend("up", "hello")
+        assert transcribe(STTRouter([down, up])) == "hello"
+        assert not down.healthy and down.failures == 1
+        assert up.requests == 1 and down.in_flight == 0
+
+
+def test_client_errors_do_not_fail_over():
+    rejected = FakeBackend("rejected", STTRequestError("400 - bad wav"), 0.5)
+    other = FakeBackend("other", "hello")
+    assert transcribe(STTRouter([rejected, other])) == ""
+    assert rejected.healthy and rejected.failures == 0
+    assert other.calls == 0
+
+
+def test_gives_up_when_every_backend_is_down():
+    backends = [FakeBackend(name, STTUnavailable("500")) for name in "ab"]
+    assert transcribe(STTRouter(backends)) == ""
+    assert [backend.calls for backend in backends] == [1, 1]
+    assert STTRouter(backends).pick() is None
+
+
+def test_backends_must_implement_transcribe():
+    class Incomplete(STTBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete")
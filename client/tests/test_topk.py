@@ -0,0 +1,99 @@
+import asyncio
+import random
+from collections import Counter
+
+import pytest
+
+from bot.database import Database
+from bot.topk import SpaceSaving, TopK
+
+
+def test_space_saving_is_exact_under_capacity():
+    table = SpaceSaving(4)
+    for item in "abacab":
+        table.add(item)
+    assert table.top(2) == [("a", 3), ("b", 2)]
+    assert set(table.errors.values()) == {0}
+
+
+def test_space_saving_evicts_the_smallest_counter():
+    table = SpaceSaving(2)
+    table.add("a", 5)
+    table.add("b", 2)
+    table.add("c")
+    assert table.counts == {"a": 5, "c": 3}
+    assert table.errors["c"] == 2
+    # "a" grew after it entered the heap, the stale entry must not evict it
+    table.add("a", 10)
+    table.add("d")
+    table.add("e")
+    assert table.top(1) == [("a", 15)]
+    assert len(table) == 2 and len(table.heap) == 2
+
+
+def test_space_saving_bounds_hold_on_a_skewed_stream():
+    rng = random.Random(7)
+    stream = [f"item{int(rng.paretovariate(1.2))}" for _ in range(20000)]
+    exact = Counter(stream)
+    table = SpaceSaving(50)
+    for item in stream:
+        table.add(item)
+
+    assert len(table) == 50
+    for item, count in table.counts.items():
+        # Overestimates by at most the inherited error
+        assert count - table.errors[item] <= exact[item] <= count
+    # Anything above total / capacity is guaranteed to be tracked
+    for item, count in exact.items():
+        if count > len(stream) / 50:
+            assert item in table.counts
+    assert [item for item, _ in table.top(5)] == [
+        item for item, _ in exact.most_common(5)
+    ]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "topk.db"))
+    yield db
+    db.close()
+
+
+def test_topk_checkpoints_and_reloads(db):
+    async def scenario():
+        topk = TopK(db, {"emoji": 3})
+        await topk.load()
+        for item in "aaabbc":
+            topk.add("emoji", item)
+        topk.add("user:1", "a")
+        await topk.close()
+
+        reloaded = TopK(db, {"emoji": 3})
+        await reloaded.load()
+        assert reloaded.top("emoji", 2) == [("a", 3), ("b", 2)]
+        assert reloaded.top("user:1", 5) == [("a", 1)]
+        # The restored heap still drives evictions
+        reloaded.add("emoji", "d")
+        assert dict(reloaded.top("emoji", 3)) == {"a": 3, "b": 2, "d": 2}
+
+        reloaded.clear("user:")
+        await reloaded.close()
+        assert reloaded.top("user:1", 5) == []
+        again = TopK(db)
+        await again.load()
+        assert "user:1" not in again.tables
+
+    asyncio.run(scenario())
+
+
+def test_topk_seeds_from_existing_rows(db):
+    def seed(conn):
+        return [("emoji", item, count) for item, count in zip("abcd", (4, 3, 2, 1))]
+
+    async def scenario():
+        topk = TopK(db, {"emoji": 2})
+        await topk.load(seed=seed)
+        assert topk.top("emoji", 5) == [("a", 4), ("b", 3)]
+        await topk.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+import json
+import wave
+import asyncio
+import importlib
+
+import pytest
+
+
+class CountingClient:
+    """Stands in for WhisperClient, answers every request with `text`."""
+
+    def __init__(self, text):
+        self.text = text
+        self.paths = []
+
+    async def get_text(self, audio_file_path):
+        self.paths.append(audio_file_path)
+        return self.text
+
+
+class FakeRedis:
+    def __init__(self):
+        self.pushed = []
+
+    def lpush(self, queue, value):
+        self.pushed.append((queue, json.loads(value)))
+
+
+class FakeTranscripts:
+    def __init__(self):
+        self.entries = []
+
+    def insert_entry(self, user_id, message):
+        self.entries.append((user_id, message))
+
+
+@pytest.fixture
+def worker_module(tmp_path, monkeypatch):
+    # The module opens its transcript database on import, keep it in tmp_path
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("whisper_worker")
+    monkeypatch.setattr(module, "redis_client", FakeRedis())
+    monkeypatch.setattr(module, "db", FakeTranscripts())
+    monkeypatch.setattr(module, "WHISPER_PREFIX_SECONDS", 1.0)
+    return module
+
+
+def clip(tmp_path, seconds=5, rate=16000):
+    path = tmp_path / "utterance.wav"
+    with wave.open(str(path), "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(b"\0\0" * rate * seconds)
+    return str(path)
+
+
+def process(module, tmp_path, text, log_transcripts, monkeypatch):
+    monkeypatch.setattr(module, "LOG_VOICE_TRANSCRIPTS", log_transcripts)
+    worker = module.WhisperWorker()
+    worker.whisper_client = CountingClient(text)
+    entry = json.dumps({"user_id": 1, "audio_path": clip(tmp_path)})
+    asyncio.run(worker._process_entry(entry))
+    return worker.whisper_client.paths
+
+
+def test_logged_transcripts_skip_the_prefix_pass(worker_module, tmp_path, monkeypatch):
+    paths = process(worker_module, tmp_path, "hello there", True, monkeypatch)
+    assert len(paths) == 1 and not paths[0].endswith("-prefix.wav")
+    assert worker_module.db.entries == [(1, "hello there")]
+
+
+def test_prefix_pass_drops_clips_without_a_wake_word(
+    worker_module, tmp_path, monkeypatch
+):
+    paths = process(worker_module, tmp_path, "hello there", False, monkeypatch)
+    assert len(paths) == 1 and paths[0].endswith("-prefix.wav")
+    assert not (tmp_path / "utterance.wav").exists()
+    assert worker_module.redis_client.pushed == []
+
+
+def test_prefix_pass_hands_wake_words_to_the_full_pass(
+    worker_module, tmp_path, monkeypatch
+):
+    paths = process(worker_module, tmp_path, "hey derf", False, monkeypatch)
+    assert len(paths) == 2
+    assert worker_module.redis_client.pushed[0][1]["message"] == "hey derf"
@@ -1,19 +1,35 @@
 import os
 import re
 import json
+import signal
 from random import randint
 import logging
 import asyncio
-import aiohttp
+import wave
 from bot.db import SQLiteDB
 from bot.redis_client import redis_client
-from bot.constants import WHISPER_QUEUE, VOICE_RESPONSE_QUEUE, VOICE_NIC_RESPONSE_QUEUE
+from bot.database import close_databases
+from bot.config import (
+    WHISPER_URLS,
+    WHISPER_LOCAL_MODEL,
+    WHISPER_PREFIX_SECONDS,
+    LOG_VOICE_TRANSCRIPTS,
+)
+from bot.stt import STTRouter, build_router
+from bot.constants import (
+    WHISPER_QUEUE,
+    VOICE_RESPONSE_QUEUE,
+    VOICE_NIC_RESPONSE_QUEUE,
+    TRANSCRIPT_FLUSH_SECONDS,
+)
 
 logger = logging.getLogger(__name__)
 
 
 bot_name_pattern = re.compile(r"\b(bot|derf|derfbot|dorf|dwarf)\b", re.IGNORECASE)
 nic_bot_name_pattern = re.compile(r"\b(nic|nick|nicole|nikky|nik)\b", re.IGNORECASE)
+# Looser match for the first pass, the prefix can cut a wake word in half
+wake_word_hint_pattern = re.compile(r"\b(bot|der|dor|dwar|nic|nik)", re.IGNORECASE)
 
 # Initialize the database
 db = SQLiteDB()
@@ -21,126 +37,173 @@ db.create_table()
 
 
 class WhisperClient:
+    def __init__(self, router: STTRouter):
+        self.router = router
+
     async def get_text(self, audio_file_path: str) -> str:
-        url = f"http://127.0.0.1:8080/inference"
-        headers = {
-            "accept": "application/json",
-        }
-        files = {"file": open(audio_file_path, "rb")}
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(url, headers=headers, data=files) as response:
-                    if response.status == 200:
-                        json_response = await response.json()
-                        return json_response.get("text", "")
-                    else:
-                        logger.info(
-                            f"Error: {response.status} - {await response.text()}"
-                        )
-                        return ""
-            except asyncio.TimeoutError:
-                logger.info("Request timed out.")
-                return "The whisper request timed out. Please try again later."
-            except Exception as e:
-                logger.info(f"Exception during API call: {e}")
-                import traceback
+        return await self.router.transcribe(audio_file_path)
+
 
-                traceback.print_exc()
-                return "An error occurred while processing the request. Please try again later."
+def write_prefix(audio_path: str, seconds: float) -> str | None:
+    """Write the first `seconds` of a wav next to it, None if the clip is shorter."""
+    with wave.open(audio_path, "rb") as source:
+        prefix_frames = int(source.getframerate() * seconds)
+        # Not worth a second request when the prefix is most of the clip
+        if source.getnframes() <= prefix_frames * 1.5:
+            return None
+        params = source.getparams()
+        frames = source.readframes(prefix_frames)
+    prefix_path = f"{os.path.splitext(audio_path)[0]}-prefix.wav"
+    with wave.open(prefix_path, "wb") as prefix:
+        prefix.setparams(params)
+        prefix.writeframes(frames)
+    return prefix_path
 
 
 class WhisperWorker:
-    def process_audio(self):
+    def __init__(self):
+        self.whisper_client = WhisperClient(
+            build_router(WHISPER_URLS, WHISPER_LOCAL_MODEL)
+        )
+        # Logged transcripts need the full pass for every clip anyway, so the
+        # prefix pass only pays off when it can skip that
+        self.streaming = WHISPER_PREFIX_SECONDS > 0 and not LOG_VOICE_TRANSCRIPTS
+        logger.info(f"Streaming wake word detection: {self.streaming}")
+
+    async def process_audio(self):
         """Process audio paths from the Redis queue."""
         # Connect to Redis
         logger.info(f"Connecting to Redis")
         if not redis_client.ping():
             raise ConnectionError("Failed to connect to Redis.")
         logger.info("Connected to Redis successfully.")
+        # One consumer per STT slot so every backend can be kept busy
+        consumers = self.whisper_client.router.capacity
+        logger.info(f"Starting {consumers} whisper consumers")
+        await asyncio.gather(
+            self._flush_transcripts(),
+            *(self._consume() for _ in range(consumers)),
+        )
+
+    async def _flush_transcripts(self):
+        """Write out batched transcripts even when the channel goes quiet."""
+        while True:
+            await asyncio.sleep(TRANSCRIPT_FLUSH_SECONDS)
+            try:
+                db.flush()
+            except Exception as e:
+                logger.info(f"Exception flushing transcripts: {e}")
+
+    async def _consume(self):
         while True:
             try:
                 # Get a blocking pop from the queue (blocking until an item is available)
-                path_data = redis_client.blpop(
-                    WHISPER_QUEUE, timeout=30
+                path_data = await asyncio.to_thread(
+                    redis_client.blpop, WHISPER_QUEUE, timeout=30
                 )  # Timeout of 30 seconds
                 if not path_data or len(path_data) < 2:
                     continue
                 key, raw_value = path_data  # Unpack the tuple correctly
                 logger.info(f"Received key: {key}, Raw Value: {raw_value}")
-                # Extract the audio_path and user_id from the Redis value
-                try:
-                    path_info = json.loads(raw_value)
-                    user_id = path_info.get("user_id")
-                    audio_path = path_info.get("audio_path")
-                    if not user_id or not audio_path:
-                        logger.info(
-                            "No valid user_id or audio_path in the received data."
-                        )
-                        continue
-                    logger.info(f"Processing {audio_path} for user_id: {user_id}...")
-                    # Ensure WhisperClient.get_text is called within an event loop context
-                    text_response = asyncio.run(self._get_text_from_audio(audio_path))
-                    if text_response:
-                        logger.debug(f"{user_id}: {text_response}")
-                        if bot_name_pattern.search(text_response):
-                            logger.info(f"replying_to: {text_response}")
-                            unique_id = randint(
-                                100000, 999999
-                            )  # Generate a random unique ID
-                            redis_client.lpush(
-                                VOICE_RESPONSE_QUEUE,
-                                json.dumps(
-                                    {
-                                        "unique_id": str(unique_id),
-                                        "message": f"{text_response.strip()}",
-                                        # "message": f"{user_id}: {text_response.strip()}",
-                                    }
-                                ),
-                            )
-                            logger.info(f"Pushed response to Redis queue.")
-                            # now we can remove the audio file
-                        elif nic_bot_name_pattern.search(text_response):
-                            logger.info(f"replying_to: {text_response}")
-                            unique_id = randint(
-                                100000, 999999
-                            )  # Generate a random unique ID
-                            redis_client.lpush(
-                                VOICE_NIC_RESPONSE_QUEUE,
-                                json.dumps(
-                                    {
-                                        "unique_id": str(unique_id),
-                                        "message": f"{text_response.strip()}",
-                                        # "message": f"{user_id}: {text_response.strip()}",
-                                    }
-                                ),
-                            )
-                            logger.info(f"Pushed response to Redis queue.")
-                            # now we can remove the audio file
-                        else:
-                            logger.info(
-                                f"No bot name found in text response: {text_response}"
-                            )
-                        os.remove(audio_path)
-                        db.insert_entry(user_id, text_response.strip())
-
-                    else:
-                        logger.info("No text response received.")
-                except json.JSONDecodeError as e:
-                    logger.info(f"Failed to decode JSON from Redis: {e}")
+                await self._process_entry(raw_value)
             except Exception as e:
                 logger.info(f"Exception during processing: {e}")
 
-    async def _get_text_from_audio(self, audio_path):
-        """Get text from the given audio path using WhisperClient."""
-        whisper_client = WhisperClient()
-        return await whisper_client.get_text(audio_path)
+    async def _process_entry(self, raw_value):
+        # Extract the audio_path and user_id from the Redis value
+        try:
+            path_info = json.loads(raw_value)
+            user_id = path_info.get("user_id")
+            audio_path = path_info.get("audio_path")
+            if not user_id or not audio_path:
+                logger.info("No valid user_id or audio_path in the received data.")
+                return
+            logger.info(f"Processing {audio_path} for user_id: {user_id}...")
+            if not await self._wake_word_likely(audio_path):
+                logger.info(f"No wake word in the first pass, dropping {audio_path}")
+                os.remove(audio_path)
+                return
+            text_response = await self.whisper_client.get_text(audio_path)
+            if text_response:
+                logger.debug(f"{user_id}: {text_response}")
+                if bot_name_pattern.search(text_response):
+                    logger.info(f"replying_to: {text_response}")
+                    unique_id = randint(100000, 999999)  # Generate a random unique ID
+                    redis_client.lpush(
+                        VOICE_RESPONSE_QUEUE,
+                        json.dumps(
+                            {
+                                "unique_id": str(unique_id),
+                                "message": f"{text_response.strip()}",
+                                # "message": f"{user_id}: {text_response.strip()}",
+                            }
+                        ),
+                    )
+                    logger.info(f"Pushed response to Redis queue.")
+                    # now we can remove the audio file
+                elif nic_bot_name_pattern.search(text_response):
+                    logger.info(f"replying_to: {text_response}")
+                    unique_id = randint(100000, 999999)  # Generate a random unique ID
+                    redis_client.lpush(
+                        VOICE_NIC_RESPONSE_QUEUE,
+                        json.dumps(
+                            {
+                                "unique_id": str(unique_id),
+                                "message": f"{text_response.strip()}",
+                                # "message": f"{user_id}: {text_response.strip()}",
+                            }
+                        ),
+                    )
+                    logger.info(f"Pushed response to Redis queue.")
+                    # now we can remove the audio file
+                else:
+                    logger.info(f"No bot name found in text response: {text_response}")
+                os.remove(audio_path)
+                if LOG_VOICE_TRANSCRIPTS:
+                    db.insert_entry(user_id, text_response.strip())
+
+            else:
+                logger.info("No text response received.")
+        except json.JSONDecodeError as e:
+            logger.info(f"Failed to decode JSON from Redis: {e}")
+
+    async def _wake_word_likely(self, audio_path: str) -> bool:
+        """Cheap first pass over the start of the utterance.
+
+        Only the first `WHISPER_PREFIX_SECONDS` are transcribed, so a wake
+        word said later than that is missed. Off while transcripts are logged.
+        """
+        if not self.streaming:
+            return True
+        prefix_path = await asyncio.to_thread(
+            write_prefix, audio_path, WHISPER_PREFIX_SECONDS
+        )
+        if prefix_path is None:
+            return True  # short clip, the full pass is just as cheap
+        try:
+            prefix_text = await self.whisper_client.get_text(prefix_path)
+        finally:
+            os.remove(prefix_path)
+        logger.debug(f"Prefix transcription: {prefix_text}")
+        return bool(wake_word_hint_pattern.search(prefix_text))
+
+
+async def run(worker: WhisperWorker):
+    # Shut down through the finally below on SIGTERM too, not only Ctrl-C
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
+    )
+    try:
+        await worker.process_audio()
+    finally:
+        # Write out batched transcripts before the database threads stop
+        db.close()
+        close_databases()
 
 
 def main():
     worker = WhisperWorker()
-    asyncio.run(
-        worker.process_audio(),
-    )  # Run the process_audio method within an event loop
+    asyncio.run(run(worker))  # Run the process_audio method within an event loop
 
 
 if __name__ == "__main__":